@@ -1,4 +1,58 @@
+# 单页抓取：python collect.py，抓取 FAQ 首页并保存到 faq.html。
+#
+# 批量抓取：python collect.py --urls urls.txt（每行一个 URL）或 --sitemap https://.../sitemap.xml
+# 只启动一个无头浏览器，CRAWL_CONCURRENCY 个浏览器上下文各持有一个页面循环复用，
+# 同一站点同时在途的页面数不超过 CRAWL_PER_HOST；图片、字体、媒体和统计脚本在请求阶段直接拦截，
+# 页面只等待 FAQ 区域出现，不再等待 networkidle。结果写入 JSONL（每行一个页面）或每页一个文件。
+#
+# 本地测试：用静态服务器提供若干带 #faq-list 的页面
+#   python -m http.server 8080 --directory ./pages
+#   python collect.py --urls urls.txt --output faq_pages.jsonl
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import urllib.request
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse
 from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+
+# ========== 批量抓取配置 ==========
+# 同时打开的页面数（每个页面独占一个浏览器上下文，Cookie 与缓存互不干扰）
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+# 同一站点同时在途的页面数上限
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "4"))
+# 单个页面的加载超时（毫秒）
+PAGE_TIMEOUT = 30_000
+# FAQ 区域的选择器
+FAQ_SELECTOR = "#faq-list"
+# 不影响 FAQ 文本的资源类型，在请求阶段直接拦截
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+# 统计与广告脚本的域名
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "hm.baidu.com", "cnzz.com", "growingio.com", "sensorsdata.cn"
+)
+# sitemap 的 XML 命名空间
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+# 浏览器上下文配置：中文环境
+CONTEXT_OPTIONS = dict(
+    locale='zh-CN',  # 页面 locale
+    user_agent=(
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/139.0.0.0 Safari/537.36 Edg/139.0.0.0"
+    ),
+    extra_http_headers={
+        "Accept-Language": "zh-CN,zh;q=0.9"
+    }
+)
 
 
 def collect_faq(url):
@@ -19,17 +73,7 @@ def collect_faq(url):
             args=['--lang=zh-CN']  # 浏览器语言
         )
         # 创建新页面，配置中文环境
-        page = browser.new_page(
-            locale='zh-CN',  # 页面 locale
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/139.0.0.0 Safari/537.36 Edg/139.0.0.0"
-            ),
-            extra_http_headers={
-                "Accept-Language": "zh-CN,zh;q=0.9"
-            }
-        )
+        page = browser.new_page(**CONTEXT_OPTIONS)
         # 访问目标URL并等待页面加载完成
         page.goto(url, timeout=30_000)
         page.wait_for_load_state("networkidle")
@@ -55,7 +99,184 @@ def save_faq(cleaned_text: str, output_file: str):
     print(f"FAQ 已保存到 {output_file}")
 
 
+# ========== 批量抓取 ==========
+def load_urls(path: str) -> list:
+    """
+    读取 URL 列表文件，每行一个 URL，忽略空行和 # 开头的注释。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def load_sitemap(source: str) -> list:
+    """
+    解析 sitemap.xml（URL 或本地路径），sitemap 索引文件会递归展开。
+
+    参数:
+        source (str): sitemap 的 URL 或本地文件路径。
+
+    返回:
+        list[str]: 页面 URL 列表。
+    """
+    if re.match(r"https?://", source):
+        with urllib.request.urlopen(source, timeout=PAGE_TIMEOUT / 1000) as resp:
+            data = resp.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    root = ET.fromstring(data)
+    locs = [loc.text.strip() for loc in root.iter(f"{SITEMAP_NS}loc") if loc.text]
+    if root.tag == f"{SITEMAP_NS}sitemapindex":
+        return [url for loc in locs for url in load_sitemap(loc)]
+    return locs
+
+
+async def block_resources(route):
+    """
+    拦截图片、字体、媒体和统计脚本请求，其余请求正常放行。
+    """
+    request = route.request
+    host = urlparse(request.url).hostname or ""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def page_filename(url: str, suffix: str) -> str:
+    """
+    由 URL 生成可读且不重复的文件名：站点与路径中的非法字符替换为下划线，附加 URL 摘要。
+    """
+    parsed = urlparse(url)
+    readable = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{parsed.netloc}{parsed.path}").strip("_")[:80]
+    return f"{readable}_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}{suffix}"
+
+
+class PageWriter:
+    """
+    抓取结果的输出：jsonl 格式追加到一个文件，files 格式每个页面一个文件。
+    """
+
+    def __init__(self, output: str, fmt: str = "jsonl"):
+        self.output = output
+        self.fmt = fmt
+        if fmt == "files":
+            os.makedirs(output, exist_ok=True)
+            self.file = None
+        else:
+            self.file = open(output, "w", encoding="utf-8")
+
+    def write(self, record: dict):
+        if self.file is not None:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        with open(os.path.join(self.output, page_filename(record["url"], ".html")), "w", encoding="utf-8") as f:
+            f.write(record["content"])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+async def fetch_page(page, url: str) -> dict:
+    """
+    在已有页面中打开 URL，等待 FAQ 区域出现后提取内容。
+
+    返回:
+        dict: url、status（HTTP 状态码）、content（FAQ 区域的 html 代码）、fetched_at（抓取时间戳）。
+    """
+    response = await page.goto(url, timeout=PAGE_TIMEOUT, wait_until="domcontentloaded")
+    locator = page.locator(FAQ_SELECTOR).first
+    await locator.wait_for(timeout=PAGE_TIMEOUT)
+    return {
+        "url": url,
+        "status": response.status if response is not None else None,
+        "content": await locator.inner_html(),
+        "fetched_at": int(time.time()),
+    }
+
+
+async def crawl(urls: list, output: str, fmt: str = "jsonl", concurrency: int = CRAWL_CONCURRENCY,
+                per_host: int = CRAWL_PER_HOST, headless: bool = True) -> dict:
+    """
+    用一个浏览器并发抓取一批 FAQ 页面。
+
+    参数:
+        urls (list[str]): 页面 URL。
+        output (str): 输出路径，jsonl 格式为文件，files 格式为目录。
+        fmt (str): 输出格式，"jsonl" 或 "files"。
+        concurrency (int): 浏览器上下文（页面）个数。
+        per_host (int): 同一站点同时在途的页面数上限。
+        headless (bool): 是否无头运行。
+
+    返回:
+        dict: pages（成功页数）、failed（失败页数）、elapsed（总耗时）。
+    """
+    queue = asyncio.Queue()
+    for url in dict.fromkeys(urls):
+        queue.put_nowait(url)
+    host_limits = {}
+    stats = {"pages": 0, "failed": 0, "elapsed": 0.0}
+    writer = PageWriter(output, fmt)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless, args=['--lang=zh-CN'])
+
+        async def worker():
+            # 每个 worker 持有一个上下文和页面，处理完一个 URL 后继续复用
+            context = await browser.new_context(**CONTEXT_OPTIONS)
+            await context.route("**/*", block_resources)
+            page = await context.new_page()
+            try:
+                while not queue.empty():
+                    url = queue.get_nowait()
+                    limit = host_limits.setdefault(urlparse(url).netloc, asyncio.Semaphore(per_host))
+                    async with limit:
+                        try:
+                            record = await fetch_page(page, url)
+                        except Exception as e:
+                            stats["failed"] += 1
+                            print(f"❌ 抓取失败 {url}: {e}")
+                            # 页面崩溃后换一个新页面继续
+                            if page.is_closed():
+                                page = await context.new_page()
+                            continue
+                    writer.write(record)
+                    stats["pages"] += 1
+            finally:
+                await context.close()
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(concurrency, queue.qsize()))))
+        finally:
+            await browser.close()
+            writer.close()
+        stats["elapsed"] = time.perf_counter() - start
+
+    elapsed = stats["elapsed"] or 1e-9
+    print(f"📊 抓取 {stats['pages']} 个页面，失败 {stats['failed']} 个，"
+          f"总耗时 {stats['elapsed']:.1f}s，{stats['pages'] / elapsed:.2f} 页/s，结果已保存到 {output}")
+    return stats
+
+
 if __name__ == "__main__":
-    cleaned_text = collect_faq(url="https://waimai.meituan.com/help/faq")
-    output_file = "faq.html"
-    save_faq(cleaned_text, output_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="抓取 FAQ 页面")
+    parser.add_argument("--urls", help="URL 列表文件，每行一个 URL")
+    parser.add_argument("--sitemap", help="sitemap.xml 的 URL 或本地路径")
+    parser.add_argument("--output", help="批量抓取的输出路径，jsonl 格式为文件，files 格式为目录")
+    parser.add_argument("--format", choices=["jsonl", "files"], default="jsonl", help="批量抓取的输出格式")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY, help="同时打开的页面数")
+    parser.add_argument("--per-host", type=int, default=CRAWL_PER_HOST, help="同一站点同时在途的页面数")
+    parser.add_argument("--headed", action="store_true", help="显示浏览器窗口，便于调试")
+    args = parser.parse_args()
+
+    if args.urls or args.sitemap:
+        urls = (load_urls(args.urls) if args.urls else []) + (load_sitemap(args.sitemap) if args.sitemap else [])
+        output = args.output or ("faq_pages.jsonl" if args.format == "jsonl" else "faq_pages")
+        asyncio.run(crawl(urls, output, fmt=args.format, concurrency=args.concurrency,
+                          per_host=args.per_host, headless=not args.headed))
+    else:
+        cleaned_text = collect_faq(url="https://waimai.meituan.com/help/faq")
+        output_file = "faq.html"
+        save_faq(cleaned_text, output_file)
\ No newline at end of file
@@ -1,18 +1,20 @@
 import json
+from itertools import islice
 from langchain_ollama import OllamaEmbeddings
 from langchain_redis import RedisConfig, RedisVectorStore
 
+# 每批写入向量库的 FAQ 条数
+BATCH_SIZE = 64
+# 流式读取 JSON 数组时每次读入的字符数
+READ_CHUNK_SIZE = 1 << 20
 
-def insert_faq(texts, meta_data):
+
+def get_vector_store():
     """
-    将FAQ文本数据插入到Redis向量存储中
-    
-    Args:
-        texts (list): 包含问题文本的列表
-        meta_data (list): 包含每个问题对应元数据的列表，每个元素为字典格式
-        
+    创建 Redis 向量存储实例
+
     Returns:
-        None
+        RedisVectorStore: 使用 Ollama Embedding 模型的向量存储
     """
     # 配置Redis连接参数和索引名称
     config = RedisConfig(
@@ -22,35 +24,125 @@ def insert_faq(texts, meta_data):
     # 初始化 Embedding 模型
     embedding = OllamaEmbeddings(model="deepseek-r1:14b")
     # 创建Redis向量存储实例
-    vector_store = RedisVectorStore(embedding, config=config)
-    vector_store.add_texts(texts=texts, metadatas=meta_data)
+    return RedisVectorStore(embedding, config=config)
 
 
-def insert_from_file(file_path):
+def insert_faq(texts, meta_data, vector_store=None):
     """
-    从JSON文件中读取FAQ数据并插入到向量存储中
-    
+    将FAQ文本数据插入到Redis向量存储中
+
     Args:
-        file_path (str): 包含FAQ数据的JSON文件路径
-        
+        texts (list): 包含问题文本的列表
+        meta_data (list): 包含每个问题对应元数据的列表，每个元素为字典格式
+        vector_store (RedisVectorStore): 复用的向量存储实例，为空时新建
+
     Returns:
         None
     """
+    if vector_store is None:
+        vector_store = get_vector_store()
+    vector_store.add_texts(texts=texts, metadatas=meta_data)
+
+
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """
+    增量解析顶层为数组的JSON文件，逐个返回数组元素，内存占用与文件大小无关
+
+    Args:
+        f (TextIO): 已打开的文本文件对象
+        chunk_size (int): 每次读入的字符数
+
+    Returns:
+        Iterator[dict]: 数组中的每个元素
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof, started = "", 0, False, False
+    while True:
+        # 跳过空白和元素分隔符，缓冲区耗尽时继续读入
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("JSON 数组未闭合")
+            chunk = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("文件顶层不是 JSON 数组")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 当前元素被截断在缓冲区末尾，读入更多内容后重试
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        yield obj
+        pos = end
+
+
+def iter_docs(file_path):
+    """
+    流式读取FAQ数据文件：.jsonl 按行读取，其余按 JSON 数组增量解析
+
+    Args:
+        file_path (str): FAQ数据文件路径
+
+    Returns:
+        Iterator[dict]: 逐条返回的FAQ数据
+    """
     with open(file_path, "r", encoding="utf-8") as f:
-        docs = json.load(f)
-    texts = []
-    meta_data = []
-    # 解析文档数据，提取问题文本和元数据
-    for doc in docs:
-        texts.append(doc["question"])
-        meta_data.append({
-            "answer": doc["answer"],
-            "category": doc["category"],
-            "source": doc["source"]
-        })
-    insert_faq(texts, meta_data)
+        if file_path.endswith(".jsonl"):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(f)
+
+
+def insert_from_file(file_path, batch_size=BATCH_SIZE):
+    """
+    从JSON / JSONL文件中流式读取FAQ数据，按固定批次插入到向量存储中
+
+    Args:
+        file_path (str): 包含FAQ数据的JSON / JSONL文件路径
+        batch_size (int): 每批写入的FAQ条数
+
+    Returns:
+        None
+    """
+    vector_store = get_vector_store()
+    docs = iter_docs(file_path)
+    total = 0
+    while True:
+        batch = list(islice(docs, batch_size))
+        if not batch:
+            break
+        texts = []
+        meta_data = []
+        # 解析文档数据，提取问题文本和元数据
+        for doc in batch:
+            texts.append(doc["question"])
+            meta_data.append({
+                "answer": doc["answer"],
+                "category": doc["category"],
+                "source": doc["source"]
+            })
+        insert_faq(texts, meta_data, vector_store)
+        total += len(batch)
+        print(f"已写入 {total} 条 FAQ")
 
 
 if __name__ == "__main__":
     # 程序入口：先创建索引再批量插入数据
-    insert_from_file("faq.json")
\ No newline at end of file
+    insert_from_file("faq.json")
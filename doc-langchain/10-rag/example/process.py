@@ -48,11 +48,11 @@ def parse_faq_html(file_path):
 
 def save_docs_to_json(docs, output_file):
     """
-    将Document对象列表保存为JSON格式文件。
+    将Document对象列表保存为JSON格式文件，以 .jsonl 结尾时按行写入 JSON Lines。
 
     参数:
         docs (list): 包含Document对象的列表。
-        output_file (str): 输出JSON文件的路径。
+        output_file (str): 输出JSON / JSONL文件的路径。
 
     返回:
         None
@@ -67,7 +67,11 @@ def save_docs_to_json(docs, output_file):
         for doc in docs
     ]
     with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        if output_file.endswith(".jsonl"):
+            for item in data:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        else:
+            json.dump(data, f, ensure_ascii=False, indent=2)
     print(f"FAQ 已保存到 {output_file}")
 
 if __name__ == "__main__":
@@ -1,16 +1,44 @@
 # 通过向量计算语义相似度
+#
+# 不带参数运行时对下方的示例文本逐对打印余弦相似度；--input 指定语料文件（每行一条文本）时可处理数万条文本：
+# - 按 EMBED_BATCH_SIZE 条一批并发向量化，已向量化过的文本直接读取本地缓存；
+# - 向量只归一化一次，得到 float32 矩阵 X，余弦相似度即 X @ X.T；
+# - X @ X.T 按 TILE_SIZE × TILE_SIZE 分块计算，除 X 本身外内存占用只取决于分块大小：
+#   --top-k N 流式输出每条文本最相似的 N 条，--matrix sim.npy 把完整相似度矩阵逐块写入磁盘。
+#
+#   python similarity.py --input sentences.txt --top-k 5 --output neighbors.jsonl
+#   python similarity.py --input sentences.txt --matrix sim.npy
 
 import dashscope
 import json
 import os
-from http import HTTPStatus
+import sys
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import dotenv
 import numpy as np
 
+# 共享的本地 Embedding 缓存位于 doc-rag 根目录
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from embed_cache import cached_embed, print_stats
+
 # 读取env配置
 dotenv.load_dotenv()
 dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
 
+# ========== 配置 ==========
+EMBEDDING_MODEL = "multimodal-embedding-v1"
+# 单次 Embedding 请求的文本条数
+EMBED_BATCH_SIZE = 10
+# 同时在途的 Embedding 请求数
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# 分块边长：每次计算 TILE_SIZE × TILE_SIZE 的相似度块（2048 时约 16MB）
+TILE_SIZE = int(os.getenv("SIMILARITY_TILE_SIZE", "2048"))
+# 文本数不超过该值时打印逐对比较结果
+PAIR_REPORT_LIMIT = 20
+
 # 准备输入文本数据
 texts = [
     '我喜欢吃苹果',
@@ -18,37 +46,171 @@ texts = [
     '我喜欢用苹果手机'
 ]
 
-# 获取每个文本的embedding向量
-embeddings = []
-
-for text in texts:
-    input_data = [{'text': text}]
-    resp = dashscope.MultiModalEmbedding.call(
-        model="multimodal-embedding-v1",
-        input=input_data
-    )
-
-    if resp.status_code == HTTPStatus.OK:
-        embedding = resp.output['embeddings'][0]['embedding']
-        embeddings.append(embedding)
-
-# 计算余弦相似度
-def cosine_similarity(vec1, vec2):
-    # 计算两个向量的余弦相似度
-    dot_product = np.dot(vec1, vec2)
-    norm_vec1 = np.linalg.norm(vec1)
-    norm_vec2 = np.linalg.norm(vec2)
-    return dot_product / (norm_vec1 * norm_vec2)
-
-# 比较所有文本之间的相似度
-print("文本相似度比较结果:")
-print("=" * 60)
-
-for i in range(len(texts)):
-    for j in range(i+1, len(texts)):
-        similarity = cosine_similarity(embeddings[i], embeddings[j])
-        print(f"文本{i+1} vs 文本{j+1}:")
-        print(f"  文本{i+1}: {texts[i]}")
-        print(f"  文本{j+1}: {texts[j]}")
-        print(f"  余弦相似度: {similarity:.4f}")
-        print("-" * 40)
+
+def load_texts(file_path: str) -> list:
+    """
+    读取语料文件，每行一条文本，忽略空行。
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def embed_matrix(texts: list, batch_size: int = EMBED_BATCH_SIZE, concurrency: int = EMBED_CONCURRENCY) -> np.ndarray:
+    """
+    批量向量化文本并按行归一化。
+
+    参数:
+        texts (list[str]): 待向量化的文本列表。
+        batch_size (int): 单次 Embedding 请求的文本条数。
+        concurrency (int): 同时在途的 Embedding 请求数。
+
+    返回:
+        np.ndarray: 形状为 (len(texts), 维度) 的 float32 单位向量矩阵，零向量保持为零。
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        vectors = [v for batch in pool.map(lambda b: cached_embed(b, model=EMBEDDING_MODEL), batches) for v in batch]
+    matrix = np.vstack([np.frombuffer(v, dtype=np.float32) for v in vectors])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def similarity_matrix(matrix: np.ndarray, tile: int = TILE_SIZE, path: str = None) -> np.ndarray:
+    """
+    分块计算完整的余弦相似度矩阵，只计算上三角的块，下三角由转置填充。
+
+    参数:
+        matrix (np.ndarray): 归一化后的向量矩阵，见 embed_matrix。
+        tile (int): 分块边长。
+        path (str): 结果文件路径（.npy）；指定时写入磁盘上的内存映射，结果不占用内存。
+
+    返回:
+        np.ndarray: 形状为 (n, n) 的 float32 相似度矩阵。
+    """
+    n = len(matrix)
+    if path:
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, n))
+    else:
+        out = np.empty((n, n), dtype=np.float32)
+    for i in range(0, n, tile):
+        rows = matrix[i:i + tile]
+        for j in range(i, n, tile):
+            block = rows @ matrix[j:j + tile].T
+            out[i:i + tile, j:j + tile] = block
+            if j != i:
+                out[j:j + tile, i:i + tile] = block.T
+    if path:
+        out.flush()
+    return out
+
+
+def iter_top_k(matrix: np.ndarray, top_k: int, tile: int = TILE_SIZE):
+    """
+    流式计算每条文本最相似的 top_k 条（不含自身）。
+
+    每次取 tile 行，与全部列按块计算相似度，并与当前的 top_k 候选合并，
+    内存占用约为 tile × (tile + top_k)，与文本总数无关。
+
+    参数:
+        matrix (np.ndarray): 归一化后的向量矩阵，见 embed_matrix。
+        top_k (int): 每行保留的近邻数，超过 n - 1 时按 n - 1 处理。
+        tile (int): 分块边长。
+
+    返回:
+        Iterator[tuple]: 按行块产出 (起始行号, 近邻下标, 相似度)，后两者形状为 (行数, top_k)，按相似度降序。
+    """
+    n = len(matrix)
+    top_k = min(top_k, n - 1)
+    if top_k <= 0:
+        return
+    for start in range(0, n, tile):
+        rows = matrix[start:start + tile]
+        best_scores = np.full((len(rows), top_k), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(rows), top_k), dtype=np.int64)
+        for col in range(0, n, tile):
+            block = rows @ matrix[col:col + tile].T
+            # 行块与列块重叠时，对角线上是文本与自身的相似度，排除
+            lo, hi = max(start, col), min(start + len(rows), col + block.shape[1])
+            if lo < hi:
+                block[np.arange(lo - start, hi - start), np.arange(lo - col, hi - col)] = -np.inf
+            scores = np.concatenate([best_scores, block], axis=1)
+            ids = np.concatenate([best_ids, np.broadcast_to(np.arange(col, col + block.shape[1]), block.shape)], axis=1)
+            keep = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+            best_ids = np.take_along_axis(ids, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        yield start, np.take_along_axis(best_ids, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def print_pairs(texts: list, similarities: np.ndarray):
+    """
+    打印所有文本两两之间的相似度。
+    """
+    print("文本相似度比较结果:")
+    print("=" * 60)
+
+    for i in range(len(texts)):
+        for j in range(i+1, len(texts)):
+            print(f"文本{i+1} vs 文本{j+1}:")
+            print(f"  文本{i+1}: {texts[i]}")
+            print(f"  文本{j+1}: {texts[j]}")
+            print(f"  余弦相似度: {similarities[i, j]:.4f}")
+            print("-" * 40)
+
+
+def write_top_k(texts: list, matrix: np.ndarray, top_k: int, tile: int = TILE_SIZE, output: str = None):
+    """
+    逐行输出每条文本的 top_k 近邻，指定 output 时写入 JSONL 文件，否则打印。
+    """
+    f = open(output, "w", encoding="utf-8") if output else None
+    try:
+        for start, ids, scores in iter_top_k(matrix, top_k, tile):
+            for offset, (row_ids, row_scores) in enumerate(zip(ids, scores)):
+                i = start + offset
+                if f:
+                    f.write(json.dumps({
+                        "id": i,
+                        "text": texts[i],
+                        "neighbors": [{"id": int(j), "score": round(float(s), 6)} for j, s in zip(row_ids, row_scores)]
+                    }, ensure_ascii=False) + "\n")
+                else:
+                    print(f"文本{i+1}: {texts[i]}")
+                    for j, s in zip(row_ids, row_scores):
+                        print(f"  {s:.4f}  文本{j+1}: {texts[j]}")
+    finally:
+        if f:
+            f.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量计算文本之间的语义相似度")
+    parser.add_argument("--input", help="语料文件，每行一条文本；不指定时使用示例文本")
+    parser.add_argument("--top-k", type=int, help="输出每条文本最相似的 K 条")
+    parser.add_argument("--output", help="近邻结果的 JSONL 文件，不指定时打印")
+    parser.add_argument("--matrix", help="把完整相似度矩阵写入该 .npy 文件")
+    parser.add_argument("--tile", type=int, default=TILE_SIZE, help="分块边长")
+    args = parser.parse_args()
+
+    if args.input:
+        texts = load_texts(args.input)
+
+    # 获取每个文本的embedding向量（已向量化过的文本直接读取本地缓存）
+    if not args.top_k and not args.matrix:
+        if len(texts) > PAIR_REPORT_LIMIT:
+            parser.error(f"文本超过 {PAIR_REPORT_LIMIT} 条时请使用 --top-k 或 --matrix")
+        print_pairs(texts, similarity_matrix(embed_matrix(texts)))
+    else:
+        start = time.perf_counter()
+        embeddings = embed_matrix(texts)
+        print(f"✅ 已向量化 {len(texts)} 条文本，维度 {embeddings.shape[1]}，耗时 {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        if args.top_k:
+            write_top_k(texts, embeddings, args.top_k, args.tile, args.output)
+        if args.matrix:
+            similarity_matrix(embeddings, args.tile, path=args.matrix)
+            print(f"💾 已写入 {len(texts)}×{len(texts)} 相似度矩阵: {args.matrix}")
+        print(f"⏱️ 相似度计算耗时 {time.perf_counter() - start:.2f}s")
+
+    # 输出缓存命中情况
+    print_stats()
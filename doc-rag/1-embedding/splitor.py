@@ -1,10 +1,45 @@
 # 通义千问进行Token长度切分
+#
+# 切分基于 fast tokenizer 的 offset mapping：每个 token 对应原文中的字符区间，
+# 片段直接按区间从原文截取，不再逐块 decode。同一模型的 tokenizer 在进程内只加载一次。
+# - split_batch：一次编码多篇文档；
+# - iter_split_file：按窗口读取超大文件，逐块产出片段，内存占用与文件大小无关；
+# - python splitor.py example.md --bench：对比 offset 截取与逐块 decode 的切分速度。
 
+import time
+import argparse
+import threading
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 from transformers import AutoTokenizer
 from PyPDF2 import PdfReader
 
+# ========== 配置 ==========
+DEFAULT_MODEL = "Qwen/Qwen2.5-7B"
+# 流式切分时每次读取的字符数
+STREAM_WINDOW_CHARS = 1_000_000
+# 流式切分时窗口末尾保留的 token 数：窗口边界处的分词结果可能与全文不同，这部分留到下一个窗口再切
+STREAM_TAIL_TOKENS = 32
+
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(model_name: str = DEFAULT_MODEL):
+    """
+    获取进程内共享的 tokenizer（按模型名懒加载）。
+
+    参数:
+        model_name (str): 用于加载 tokenizer 的模型名称。
+
+    返回:
+        PreTrainedTokenizerBase: 分词器对象。
+    """
+    with _tokenizers_lock:
+        if model_name not in _tokenizers:
+            _tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True, use_fast=True)
+        return _tokenizers[model_name]
+
 
 class DocumentLoader:
     """
@@ -86,17 +121,22 @@ class QwenTextSplitter:
     基于指定模型的 tokenizer 对文本进行切分的工具类。
 
     属性:
-        tokenizer: 使用的分词器对象。
+        tokenizer: 使用的分词器对象，同一模型的多个切分器共享同一个实例。
     """
 
-    def __init__(self, model_name: str = "Qwen/Qwen2.5-7B"):
+    def __init__(self, model_name: str = DEFAULT_MODEL):
         """
         初始化分词器。
 
         参数:
             model_name (str): 用于加载 tokenizer 的模型名称，默认为 "Qwen/Qwen2.5-7B"。
+
+        异常:
+            ValueError: 当模型没有 fast tokenizer、无法提供 offset mapping 时抛出。
         """
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+        self.tokenizer = get_tokenizer(model_name)
+        if not self.tokenizer.is_fast:
+            raise ValueError(f"{model_name} 没有 fast tokenizer，无法按 offset mapping 切分")
 
     def count_tokens(self, text: str) -> int:
         """
@@ -110,6 +150,35 @@ class QwenTextSplitter:
         """
         return len(self.tokenizer.encode(text))
 
+    def _offsets(self, texts: List[str]) -> List[list]:
+        """
+        批量编码文本，返回每篇文本各 token 在原文中的 (起始, 结束) 字符位置。
+        """
+        encoded = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True,
+                                 return_attention_mask=False)
+        return encoded["offset_mapping"]
+
+    @staticmethod
+    def _chunk_spans(offsets: list, max_tokens: int, overlap: int, final: bool = True):
+        """
+        按 token 数量划分片段，返回各片段在原文中的字符区间，以及下一个片段的起始 token 下标。
+
+        final 为 False 时（流式窗口尚未读到文件末尾），只划分结束位置距离末尾超过 STREAM_TAIL_TOKENS 的片段。
+        """
+        if overlap >= max_tokens:
+            raise ValueError(f"overlap ({overlap}) 必须小于 max_tokens ({max_tokens})")
+        spans = []
+        start = 0
+        limit = len(offsets) if final else len(offsets) - STREAM_TAIL_TOKENS
+        while start < len(offsets):
+            end = min(start + max_tokens, len(offsets))
+            if not final and end > limit:
+                break
+            # 字节级 BPE 可能把一个汉字拆成多个 token，区间取整个字符，不会截出半个字
+            spans.append((offsets[start][0], offsets[end - 1][1]))
+            start += max_tokens - overlap
+        return spans, start
+
     def split_by_tokens(self, text: str, max_tokens: int = 500, overlap: int = 50) -> List[str]:
         """
         将文本按照最大 token 数量进行切分，并允许设置重叠 token 数量。
@@ -122,7 +191,67 @@ class QwenTextSplitter:
         返回:
             List[str]: 切分后的文本片段列表。
         """
-        tokens = self.tokenizer.encode(text)
+        return self.split_batch([text], max_tokens, overlap)[0]
+
+    def split_batch(self, texts: List[str], max_tokens: int = 500, overlap: int = 50) -> List[List[str]]:
+        """
+        一次编码多篇文档并分别切分。
+
+        参数:
+            texts (List[str]): 待切分的文本列表。
+            max_tokens (int): 每个片段的最大 token 数量。
+            overlap (int): 片段之间的 token 重叠数。
+
+        返回:
+            List[List[str]]: 与 texts 一一对应的片段列表。
+        """
+        results = []
+        for text, offsets in zip(texts, self._offsets(texts)):
+            spans, _ = self._chunk_spans(offsets, max_tokens, overlap)
+            results.append([text[a:b] for a, b in spans])
+        return results
+
+    def iter_split_file(self, file_path: str, max_tokens: int = 500, overlap: int = 50,
+                        window_chars: int = STREAM_WINDOW_CHARS) -> Iterator[str]:
+        """
+        流式切分超大的 txt / md 文件：每次读取 window_chars 个字符，切出完整的片段后，
+        把最后一个未切出片段的起点之后的内容留到下一个窗口。
+
+        窗口边界处的分词可能与整篇编码略有差异，片段内容与 split_by_tokens 的结果基本一致。
+
+        参数:
+            file_path (str): 文本文件的路径。
+            max_tokens (int): 每个片段的最大 token 数量。
+            overlap (int): 片段之间的 token 重叠数。
+            window_chars (int): 每次读取的字符数。
+
+        返回:
+            Iterator[str]: 文本片段。
+        """
+        buffer = ""
+        with open(file_path, "r", encoding="utf-8") as f:
+            while True:
+                piece = f.read(window_chars)
+                final = not piece
+                buffer += piece
+                if not buffer:
+                    return
+                offsets = self._offsets([buffer])[0]
+                spans, next_start = self._chunk_spans(offsets, max_tokens, overlap, final=final)
+                for a, b in spans:
+                    yield buffer[a:b]
+                if final:
+                    return
+                if next_start < len(offsets):
+                    buffer = buffer[offsets[next_start][0]:]
+                else:
+                    buffer = ""
+
+    def split_by_decode(self, text: str, max_tokens: int = 500, overlap: int = 50) -> List[str]:
+        """
+        逐块 decode 的切分方式，仅作为 --bench 的对照组。
+        """
+        tokens = self.tokenizer.encode(text, add_special_tokens=False)
         chunks = []
         start = 0
         while start < len(tokens):
@@ -134,16 +263,50 @@ class QwenTextSplitter:
         return chunks
 
 
+def benchmark(splitter: QwenTextSplitter, text: str, max_tokens: int = 300, overlap: int = 50, repeat: int = 3):
+    """
+    对比 offset 截取与逐块 decode 两种切分方式的速度，各取 repeat 次中最快的一次。
+    """
+    for name, split in (("逐块 decode", splitter.split_by_decode), ("offset 截取", splitter.split_by_tokens)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks = split(text, max_tokens=max_tokens, overlap=overlap)
+            best = min(best, time.perf_counter() - start)
+        print(f"📊 {name}: {len(chunks)} 块，耗时 {best:.3f}s，{len(chunks) / best:.1f} 块/秒，"
+              f"{len(text) / best / 1024 / 1024:.2f} M字符/秒")
+
 if __name__ == "__main__":
-    # 加载示例文档
-    file_path = "example.md"
-    text = DocumentLoader.load_document(file_path)
-
-    # 初始化文本切分器并统计原始 token 数量
-    splitter = QwenTextSplitter(model_name="Qwen/Qwen3-14B")  # 模型名要和 HF 对应
-    print("原始 Token 数:", splitter.count_tokens(text))
-
-    # 按 token 切分文本
-    chunks = splitter.split_by_tokens(text, max_tokens=300, overlap=50)
-    print("按 Token 切分:", len(chunks), "块")
-    print("第一块示例:\n", chunks[0][:200], "...")
+    parser = argparse.ArgumentParser(description="按 Token 长度切分文档")
+    parser.add_argument("file_path", nargs="?", default="example.md", help="文档路径（txt / pdf / md）")
+    parser.add_argument("--model", default="Qwen/Qwen3-14B", help="tokenizer 对应的模型名，需与 HF 一致")
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--stream", action="store_true", help="按窗口流式切分超大的 txt / md 文件")
+    parser.add_argument("--bench", action="store_true", help="对比 offset 截取与逐块 decode 的切分速度")
+    args = parser.parse_args()
+
+    # 初始化文本切分器
+    splitter = QwenTextSplitter(model_name=args.model)
+
+    if args.stream:
+        count = 0
+        start = time.perf_counter()
+        for chunk in splitter.iter_split_file(args.file_path, max_tokens=args.max_tokens, overlap=args.overlap):
+            if count == 0:
+                print("第一块示例:\n", chunk[:200], "...")
+            count += 1
+        elapsed = time.perf_counter() - start
+        print(f"按 Token 流式切分: {count} 块，耗时 {elapsed:.2f}s，{count / elapsed:.1f} 块/秒")
+    else:
+        # 加载示例文档并统计原始 token 数量
+        text = DocumentLoader.load_document(args.file_path)
+        print("原始 Token 数:", splitter.count_tokens(text))
+
+        # 按 token 切分文本
+        chunks = splitter.split_by_tokens(text, max_tokens=args.max_tokens, overlap=args.overlap)
+        print("按 Token 切分:", len(chunks), "块")
+        print("第一块示例:\n", chunks[0][:200], "...")
+
+        if args.bench:
+            benchmark(splitter, text, max_tokens=args.max_tokens, overlap=args.overlap)
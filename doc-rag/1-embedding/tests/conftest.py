@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 各示例以脚本形式平铺在 1-embedding 目录下
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
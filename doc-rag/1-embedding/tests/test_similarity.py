@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("dashscope")
+
+from similarity import iter_top_k, similarity_matrix  # noqa: E402
+
+
+def unit_rows(n, dim=8, seed=0):
+    matrix = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def brute_force_top_k(matrix, top_k):
+    sims = matrix @ matrix.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :top_k]
+
+
+@pytest.mark.parametrize("tile", [3, 4, 7, 100])
+def test_iter_top_k_matches_brute_force_and_excludes_self(tile):
+    matrix = unit_rows(11)
+    rows = [(start, ids, scores) for start, ids, scores in iter_top_k(matrix, 3, tile=tile)]
+    ids = np.vstack([block for _, block, _ in rows])
+    scores = np.vstack([block for _, _, block in rows])
+
+    assert [start for start, _, _ in rows] == list(range(0, 11, tile))
+    assert not (ids == np.arange(11)[:, None]).any()
+    np.testing.assert_array_equal(ids, brute_force_top_k(matrix, 3))
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+
+def test_iter_top_k_excludes_self_even_for_identical_rows():
+    matrix = np.tile(unit_rows(1), (4, 1))
+    for start, ids, _ in iter_top_k(matrix, 3, tile=2):
+        for offset, row in enumerate(ids):
+            assert start + offset not in row
+
+
+def test_iter_top_k_clamps_top_k_to_other_rows():
+    matrix = unit_rows(3)
+    (_, ids, _), = list(iter_top_k(matrix, 10, tile=8))
+    assert ids.shape == (3, 2)
+    assert list(iter_top_k(unit_rows(1), 5)) == []
+
+
+def test_similarity_matrix_tiles_match_dense_product(tmp_path):
+    matrix = unit_rows(10)
+    expected = matrix @ matrix.T
+    np.testing.assert_allclose(similarity_matrix(matrix, tile=3), expected, rtol=1e-5, atol=1e-6)
+    on_disk = similarity_matrix(matrix, tile=4, path=str(tmp_path / "sim.npy"))
+    np.testing.assert_allclose(np.load(tmp_path / "sim.npy"), expected, rtol=1e-5, atol=1e-6)
+    assert on_disk.shape == (10, 10)
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("transformers")
+pytest.importorskip("PyPDF2")
+
+from splitor import QwenTextSplitter, STREAM_TAIL_TOKENS  # noqa: E402
+
+chunk_spans = QwenTextSplitter._chunk_spans
+
+
+def char_offsets(n):
+    """
+    每个 token 对应一个字符的 offset mapping。
+    """
+    return [(i, i + 1) for i in range(n)]
+
+
+def test_chunk_spans_with_overlap_covers_text():
+    spans, next_start = chunk_spans(char_offsets(10), max_tokens=4, overlap=1)
+    assert spans == [(0, 4), (3, 7), (6, 10), (9, 10)]
+    assert next_start == 12
+
+
+def test_chunk_spans_rejects_overlap_not_smaller_than_max_tokens():
+    with pytest.raises(ValueError):
+        chunk_spans(char_offsets(10), max_tokens=4, overlap=4)
+
+
+def test_chunk_spans_keeps_multi_token_characters_whole():
+    # 一个汉字被字节级 BPE 拆成两个 token 时，两个 token 的区间相同
+    offsets = [(0, 1), (0, 1), (1, 2), (2, 3)]
+    spans, _ = chunk_spans(offsets, max_tokens=1, overlap=0)
+    assert spans == [(0, 1), (0, 1), (1, 2), (2, 3)]
+
+
+def test_chunk_spans_not_final_holds_back_window_tail():
+    total = STREAM_TAIL_TOKENS + 20
+    spans, next_start = chunk_spans(char_offsets(total), max_tokens=8, overlap=2, final=False)
+    # 只切分结束位置距离窗口末尾不少于 STREAM_TAIL_TOKENS 的片段
+    assert spans
+    assert all(end <= total - STREAM_TAIL_TOKENS for _, end in spans)
+    assert next_start + 8 > total - STREAM_TAIL_TOKENS
+    assert next_start == 6 * len(spans)
+
+    final_spans, _ = chunk_spans(char_offsets(total), max_tokens=8, overlap=2)
+    assert final_spans[:len(spans)] == spans
+
+
+def test_chunk_spans_not_final_with_short_window_returns_nothing():
+    spans, next_start = chunk_spans(char_offsets(STREAM_TAIL_TOKENS), max_tokens=8, overlap=2, final=False)
+    assert spans == []
+    assert next_start == 0
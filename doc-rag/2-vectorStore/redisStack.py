@@ -1,13 +1,19 @@
 import os
+import sys
+import hashlib
 import dotenv
 import dashscope
 import redis
 import numpy as np
-from http import HTTPStatus
+from pathlib import Path
 from redis.commands.search.field import TextField, VectorField
 from redis.commands.search.index_definition import IndexDefinition
 from redis.commands.search.query import Query
 
+# 共享的本地 Embedding 缓存位于 doc-rag 根目录
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from embed_cache import cached_embed
+
 # ========== 配置 ==========
 # 加载 .env 文件中的环境变量
 dotenv.load_dotenv()
@@ -66,26 +72,21 @@ def insert_text(text: str):
     参数:
         text (str): 需要转换为向量并存储的原始文本内容。
     """
-    # 调用多模态 embedding 接口获取文本向量
-    resp = dashscope.MultiModalEmbedding.call(
-        model="multimodal-embedding-v1",
-        input=[{"text": text}]
-    )
+    # 调用多模态 embedding 接口获取文本向量（字节格式，优先读取本地缓存）
+    try:
+        vector = cached_embed([text], model="multimodal-embedding-v1")[0]
+    except RuntimeError as e:
+        print(e)
+        return
 
-    if resp.status_code == HTTPStatus.OK:
-        # 提取 embedding 向量并转换为字节格式
-        embedding = resp.output["embeddings"][0]["embedding"]
-        vector = np.array(embedding, dtype=np.float32).tobytes()
-        # 构造 Redis 键名
-        key = f"doc:{resp.request_id}"
-        # 将文本和向量写入 Redis Hash 结构中
-        redis_client.hset(key, mapping={
-            "text": text,
-            "embedding": vector
-        })
-        print(f"✅ 已写入 Redis，key={key}, 向量维度={len(embedding)}")
-    else:
-        print(f"❌ 调用失败: {resp.code}, {resp.message}")
+    # 构造 Redis 键名：同一文本缓存命中时没有请求 ID，改用文本哈希保证唯一
+    key = f"doc:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+    # 将文本和向量写入 Redis Hash 结构中
+    redis_client.hset(key, mapping={
+        "text": text,
+        "embedding": vector
+    })
+    print(f"✅ 已写入 Redis，key={key}, 向量维度={len(np.frombuffer(vector, dtype=np.float32))}")
 
 # ========== 相似度搜索 ==========
 def search_similar(query_text: str, topk: int = 1):
@@ -96,21 +97,13 @@ def search_similar(query_text: str, topk: int = 1):
         query_text (str): 查询用的文本内容。
         topk (int): 返回最相似结果的数量，默认为 1。
     """
-    # 获取查询文本的 embedding 向量
-    resp = dashscope.MultiModalEmbedding.call(
-        model="multimodal-embedding-v1",
-        input=[{"text": query_text}]
-    )
-
-    if resp.status_code != HTTPStatus.OK:
-        print(f"❌ 查询 embedding 失败: {resp.code}, {resp.message}")
+    # 获取查询文本的 embedding 向量（字节格式，优先读取本地缓存）
+    try:
+        query_vector = cached_embed([query_text], model="multimodal-embedding-v1")[0]
+    except RuntimeError as e:
+        print(f"❌ 查询 embedding 失败: {e}")
         return
 
-    # 将查询向量转换为字节格式
-    query_vector = np.array(
-        resp.output["embeddings"][0]["embedding"], dtype=np.float32
-    ).tobytes()
-
     # 构造 KNN 查询语句
     knn_query = f'*=>[KNN {topk} @embedding $vec_param]'
     q = Query(knn_query).sort_by("__embedding_score").paging(0, topk)
@@ -0,0 +1,169 @@
+# 语义答案缓存：与已回答问题足够相似的新问题直接返回缓存的答案，跳过大模型调用。
+#
+# 缓存条目存放在独立的 Redis 向量索引中，记录问题向量、答案以及生成答案时引用的 FAQ 文档 key。
+# FAQ 文档 key 由内容哈希生成，文档内容变化或被删除后 key 随之失效，
+# 引用这些文档的缓存条目会在重新入库时被清除，查询时也会再次确认文档仍然存在。
+# 分片部署时 FAQ 文档位于各分片上，确认存在的逻辑由调用方通过 exists 参数提供（见 retrieve.docs_exist）。
+
+import os
+import time
+import hashlib
+import redis
+from redis.commands.search.field import TextField, NumericField, VectorField
+from redis.commands.search.index_definition import IndexDefinition
+from redis.commands.search.query import Query
+
+# ========== 配置 ==========
+# 答案缓存索引名称与键前缀
+CACHE_INDEX_NAME = "faq_answer_cache"
+CACHE_PREFIX = "answer_cache:"
+# 文档 key -> 引用它的缓存条目集合
+REFS_PREFIX = "answer_cache_refs:"
+# 命中阈值：问题向量的余弦相似度不低于该值才复用答案
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+# 缓存条目有效期（秒）
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+
+
+class AnswerCache:
+    """
+    基于 Redis 向量索引的语义答案缓存。
+
+    属性:
+        redis_client (redis.Redis): Redis 客户端（decode_responses=False）。
+        threshold (float): 命中所需的最小余弦相似度。
+        hits (int): 命中次数。
+        misses (int): 未命中次数。
+    """
+
+    def __init__(self, redis_client, dim: int = 1024, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: int = ANSWER_CACHE_TTL, exists=None):
+        """
+        参数:
+            redis_client (redis.Redis): Redis 客户端。
+            dim (int): 问题向量维度。
+            threshold (float): 命中所需的最小余弦相似度。
+            ttl (int): 缓存条目有效期（秒）。
+            exists (callable): 统计 FAQ 文档 key 中仍然存在的个数，签名为 exists(keys) -> int；
+                默认在 redis_client 上执行 EXISTS，FAQ 不在该节点上时（分片部署）需要传入。
+        """
+        self.redis_client = redis_client
+        self.exists = exists or (lambda keys: redis_client.exists(*keys))
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    # ========== 创建索引 ==========
+    def create_index(self):
+        """
+        创建答案缓存的向量索引，已存在时跳过。
+        """
+        try:
+            self.redis_client.ft(CACHE_INDEX_NAME).info()
+        except redis.ResponseError:
+            # 只有索引不存在（Unknown index name）时创建；连接、认证错误直接抛出
+            self.redis_client.ft(CACHE_INDEX_NAME).create_index(
+                [
+                    TextField("question"),
+                    NumericField("created"),
+                    VectorField(
+                        "embedding",
+                        "HNSW",
+                        {"TYPE": "FLOAT32", "DIM": self.dim, "DISTANCE_METRIC": "COSINE"}
+                    )
+                ],
+                definition=IndexDefinition(prefix=[CACHE_PREFIX])
+            )
+            print("✅ 已创建答案缓存索引")
+
+    # ========== 查询 ==========
+    def lookup(self, q_vector: bytes):
+        """
+        查找与问题向量最相似的缓存答案。
+
+        参数:
+            q_vector (bytes): 问题的 FLOAT32 向量字节。
+
+        返回:
+            str | None: 命中时返回缓存的答案，否则返回 None。
+        """
+        query = (
+            Query("*=>[KNN 1 @embedding $vec AS score]")
+            .sort_by("score")
+            .return_fields("answer", "doc_ids", "score")
+            .dialect(2)
+        )
+        results = self.redis_client.ft(CACHE_INDEX_NAME).search(query, query_params={"vec": q_vector})
+        if results.docs:
+            doc = results.docs[0]
+            # COSINE 距离 = 1 - 余弦相似度
+            if 1 - float(doc.score) >= self.threshold and self._docs_alive(doc.doc_ids):
+                self.hits += 1
+                return doc.answer
+        self.misses += 1
+        return None
+
+    def _docs_alive(self, doc_ids) -> bool:
+        """
+        确认缓存条目引用的 FAQ 文档仍然存在（内容变化的文档 key 会随之变化）。
+        """
+        if isinstance(doc_ids, bytes):
+            doc_ids = doc_ids.decode()
+        keys = [key for key in doc_ids.split(",") if key]
+        return not keys or self.exists(keys) == len(keys)
+
+    # ========== 写入 ==========
+    def store(self, question: str, q_vector: bytes, answer: str, doc_ids: list):
+        """
+        写入一条缓存，并在每个引用文档下登记该条目，便于文档变化时失效。
+
+        参数:
+            question (str): 用户问题。
+            q_vector (bytes): 问题的 FLOAT32 向量字节。
+            answer (str): 大模型生成的答案。
+            doc_ids (list[str]): 生成答案时引用的 FAQ 文档 key。
+        """
+        key = CACHE_PREFIX + hashlib.sha1(q_vector).hexdigest()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hset(key, mapping={
+            "question": question,
+            "answer": answer,
+            "doc_ids": ",".join(doc_ids),
+            "created": int(time.time()),
+            "embedding": q_vector
+        })
+        pipe.expire(key, self.ttl)
+        for doc_id in doc_ids:
+            pipe.sadd(REFS_PREFIX + doc_id, key)
+            pipe.expire(REFS_PREFIX + doc_id, self.ttl)
+        pipe.execute()
+
+    # ========== 失效 ==========
+    def invalidate_docs(self, doc_ids) -> int:
+        """
+        删除引用了指定 FAQ 文档的全部缓存条目。
+
+        参数:
+            doc_ids (Iterable[str]): 被删除或更新的 FAQ 文档 key。
+
+        返回:
+            int: 删除的缓存条目数量。
+        """
+        removed = 0
+        doc_ids = list(doc_ids)
+        for start in range(0, len(doc_ids), 500):
+            chunk = doc_ids[start:start + 500]
+            # 先批量取出引用集合，再批量删除条目与引用集合
+            pipe = self.redis_client.pipeline(transaction=False)
+            for doc_id in chunk:
+                pipe.smembers(REFS_PREFIX + doc_id)
+            entries = set().union(*pipe.execute())
+            for entry in entries:
+                pipe.delete(entry)
+            for doc_id in chunk:
+                pipe.delete(REFS_PREFIX + doc_id)
+            pipe.execute()
+            removed += len(entries)
+        return removed
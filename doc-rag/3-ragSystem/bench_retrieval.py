@@ -0,0 +1,249 @@
+# 离线检索基准：在标注问题集上回放检索流程，统计 recall@k、MRR 和分阶段延迟。
+#
+# 不调用 DashScope：使用确定性的本地哈希向量（字符一元/二元组特征哈希），
+# 同一份数据、同一份代码多次运行结果一致，可用于对比 TOP_K、检索模式、过滤条件、索引结构、精度等改动前后的差异。
+#
+# 检索直接调用 retrieve.search_faq，只替换索引名与问题向量化函数（retrieve.override_backend），
+# 检索模式、预过滤、INT8 重排与降维都与线上流程一致。
+# 索引可以是本地 Redis Stack（独立的 faq_bench 索引，不影响线上 faq_index，结构取 INDEX_SCHEMA 配置），
+# 也可以是临时目录中的 NumPy 后端（--backend numpy，或等价的 --backend memory）。
+#
+# 用法：
+#   python bench_retrieval.py --faq faq_processed.json                      # 以每条 FAQ 的问题自身作为标注
+#   python bench_retrieval.py --faq faq_processed.json --labels labeled.jsonl --backend numpy
+#   python bench_retrieval.py --faq faq_processed.json --mode hybrid --filters '{"category": ["退款"]}'
+# 标注文件为 JSONL，每行形如 {"question": "...", "expected": ["faq:<key>", ...]}，与 retrieve.py --compare 一致。
+
+import zlib
+import tempfile
+import json
+import time
+import argparse
+import numpy as np
+import redis
+from redis.commands.search.index_definition import IndexDefinition
+
+from embedding import iter_docs, faq_key, faq_mapping, embedding_text, index_fields, VECTOR_DIM, INDEX_DIM
+from query_cache import normalize_question
+from numpy_store import NumpyVectorStore
+from reduce import reduce_vector
+from retrieve import search_faq, override_backend, redis_client, TOP_K, SEARCH_MODE
+
+# ========== 配置 ==========
+# 基准索引名称与键前缀，与线上索引隔离
+BENCH_INDEX_NAME = "faq_bench"
+BENCH_PREFIX = "faq_bench:"
+# 统计 recall@k 的 k 值
+BENCH_KS = (1, 3, 5, 10)
+
+
+# ========== 本地确定性向量 ==========
+class HashingEmbedder:
+    """
+    字符一元/二元组的特征哈希向量，作为离线环境下 DashScope Embedding 的替代。
+
+    使用 crc32 而非内置 hash()，保证跨进程结果一致；字面重合越多的文本余弦相似度越高。
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+        # 最近一次调用的耗时，用于拆分 search_faq 中向量化阶段的延迟
+        self.elapsed = 0.0
+
+    def embed_one(self, text: str) -> np.ndarray:
+        text = normalize_question(text)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+        for gram in grams:
+            h = zlib.crc32(gram.encode("utf-8"))
+            # 最高位决定符号，减小哈希冲突带来的偏差
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def __call__(self, texts: list) -> list:
+        """
+        参数:
+            texts (list[str]): 待向量化的文本。
+
+        返回:
+            list[bytes]: FLOAT32 向量字节，与 embed_cache.cached_embed 的返回结构一致。
+        """
+        return [self.embed_one(text).tobytes() for text in texts]
+
+    def embed_question(self, text: str) -> bytes:
+        """
+        单条问题的向量化，签名与 retrieve.query_cache 的 embed_fn 一致，并记录耗时。
+        """
+        start = time.perf_counter()
+        vector = self.embed_one(text).tobytes()
+        self.elapsed = time.perf_counter() - start
+        return vector
+
+
+# ========== 索引后端 ==========
+class RedisBench:
+    """
+    本地 Redis Stack 上的基准索引，字段结构与线上索引一致（index_fields），键前缀独立。
+    """
+
+    index_name = BENCH_INDEX_NAME
+    store = None
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    def build(self, docs: list, vectors: list):
+        try:
+            self.redis_client.ft(BENCH_INDEX_NAME).dropindex(delete_documents=True)
+        except redis.ResponseError:
+            pass
+        self.redis_client.ft(BENCH_INDEX_NAME).create_index(
+            index_fields(),
+            definition=IndexDefinition(prefix=[BENCH_PREFIX], language="chinese")
+        )
+        pipe = self.redis_client.pipeline(transaction=False)
+        for doc, vector in zip(docs, vectors):
+            pipe.hset(bench_key(doc), mapping=faq_mapping(doc, vector))
+            if len(pipe) >= 500:
+                pipe.execute()
+        pipe.execute()
+        while int(self.redis_client.ft(BENCH_INDEX_NAME).info().get("indexing", 0)):
+            time.sleep(0.2)
+
+    def drop(self):
+        self.redis_client.ft(BENCH_INDEX_NAME).dropindex(delete_documents=True)
+
+
+class NumpyBench:
+    """
+    临时目录中的 NumPy 后端索引（numpy_store.NumpyVectorStore），无需 Redis。
+    """
+
+    index_name = None
+
+    def __init__(self):
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="faq_bench_")
+        self.store = NumpyVectorStore(self.tmpdir.name, dim=INDEX_DIM)
+
+    def build(self, docs: list, vectors: list):
+        self.store.create_index()
+        self.store.add([bench_key(doc) for doc in docs], [faq_mapping(doc) for doc in docs], vectors)
+        self.store.flush()
+
+    def drop(self):
+        self.tmpdir.cleanup()
+
+
+# ========== 标注数据 ==========
+def bench_key(doc: dict) -> str:
+    """
+    基准索引中的键名：与线上键使用同一内容哈希，只替换前缀。
+    """
+    return BENCH_PREFIX + faq_key(doc).split(":", 1)[1]
+
+
+def doc_hash(key: str) -> str:
+    """
+    去掉键前缀，使 faq:<hash> 与 faq_bench:<hash> 可以直接比较。
+    """
+    return key.split(":", 1)[1]
+
+
+def load_labels(labels_file: str, docs: list) -> list:
+    """
+    读取标注问题集；未提供时以每条 FAQ 的问题自身作为查询、该 FAQ 作为唯一正确答案。
+
+    返回:
+        list[dict]: [{"question": str, "expected": set[str]}]，expected 为去掉前缀的内容哈希。
+    """
+    if labels_file is None:
+        return [{"question": doc["question"], "expected": {doc_hash(faq_key(doc))}} for doc in docs]
+    with open(labels_file, "r", encoding="utf-8") as f:
+        labeled = [json.loads(line) for line in f if line.strip()]
+    return [{"question": item["question"], "expected": {doc_hash(k) for k in item["expected"]}} for item in labeled]
+
+
+# ========== 基准 ==========
+def run_benchmark(backend, embedder, labeled: list, ks=BENCH_KS, mode: str = None, filters: dict = None) -> dict:
+    """
+    逐条回放标注问题，通过 retrieve.search_faq 检索，分别记录向量化与检索两个阶段的耗时。
+
+    参数:
+        backend: RedisBench 或 NumpyBench。
+        embedder (HashingEmbedder): 本地向量化函数。
+        labeled (list[dict]): load_labels 的返回值。
+        ks (tuple[int]): 需要统计 recall@k 的 k 值。
+        mode (str): 检索模式，透传给 search_faq。
+        filters (dict): 元数据预过滤条件，透传给 search_faq。
+
+    返回:
+        dict: recall（k -> 值）、mrr 与各阶段延迟列表（秒）。
+    """
+    max_k = max(ks)
+    hits = {k: 0 for k in ks}
+    reciprocal_ranks = []
+    # embed：问题向量化（含问题向量缓存与降维之前的本地哈希向量）；search：KNN / 混合检索、INT8 重排与字段读取
+    stages = {"embed": [], "search": [], "total": []}
+
+    with override_backend(backend.index_name, embed_fn=embedder.embed_question, store=backend.store):
+        for item in labeled:
+            embedder.elapsed = 0.0
+            start = time.perf_counter()
+            docs = search_faq(item["question"], top_k=max_k, mode=mode, filters=filters)
+            total = time.perf_counter() - start
+            stages["embed"].append(embedder.elapsed)
+            stages["search"].append(total - embedder.elapsed)
+            stages["total"].append(total)
+
+            ranked = [doc_hash(doc.id) for doc in docs]
+            rank = next((i for i, h in enumerate(ranked, start=1) if h in item["expected"]), None)
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+            for k in ks:
+                if rank and rank <= k:
+                    hits[k] += 1
+
+    return {
+        "recall": {k: hits[k] / len(labeled) for k in ks},
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency": stages,
+    }
+
+
+def print_report(name: str, result: dict, queries: int):
+    recall = "，".join(f"recall@{k}={v:.3f}" for k, v in result["recall"].items())
+    print(f"📊 {name}：{queries} 条查询，{recall}，MRR={result['mrr']:.3f}")
+    for stage, values in result["latency"].items():
+        p50, p95, p99 = (np.percentile(values, p) * 1000 for p in (50, 95, 99))
+        print(f"   {stage:<8} p50 {p50:.2f}ms  p95 {p95:.2f}ms  p99 {p99:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线检索基准")
+    parser.add_argument("--faq", default="faq_processed.json", help="FAQ 数据文件（.json 或 .jsonl）")
+    parser.add_argument("--labels", help="标注问题集（JSONL），缺省时以 FAQ 问题自身作为查询")
+    parser.add_argument("--backend", choices=["redis", "numpy", "memory"], default="redis",
+                        help="基准索引后端，memory 与 numpy 相同（进程内 NumPy 索引）")
+    parser.add_argument("--mode", choices=["vector", "hybrid"], default=SEARCH_MODE, help="检索模式")
+    parser.add_argument("--filters", type=json.loads, help='元数据预过滤条件（JSON），如 {"category": ["退款"]}')
+    parser.add_argument("--keep", action="store_true", help="保留 Redis 基准索引")
+    args = parser.parse_args()
+
+    docs = list(iter_docs(args.faq))
+    embedder = HashingEmbedder()
+    labeled = load_labels(args.labels, docs)
+
+    if args.backend == "redis":
+        backend = RedisBench(redis_client)
+    else:
+        backend = NumpyBench()
+
+    start = time.perf_counter()
+    # 与 embedding.embed_texts 一致：入库前按 VECTOR_REDUCE 配置降维
+    backend.build(docs, [reduce_vector(v) for v in embedder([embedding_text(doc) for doc in docs])])
+    print(f"✅ 已建立 {args.backend} 基准索引：{len(docs)} 条 FAQ，耗时 {time.perf_counter() - start:.2f}s")
+
+    result = run_benchmark(backend, embedder, labeled, mode=args.mode, filters=args.filters)
+    print_report(f"{args.backend} 后端（{args.mode} 检索，默认 TOP_K={TOP_K}）", result, len(labeled))
+    if not args.keep or args.backend != "redis":
+        backend.drop()
@@ -0,0 +1,131 @@
+# 可断点续传的入库检查点：记录输入文件中已确认写入的位置，中断后 --resume 从该位置继续。
+#
+# 批次并发完成、乱序提交，检查点只记录“连续已提交”的前缀：
+# 第 1..N 批全部写入 Redis（pipeline 已执行）或进入死信文件后，才把位置推进到第 N 批末尾。
+# .jsonl 文件同时记录字节偏移，恢复时直接 seek；JSON 数组按条数跳过（只解析，不向量化、不写入）。
+#
+# 检查点文件先写临时文件再原子替换，写入中断不会留下损坏的检查点；入库全部完成后删除。
+
+import os
+import json
+import time
+from pathlib import Path
+
+# 两次落盘之间的最短间隔（秒）
+CHECKPOINT_INTERVAL = 1.0
+
+
+class IngestCheckpoint:
+    """
+    单个输入文件的入库进度。
+
+    属性:
+        docs (int): 已确认写入的条数（连续前缀）。
+        offset (int | None): 已确认写入位置的字节偏移，仅 .jsonl 文件有效。
+    """
+
+    def __init__(self, file_path: str, path: str = None):
+        """
+        参数:
+            file_path (str): 输入文件路径。
+            path (str): 检查点文件路径，默认为输入文件旁的 <文件名>.ckpt.json。
+        """
+        self.file_path = file_path
+        self.path = Path(path or f"{file_path}.ckpt.json")
+        self.docs = 0
+        self.offset = 0 if file_path.endswith(".jsonl") else None
+        self._next_batch = 1
+        self._watermark = 0
+        self._sizes = {}
+        self._done = set()
+        self._offsets = {}
+        self._saved_at = 0.0
+
+    def _fingerprint(self) -> dict:
+        stat = os.stat(self.file_path)
+        return {"file": os.path.abspath(self.file_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+    # ========== 恢复 ==========
+    def load(self) -> bool:
+        """
+        读取已有检查点；输入文件在中断后被修改过时忽略检查点，从头开始。
+
+        返回:
+            bool: 成功恢复时返回 True。
+        """
+        if not self.path.exists():
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if {k: state.get(k) for k in ("file", "size", "mtime")} != self._fingerprint():
+            print(f"⚠️ {self.file_path} 在上次中断后已变化，忽略检查点 {self.path}")
+            return False
+        self.docs, self.offset = state["docs"], state["offset"]
+        print(f"⏩ 从检查点恢复：跳过已写入的 {self.docs} 条")
+        return True
+
+    def track(self, items):
+        """
+        记录每条数据之后的字节偏移，供提交批次时推进检查点。
+
+        参数:
+            items (Iterable[tuple]): 从检查点位置开始的 (doc, end_offset)，见 embedding.iter_docs_with_offsets。
+
+        返回:
+            Iterator[dict]: FAQ 数据。
+        """
+        ordinal = self.docs
+        for doc, offset in items:
+            ordinal += 1
+            if offset is not None:
+                self._offsets[ordinal] = offset
+            yield doc
+
+    # ========== 记录 ==========
+    def submit(self, size: int) -> int:
+        """
+        登记一个按输入顺序切分的批次。
+
+        返回:
+            int: 批次编号。
+        """
+        batch_no = self._next_batch
+        self._next_batch += 1
+        self._sizes[batch_no] = size
+        return batch_no
+
+    def commit(self, batch_nos):
+        """
+        标记批次已持久化（写入存储或进入死信文件），推进连续前缀并按间隔落盘。
+
+        参数:
+            batch_nos (Iterable[int]): 已持久化的批次编号。
+        """
+        self._done.update(batch_nos)
+        while self._watermark + 1 in self._done:
+            self._watermark += 1
+            self._done.discard(self._watermark)
+            self.docs += self._sizes.pop(self._watermark)
+            if self.offset is not None:
+                self.offset = self._offsets.pop(self.docs, self.offset)
+        # 已经越过的偏移记录不再需要
+        for ordinal in [o for o in self._offsets if o < self.docs]:
+            del self._offsets[ordinal]
+        if time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self):
+        state = {**self._fingerprint(), "docs": self.docs, "offset": self.offset}
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._saved_at = time.monotonic()
+
+    def clear(self):
+        """
+        入库全部完成后删除检查点。
+        """
+        self.path.unlink(missing_ok=True)
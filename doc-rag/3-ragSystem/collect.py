@@ -4,8 +4,77 @@
 # 常见问题 FAQ
 # 内部客服知识库
 # 实时更新的运营公告
+#
+# 单页抓取：python collect.py，抓取 FAQ 首页并保存到 faq.txt。
+#
+# 批量抓取：python collect.py --urls urls.txt（每行一个 URL）或 --sitemap https://.../sitemap.xml
+# 只启动一个无头浏览器，CRAWL_CONCURRENCY 个浏览器上下文各持有一个页面循环复用，
+# 同一站点同时在途的页面数不超过 CRAWL_PER_HOST；图片、字体、媒体和统计脚本在请求阶段直接拦截，
+# 页面只等待 FAQ 区域出现，不再等待 networkidle。结果写入 JSONL（每行一个页面）或每页一个文件。
+#
+# 增量抓取：加上 --state crawl_state.json 后，每个页面记录 ETag / Last-Modified 与 FAQ 区域的内容指纹。
+# 再次抓取时先发条件 HEAD 请求，304 的页面不再渲染；渲染后内容指纹未变的页面同样跳过。
+# 输出只包含新增、变化（change 为 added / modified）与本次列表中已不存在（removed）的页面，即变更集：
+#   python process.py --changes faq_pages.jsonl --output faq_changes.jsonl
+#   python embedding.py --sync --file faq_changes.jsonl --changes faq_pages.jsonl
+# --format files 时每个页面写入 <文件名>.txt 与记录其 URL 的 <文件名>.url，process.py 目录模式以 URL 作为 source；
+# 输出目录保存全部现存页面：已删除页面的文件随之删除，并记录到目录下的 removed.jsonl，
+# 之后以 process.py --input-dir 与 embedding.py --sync 全量同步即可删除其 FAQ。
+#
+# 本地测试：用静态服务器提供若干带 #faq-list 的页面
+#   python -m http.server 8080 --directory ./pages
+#   python collect.py --urls urls.txt --output faq_pages.jsonl
 
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import urllib.request
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse
 from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+
+# ========== 批量抓取配置 ==========
+# 同时打开的页面数（每个页面独占一个浏览器上下文，Cookie 与缓存互不干扰）
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+# 同一站点同时在途的页面数上限
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "4"))
+# 单个页面的加载超时（毫秒）
+PAGE_TIMEOUT = 30_000
+# FAQ 区域的选择器
+FAQ_SELECTOR = "#faq-list"
+# 不影响 FAQ 文本的资源类型，在请求阶段直接拦截
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+# 统计与广告脚本的域名
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "hm.baidu.com", "cnzz.com", "growingio.com", "sensorsdata.cn"
+)
+# 增量抓取状态文件的默认路径
+CRAWL_STATE_PATH = "crawl_state.json"
+# files 格式下记录本次已删除页面（墓碑）的文件名，位于输出目录中
+REMOVED_FILENAME = "removed.jsonl"
+# files 格式下与页面文件同名、保存页面 URL 的附属文件后缀，process.py 目录模式据此把 URL 写入 source
+PAGE_URL_SUFFIX = ".url"
+# sitemap 的 XML 命名空间
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+# 浏览器上下文配置：中文环境
+CONTEXT_OPTIONS = dict(
+    locale='zh-CN',  # 页面 locale
+    user_agent=(
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/139.0.0.0 Safari/537.36 Edg/139.0.0.0"
+    ),
+    extra_http_headers={
+        "Accept-Language": "zh-CN,zh;q=0.9"
+    }
+)
 
 def collect_faq(url):
     """
@@ -25,17 +94,7 @@ def collect_faq(url):
             args=['--lang=zh-CN']  # 浏览器语言
         )
         # 创建新页面，配置中文环境
-        page = browser.new_page(
-            locale='zh-CN',  # 页面 locale
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/139.0.0.0 Safari/537.36 Edg/139.0.0.0"
-            ),
-            extra_http_headers={
-                "Accept-Language": "zh-CN,zh;q=0.9"
-            }
-        )
+        page = browser.new_page(**CONTEXT_OPTIONS)
         # 访问目标URL并等待页面加载完成
         page.goto(url, timeout=30_000)
         page.wait_for_load_state("networkidle")
@@ -59,7 +118,291 @@ def save_faq(cleaned_text:str, output_file:str):
 
     print(f"FAQ 已保存到 {output_file}")
 
+# ========== 批量抓取 ==========
+def load_urls(path: str) -> list:
+    """
+    读取 URL 列表文件，每行一个 URL，忽略空行和 # 开头的注释。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def load_sitemap(source: str) -> list:
+    """
+    解析 sitemap.xml（URL 或本地路径），sitemap 索引文件会递归展开。
+
+    参数:
+        source (str): sitemap 的 URL 或本地文件路径。
+
+    返回:
+        list[str]: 页面 URL 列表。
+    """
+    if re.match(r"https?://", source):
+        with urllib.request.urlopen(source, timeout=PAGE_TIMEOUT / 1000) as resp:
+            data = resp.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    root = ET.fromstring(data)
+    locs = [loc.text.strip() for loc in root.iter(f"{SITEMAP_NS}loc") if loc.text]
+    if root.tag == f"{SITEMAP_NS}sitemapindex":
+        return [url for loc in locs for url in load_sitemap(loc)]
+    return locs
+
+async def block_resources(route):
+    """
+    拦截图片、字体、媒体和统计脚本请求，其余请求正常放行。
+    """
+    request = route.request
+    host = urlparse(request.url).hostname or ""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+def page_filename(url: str, suffix: str) -> str:
+    """
+    由 URL 生成可读且不重复的文件名：站点与路径中的非法字符替换为下划线，附加 URL 摘要。
+    """
+    parsed = urlparse(url)
+    readable = re.sub(r"[^A-Za-z0-9._-]+", "_", f"{parsed.netloc}{parsed.path}").strip("_")[:80]
+    return f"{readable}_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}{suffix}"
+
+class PageWriter:
+    """
+    抓取结果的输出：jsonl 格式追加到一个文件，files 格式每个页面一个文件。
+
+    files 格式下每个页面另写一个 .url 附属文件保存其 URL；已删除的页面删除这两个文件，并以墓碑记录（url、change、fetched_at、file）写入输出目录下的 removed.jsonl。
+    """
+
+    def __init__(self, output: str, fmt: str = "jsonl"):
+        self.output = output
+        self.fmt = fmt
+        self.removed = None
+        if fmt == "files":
+            os.makedirs(output, exist_ok=True)
+            self.file = None
+            # 墓碑文件只记录本次运行删除的页面
+            removed_path = os.path.join(output, REMOVED_FILENAME)
+            if os.path.exists(removed_path):
+                os.remove(removed_path)
+        else:
+            self.file = open(output, "w", encoding="utf-8")
+
+    def write(self, record: dict):
+        if self.file is not None:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        filename = page_filename(record["url"], ".txt")
+        path = os.path.join(self.output, filename)
+        url_path = os.path.join(self.output, page_filename(record["url"], PAGE_URL_SUFFIX))
+        if record.get("change") == "removed":
+            for stale in (path, url_path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            if self.removed is None:
+                self.removed = open(os.path.join(self.output, REMOVED_FILENAME), "w", encoding="utf-8")
+            self.removed.write(json.dumps({**record, "file": filename}, ensure_ascii=False) + "\n")
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(record["content"])
+        with open(url_path, "w", encoding="utf-8") as f:
+            f.write(record["url"])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self.removed is not None:
+            self.removed.close()
+
+def content_fingerprint(content: str) -> str:
+    """
+    FAQ 区域内容的指纹：合并空白后取 SHA-1，排版变化不视为内容变化。
+    """
+    return hashlib.sha1(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+class CrawlState:
+    """
+    增量抓取状态：URL -> {etag, last_modified, fingerprint, fetched_at}，保存为 JSON 文件。
+    """
+
+    def __init__(self, path: str = CRAWL_STATE_PATH):
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.pages = json.load(f)
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        根据上次抓取记录的校验值生成条件请求头，没有记录时返回空字典。
+        """
+        entry = self.pages.get(url, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, record: dict):
+        self.pages[record["url"]] = {
+            "etag": record["etag"],
+            "last_modified": record["last_modified"],
+            "fingerprint": record["fingerprint"],
+            "fetched_at": record["fetched_at"],
+        }
+
+    def save(self):
+        # 先写临时文件再替换，避免中断导致状态文件损坏
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.pages, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+async def not_modified(context, url: str, state: CrawlState) -> bool:
+    """
+    发送条件 HEAD 请求，服务端返回 304 时页面未变化；请求失败时按已变化处理。
+    """
+    headers = state.conditional_headers(url)
+    if not headers:
+        return False
+    try:
+        response = await context.request.head(url, headers=headers, timeout=PAGE_TIMEOUT)
+    except Exception:
+        return False
+    return response.status == 304
+
+async def fetch_page(page, url: str) -> dict:
+    """
+    在已有页面中打开 URL，等待 FAQ 区域出现后提取内容。
+
+    返回:
+        dict: url、status（HTTP 状态码）、content（FAQ 文本）、fingerprint（内容指纹）、
+            etag、last_modified（响应头中的校验值）、fetched_at（抓取时间戳）。
+    """
+    response = await page.goto(url, timeout=PAGE_TIMEOUT, wait_until="domcontentloaded")
+    locator = page.locator(FAQ_SELECTOR).first
+    await locator.wait_for(timeout=PAGE_TIMEOUT)
+    content = await locator.text_content()
+    headers = response.headers if response is not None else {}
+    return {
+        "url": url,
+        "status": response.status if response is not None else None,
+        "content": content,
+        "fingerprint": content_fingerprint(content),
+        "etag": headers.get("etag"),
+        "last_modified": headers.get("last-modified"),
+        "fetched_at": int(time.time()),
+    }
+
+async def crawl(urls: list, output: str, fmt: str = "jsonl", concurrency: int = CRAWL_CONCURRENCY,
+                per_host: int = CRAWL_PER_HOST, headless: bool = True, state: CrawlState = None) -> dict:
+    """
+    用一个浏览器并发抓取一批 FAQ 页面。
+
+    给出 state 时只输出变更集：未变化的页面（条件请求 304 或内容指纹相同）不写入，
+    新增 / 变化的页面带 change 字段，state 中有记录但不在 urls 中的页面输出为 removed。
+
+    参数:
+        urls (list[str]): 页面 URL。
+        output (str): 输出路径，jsonl 格式为文件，files 格式为目录。
+        fmt (str): 输出格式，"jsonl" 或 "files"。
+        concurrency (int): 浏览器上下文（页面）个数。
+        per_host (int): 同一站点同时在途的页面数上限。
+        headless (bool): 是否无头运行。
+        state (CrawlState): 增量抓取状态；为空时输出全部页面。
+
+    返回:
+        dict: pages（输出页数）、unchanged（未变化页数）、removed（已删除页数）、failed（失败页数）、elapsed（总耗时）。
+    """
+    urls = list(dict.fromkeys(urls))
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+    host_limits = {}
+    stats = {"pages": 0, "unchanged": 0, "removed": 0, "failed": 0, "elapsed": 0.0}
+    writer = PageWriter(output, fmt)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless, args=['--lang=zh-CN'])
+
+        async def worker():
+            # 每个 worker 持有一个上下文和页面，处理完一个 URL 后继续复用
+            context = await browser.new_context(**CONTEXT_OPTIONS)
+            await context.route("**/*", block_resources)
+            page = await context.new_page()
+            try:
+                while not queue.empty():
+                    url = queue.get_nowait()
+                    limit = host_limits.setdefault(urlparse(url).netloc, asyncio.Semaphore(per_host))
+                    async with limit:
+                        try:
+                            if state is not None and await not_modified(context, url, state):
+                                stats["unchanged"] += 1
+                                continue
+                            record = await fetch_page(page, url)
+                        except Exception as e:
+                            stats["failed"] += 1
+                            print(f"❌ 抓取失败 {url}: {e}")
+                            # 页面崩溃后换一个新页面继续
+                            if page.is_closed():
+                                page = await context.new_page()
+                            continue
+                    if state is not None:
+                        previous = state.pages.get(url)
+                        state.update(record)
+                        if previous is not None and previous["fingerprint"] == record["fingerprint"]:
+                            stats["unchanged"] += 1
+                            continue
+                        record["change"] = "modified" if previous is not None else "added"
+                    writer.write(record)
+                    stats["pages"] += 1
+            finally:
+                await context.close()
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(concurrency, queue.qsize()))))
+            if state is not None:
+                # 本次列表中已不存在的页面，下游据此删除其 FAQ
+                requested = set(urls)
+                for url in [url for url in state.pages if url not in requested]:
+                    writer.write({"url": url, "change": "removed", "fetched_at": int(time.time())})
+                    del state.pages[url]
+                    stats["removed"] += 1
+                state.save()
+        finally:
+            await browser.close()
+            writer.close()
+        stats["elapsed"] = time.perf_counter() - start
+
+    elapsed = stats["elapsed"] or 1e-9
+    if state is not None:
+        print(f"🔄 变更集：新增 / 变化 {stats['pages']} 个页面，未变化 {stats['unchanged']} 个，删除 {stats['removed']} 个")
+    print(f"📊 抓取 {stats['pages']} 个页面，失败 {stats['failed']} 个，"
+          f"总耗时 {stats['elapsed']:.1f}s，{stats['pages'] / elapsed:.2f} 页/s，结果已保存到 {output}")
+    return stats
+
 if __name__ == "__main__":
-    cleaned_text = collect_faq(url="https://waimai.meituan.com/help/faq")
-    output_file = "faq.txt"
-    save_faq(cleaned_text, output_file)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="抓取 FAQ 页面")
+    parser.add_argument("--urls", help="URL 列表文件，每行一个 URL")
+    parser.add_argument("--sitemap", help="sitemap.xml 的 URL 或本地路径")
+    parser.add_argument("--output", help="批量抓取的输出路径，jsonl 格式为文件，files 格式为目录")
+    parser.add_argument("--format", choices=["jsonl", "files"], default="jsonl", help="批量抓取的输出格式")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY, help="同时打开的页面数")
+    parser.add_argument("--per-host", type=int, default=CRAWL_PER_HOST, help="同一站点同时在途的页面数")
+    parser.add_argument("--headed", action="store_true", help="显示浏览器窗口，便于调试")
+    parser.add_argument("--state", nargs="?", const=CRAWL_STATE_PATH,
+                        help=f"增量抓取状态文件（缺省路径 {CRAWL_STATE_PATH}），只输出变化的页面")
+    args = parser.parse_args()
+
+    if args.urls or args.sitemap:
+        urls = (load_urls(args.urls) if args.urls else []) + (load_sitemap(args.sitemap) if args.sitemap else [])
+        output = args.output or ("faq_pages.jsonl" if args.format == "jsonl" else "faq_pages")
+        asyncio.run(crawl(urls, output, fmt=args.format, concurrency=args.concurrency,
+                          per_host=args.per_host, headless=not args.headed,
+                          state=CrawlState(args.state) if args.state else None))
+    else:
+        cleaned_text = collect_faq(url="https://waimai.meituan.com/help/faq")
+        output_file = "faq.txt"
+        save_faq(cleaned_text, output_file)
\ No newline at end of file
@@ -0,0 +1,155 @@
+# 按 token 预算打包检索到的 FAQ 上下文，避免少数超长的政策类答案撑大 Prompt、拖慢大模型响应。
+#
+# - 去重：答案与已选片段高度重合（字符二元组包含率不低于 OVERLAP_THRESHOLD）的片段直接丢弃；
+# - 截断：单条答案超过 MAX_PASSAGE_TOKENS 时在句子边界截断，首句即超过上限时按字符截断；
+# - 装填：按相关度从高到低贪心放入，剩余预算不足时尝试截断后放入，否则跳过。
+#
+# token 数由 tokens.count_tokens 估算，结果按文本缓存，同一 FAQ 片段重复出现时不再重新计算。
+
+import os
+import re
+
+from tokens import count_tokens
+
+# ========== 配置 ==========
+# 上下文（全部文档片段）的 token 预算
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1024"))
+# 单个文档片段的 token 上限
+MAX_PASSAGE_TOKENS = int(os.getenv("MAX_PASSAGE_TOKENS", "400"))
+# 答案重合率不低于该值时视为重复片段
+OVERLAP_THRESHOLD = 0.8
+
+# 句子边界：中英文句末标点与换行，标点保留在句子末尾
+SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]+[。！？!?；;\n]*")
+
+
+def format_passage(index: int, question: str, answer: str) -> str:
+    return f"【文档片段{index}】\nQ: {question}\nA: {answer}"
+
+
+def hard_cut(text: str, max_tokens: int) -> str:
+    """
+    不考虑句子边界，截取不超过 max_tokens 的最长前缀（按字符二分查找）。
+
+    参数:
+        text (str): 原文。
+        max_tokens (int): token 上限。
+
+    返回:
+        str: 截取的前缀，max_tokens 不足一个字符时返回空字符串。
+    """
+    # 前缀长度各不相同，不写入 count_tokens 的缓存
+    count = count_tokens.__wrapped__
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def truncate_sentences(text: str, max_tokens: int) -> str:
+    """
+    在句子边界截断文本，使其不超过 max_tokens。
+
+    参数:
+        text (str): 原文。
+        max_tokens (int): token 上限。
+
+    返回:
+        str: 截断后的文本；第一句就超过上限时退回到按字符截断（hard_cut），上限不足以容纳任何内容时返回空字符串。
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    # 为截断后追加的省略号预留位置
+    max_tokens -= count_tokens("……")
+    kept, used = [], 0
+    for sentence in SENTENCE_PATTERN.findall(text):
+        cost = count_tokens(sentence)
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if not kept:
+        # 首句过长（常见于不分句的长段落）时仍保留其开头，而不是整条丢弃
+        kept = [hard_cut(text, max_tokens)]
+    kept = "".join(kept).rstrip()
+    return kept + "……" if kept else ""
+
+
+def bigrams(text: str) -> set:
+    text = re.sub(r"\s+", "", text)
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def is_duplicate(grams: set, selected: list) -> bool:
+    """
+    判断答案是否与已选片段重复：较短一方的字符二元组大部分出现在另一方中。
+    """
+    for other in selected:
+        shorter = min(len(grams), len(other)) or 1
+        if len(grams & other) / shorter >= OVERLAP_THRESHOLD:
+            return True
+    return False
+
+
+def relevance(doc) -> float:
+    """
+    文档的相关度，越大越相关：混合检索使用 rrf_score，向量检索使用 1 - 余弦距离。
+    """
+    rrf = getattr(doc, "rrf_score", None)
+    if rrf is not None:
+        return float(rrf)
+    score = getattr(doc, "score", "")
+    return 1 - float(score) if score not in ("", None) else 0.0
+
+
+def pack_context(docs, budget: int = CONTEXT_TOKEN_BUDGET, max_passage_tokens: int = MAX_PASSAGE_TOKENS) -> dict:
+    """
+    在 token 预算内选取并格式化文档片段。
+
+    参数:
+        docs (list): 检索到的文档对象，需有 question、answer 属性。
+        budget (int): 全部片段的 token 预算。
+        max_passage_tokens (int): 单个片段的 token 上限。
+
+    返回:
+        dict: text（拼接好的上下文）、tokens（打包后 token 数）、raw_tokens（原样拼接的 token 数）、
+            saved（节省的 token 数）、used（使用的片段数）、dropped（因重复或预算丢弃的片段数）。
+    """
+    raw_tokens = sum(
+        count_tokens(format_passage(i, doc.question, doc.answer)) for i, doc in enumerate(docs, start=1)
+    )
+    parts, selected_grams, used_tokens = [], [], 0
+    for doc in sorted(docs, key=relevance, reverse=True):
+        grams = bigrams(doc.answer)
+        if is_duplicate(grams, selected_grams):
+            continue
+        index = len(parts) + 1
+        overhead = count_tokens(format_passage(index, doc.question, ""))
+        room = min(max_passage_tokens, budget - used_tokens) - overhead
+        if room <= 0:
+            continue
+        answer = truncate_sentences(doc.answer, room)
+        if not answer:
+            continue
+        passage = format_passage(index, doc.question, answer)
+        parts.append(passage)
+        selected_grams.append(grams)
+        used_tokens += count_tokens(passage)
+
+    return {
+        "text": "\n\n".join(parts),
+        "tokens": used_tokens,
+        "raw_tokens": raw_tokens,
+        "saved": max(raw_tokens - used_tokens, 0),
+        "used": len(parts),
+        "dropped": len(docs) - len(parts),
+    }
+
+
+def print_pack_stats(packed: dict):
+    print(f"✂️ 上下文 {packed['tokens']} tokens（原始 {packed['raw_tokens']}，节省 {packed['saved']}），"
+          f"使用 {packed['used']} 个片段，丢弃 {packed['dropped']} 个")
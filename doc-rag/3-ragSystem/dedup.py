@@ -0,0 +1,246 @@
+# 入库去重：多个页面抓取的 FAQ 中有大量重复或近似重复的问答，
+# 不去重会占用索引空间，并使 top-k 结果被同一个答案占满。
+#
+# - 完全重复：问题和答案归一化（全半角、大小写、空白、句末标点）后哈希相同，在向量化之前丢弃，不产生 Embedding 调用；
+# - 近似重复：向量化后与已有索引及本次已接收的向量计算余弦相似度，不低于 DEDUP_THRESHOLD 即视为重复。
+#   相似度按 DEDUP_BLOCK 行分块做矩阵乘法，内存占用与索引规模无关。
+#
+# 被丢弃的问答不会丢失来源信息：其 source / category 以逗号合并到保留的问答上（TAG 字段按逗号分隔，可分别过滤）。
+
+import os
+import hashlib
+import numpy as np
+
+from query_cache import normalize_question
+
+# ========== 配置 ==========
+# 近似重复的余弦相似度阈值
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.97"))
+# 分块矩阵乘法每块的行数
+DEDUP_BLOCK = 4096
+# 合并的元数据字段
+MERGE_FIELDS = ("source", "category")
+
+
+def text_fingerprint(doc: dict) -> str:
+    """
+    归一化后问题与答案的哈希，用于识别完全重复的问答。
+    """
+    text = normalize_question(doc["question"]) + "\n" + normalize_question(doc["answer"])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def merge_values(*values: str) -> str:
+    """
+    合并逗号分隔的多值字段，去重并保持首次出现的顺序。
+    """
+    merged = []
+    for value in values:
+        for item in (value or "").split(","):
+            item = item.strip()
+            if item and item not in merged:
+                merged.append(item)
+    return ",".join(merged)
+
+
+class Deduplicator:
+    """
+    入库去重状态：已接收问答的指纹、归一化向量矩阵以及待合并的元数据。
+
+    属性:
+        threshold (float): 近似重复的余弦相似度阈值。
+        exact (int): 完全重复的条数。
+        near (int): 近似重复的条数。
+    """
+
+    def __init__(self, dim: int = 1024, threshold: float = DEDUP_THRESHOLD, block: int = DEDUP_BLOCK):
+        self.dim = dim
+        self.threshold = threshold
+        self.block = block
+        self.keys = []
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.count = 0
+        self.fingerprints = {}
+        self.meta = {}
+        self.merged = set()
+        # 本次运行中合并进各保留问答的元数据（不含此前已存储的部分），供增量同步重新计算合并结果
+        self.contributed = {}
+        # 被丢弃的问答 key -> 保留的问答 key，写入清单后增量同步不再把它们当作新增
+        self.dropped = {}
+        # 被丢弃的问答 key -> 其自身的 source，用于登记到按页面的清单索引
+        self.dropped_sources = {}
+        self.exact = 0
+        self.near = 0
+
+    # ========== 登记 ==========
+    def _append(self, keys: list, vectors: np.ndarray):
+        """
+        追加已归一化的向量，容量不足时按两倍扩容。
+        """
+        needed = self.count + len(keys)
+        if needed > len(self.matrix):
+            grown = np.empty((max(needed, len(self.matrix) * 2, 1024), self.dim), dtype=np.float32)
+            grown[:self.count] = self.matrix[:self.count]
+            self.matrix = grown
+        self.matrix[self.count:needed] = vectors
+        self.keys.extend(keys)
+        self.count = needed
+
+    def add_existing(self, key: str, fields: dict, vector: np.ndarray):
+        """
+        登记索引中已有的一条问答，参与后续比较。
+
+        参数:
+            key (str): 文档 key。
+            fields (dict): 包含 question、answer、source、category 的字段。
+            vector (np.ndarray): FLOAT32 向量。
+        """
+        self.fingerprints.setdefault(text_fingerprint(fields), key)
+        self.meta[key] = {field: fields.get(field, "") for field in MERGE_FIELDS}
+        norm = np.linalg.norm(vector) or 1.0
+        self._append([key], (vector / norm)[None, :])
+
+    def merge_into(self, key: str, doc: dict):
+        """
+        把一条问答的 source / category 合并到保留的问答上。
+
+        参数:
+            key (str): 保留的问答 key。
+            doc (dict): 被合并的 FAQ 数据。
+        """
+        meta = self.meta.setdefault(key, {field: "" for field in MERGE_FIELDS})
+        contributed = self.contributed.setdefault(key, {field: "" for field in MERGE_FIELDS})
+        for field in MERGE_FIELDS:
+            contributed[field] = merge_values(contributed[field], doc["metadata"].get(field, ""))
+            value = merge_values(meta[field], doc["metadata"].get(field, ""))
+            if value != meta[field]:
+                meta[field] = value
+                self.merged.add(key)
+
+    def restate(self, key: str, keep: dict = None):
+        """
+        丢弃保留问答此前存储的合并元数据，改为本次运行合并进来的元数据（加上 keep 中需要保留的值）。
+        增量同步据此使 source 随页面的删除而收缩，而不是只增不减。
+
+        参数:
+            key (str): 保留的问答 key。
+            keep (dict): 需要保留的已有 source / category（例如变更集同步中未变化页面的来源）。
+        """
+        contributed = self.contributed.get(key, {})
+        self.meta[key] = {
+            field: merge_values((keep or {}).get(field, ""), contributed.get(field, ""))
+            for field in MERGE_FIELDS
+        }
+
+    # ========== 去重 ==========
+    def check_exact(self, key: str, doc: dict) -> bool:
+        """
+        判断问答是否与已接收的问答完全重复（向量化之前调用）。
+
+        参数:
+            key (str): 文档 key。
+            doc (dict): FAQ 数据。
+
+        返回:
+            bool: 重复时返回 True，其元数据已合并到保留的问答上。
+        """
+        fp = text_fingerprint(doc)
+        canonical = self.fingerprints.get(fp)
+        if canonical is None:
+            self.fingerprints[fp] = key
+            self.meta.setdefault(key, {field: doc["metadata"].get(field, "") for field in MERGE_FIELDS})
+            return False
+        if canonical != key:
+            self.exact += 1
+            self.merge_into(canonical, doc)
+            self.dropped[key] = canonical
+            self.dropped_sources[key] = doc["metadata"].get("source", "")
+        return True
+
+    def _best_existing(self, queries: np.ndarray) -> tuple:
+        """
+        分块计算查询向量与已接收向量的最大相似度。
+
+        返回:
+            tuple: (每行最大相似度, 对应的行号)
+        """
+        best = np.full(len(queries), -np.inf, dtype=np.float32)
+        best_idx = np.full(len(queries), -1, dtype=np.int64)
+        for start in range(0, self.count, self.block):
+            sims = queries @ self.matrix[start:min(start + self.block, self.count)].T
+            idx = sims.argmax(axis=1)
+            values = sims[np.arange(len(queries)), idx]
+            better = values > best
+            best[better] = values[better]
+            best_idx[better] = idx[better] + start
+        return best, best_idx
+
+    def filter_batch(self, keys: list, docs: list, vectors: list) -> list:
+        """
+        过滤一批已向量化的问答中的近似重复项，保留的问答登记进矩阵。
+
+        参数:
+            keys (list[str]): 文档 key。
+            docs (list[dict]): FAQ 数据。
+            vectors (list[bytes]): FLOAT32 向量字节。
+
+        返回:
+            list[int]: 保留的问答在本批中的下标。
+        """
+        queries = np.vstack([np.frombuffer(v, dtype=np.float32) for v in vectors])
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        best, best_idx = self._best_existing(queries)
+        # 批内两两相似度，只与本批中排在前面且被保留的问答比较
+        batch_sims = queries @ queries.T
+        kept = []
+        for i, doc in enumerate(docs):
+            self.meta.setdefault(keys[i], {field: doc["metadata"].get(field, "") for field in MERGE_FIELDS})
+            canonical = self.keys[best_idx[i]] if best[i] >= self.threshold else None
+            if canonical is None and kept:
+                j = max(kept, key=lambda j: batch_sims[i, j])
+                if batch_sims[i, j] >= self.threshold:
+                    canonical = keys[j]
+            if canonical is None:
+                kept.append(i)
+            else:
+                self.near += 1
+                self.merge_into(canonical, doc)
+                self.dropped[keys[i]] = canonical
+                self.dropped_sources[keys[i]] = doc["metadata"].get("source", "")
+                # 之后出现的完全相同问答直接归并到保留的问答
+                self.fingerprints[text_fingerprint(doc)] = canonical
+                self.meta.pop(keys[i], None)
+        self._append([keys[i] for i in kept], queries[kept])
+        return kept
+
+    def discard(self, keys: list, docs: list):
+        """
+        撤销向量化失败的问答的指纹登记，使后续出现的相同问答可以重新写入。
+        已归并到这些问答上的重复项也不再记为丢弃，下次同步时重新写入。
+        """
+        for key, doc in zip(keys, docs):
+            fp = text_fingerprint(doc)
+            if self.fingerprints.get(fp) == key:
+                del self.fingerprints[fp]
+            self.meta.pop(key, None)
+            self.merged.discard(key)
+        failed = set(keys)
+        for key in [key for key, canonical in self.dropped.items() if canonical in failed]:
+            del self.dropped[key]
+            self.dropped_sources.pop(key, None)
+
+    # ========== 结果 ==========
+    def merged_fields(self) -> dict:
+        """
+        返回元数据发生合并的问答：key -> {"source": ..., "category": ...}。
+        """
+        return {key: self.meta[key] for key in self.merged if key in self.meta}
+
+    def print_stats(self):
+        saved = self.exact + self.near
+        print(f"🧹 去重：完全重复 {self.exact} 条，近似重复 {self.near} 条（阈值 {self.threshold}），"
+              f"少写入 {saved} 个向量（约 {saved * self.dim * 4 / 1024 / 1024:.1f}MB），"
+              f"合并元数据 {len(self.merged)} 条")
@@ -0,0 +1,246 @@
+# Embedding 请求调度：在 DashScope 限流范围内尽量提高吞吐，失败的 FAQ 不再丢失。
+#
+# - 令牌桶：同时限制每秒请求数（EMBED_QPS）与每分钟 token 数（EMBED_TPM）；
+# - 重试：429 与 5xx 按指数退避加随机抖动重试，最多 EMBED_MAX_RETRIES 次；
+# - 自适应并发：被限流时在途请求上限减半，连续成功后逐个恢复（AIMD）；
+# - 死信文件：重试耗尽仍失败的 FAQ 追加写入 DEAD_LETTER_PATH，
+#   下次运行 python embedding.py --retry-dead-letter 重新写入。
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+from pathlib import Path
+
+# 共享的本地 Embedding 缓存位于 doc-rag 根目录
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from embed_cache import EmbeddingError
+from tokens import count_tokens
+
+# ========== 配置 ==========
+# 每秒请求数上限
+EMBED_QPS = float(os.getenv("EMBED_QPS", "10"))
+# 每分钟 token 数上限
+EMBED_TPM = int(os.getenv("EMBED_TPM", "600000"))
+# 单个请求的最大重试次数
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+# 退避的初始等待与最长等待（秒）
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+# 连续成功多少次后把并发上限加一
+RECOVER_AFTER = 20
+# 死信文件路径
+DEAD_LETTER_PATH = os.getenv("DEAD_LETTER_PATH", str(Path(__file__).resolve().parent / "embed_dead_letter.jsonl"))
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    限流（429）、服务端错误（5xx）与网络错误可以重试，其余错误（如参数错误）直接失败。
+    """
+    if isinstance(error, EmbeddingError):
+        return error.status_code is None or error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶，acquire 在令牌不足时阻塞等待。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        参数:
+            rate (float): 每秒补充的令牌数。
+            capacity (float): 桶容量，即允许的突发量。
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        # 超过桶容量的请求按容量计，避免永远等不到
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_for = (amount - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 并发控制：被限流时上限减半，连续成功 RECOVER_AFTER 次后上限加一。
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def resize(self, max_concurrency: int):
+        """
+        调整在途请求数上限（例如按 bulk_insert 的 concurrency 参数），当前上限同时重置为新的上限。
+        """
+        with self._cond:
+            self.max_concurrency = max_concurrency
+            self.limit = max_concurrency
+            self.successes = 0
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self.successes += 1
+            if self.successes >= RECOVER_AFTER and self.limit < self.max_concurrency:
+                self.limit += 1
+                self.successes = 0
+                self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+
+
+class EmbeddingScheduler:
+    """
+    对 embed_fn 的调用做限速、重试与自适应并发控制。
+
+    属性:
+        stats (dict): requests、retries、throttled、failed 计数。
+    """
+
+    def __init__(self, embed_fn, qps: float = EMBED_QPS, tpm: int = EMBED_TPM, max_concurrency: int = 4,
+                 max_retries: int = EMBED_MAX_RETRIES):
+        """
+        参数:
+            embed_fn (callable): 实际的向量化函数，签名为 embed_fn(texts) -> list[bytes]。
+            qps (float): 每秒请求数上限。
+            tpm (int): 每分钟 token 数上限。
+            max_concurrency (int): 在途请求数上限。
+            max_retries (int): 单个请求的最大重试次数。
+        """
+        self.embed_fn = embed_fn
+        self.requests = TokenBucket(qps, max(qps, 1.0))
+        self.tokens = TokenBucket(tpm / 60, tpm / 60)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.max_retries = max_retries
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def embed(self, texts: list) -> list:
+        """
+        在限速与并发控制下调用 embed_fn，可重试的错误按指数退避加抖动重试。
+
+        参数:
+            texts (list[str]): 待向量化的文本。
+
+        返回:
+            list[bytes]: FLOAT32 向量字节。
+
+        异常:
+            EmbeddingError: 不可重试的错误，或重试次数耗尽。
+        """
+        cost = sum(count_tokens(text) for text in texts)
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire()
+            self.tokens.acquire(cost)
+            with self.limiter:
+                self._count("requests")
+                try:
+                    vectors = self.embed_fn(texts)
+                except Exception as e:
+                    error = e
+                else:
+                    self.limiter.on_success()
+                    return vectors
+            if isinstance(error, EmbeddingError) and error.status_code == 429:
+                self._count("throttled")
+                self.limiter.on_throttle()
+            if not is_retryable(error) or attempt == self.max_retries:
+                self._count("failed")
+                if isinstance(error, EmbeddingError):
+                    raise error
+                # 网络错误等统一包装为 EmbeddingError，调用方只需处理一种异常
+                raise EmbeddingError(f"❌ Embedding 调用失败: {error!r}") from error
+            self._count("retries")
+            # 全抖动退避：在 [0, min(上限, 初始等待 * 2^attempt)] 内随机等待
+            time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+    def print_stats(self):
+        s = self.stats
+        print(f"🚦 Embedding 调度：请求 {s['requests']} 次，重试 {s['retries']} 次，"
+              f"限流 {s['throttled']} 次，失败 {s['failed']} 次，当前并发上限 {self.limiter.limit}")
+
+
+class DeadLetterQueue:
+    """
+    向量化失败的 FAQ 的持久化死信文件（JSONL），每行 {"doc": ..., "error": ..., "time": ...}。
+    """
+
+    def __init__(self, path: str = DEAD_LETTER_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def add(self, docs: list, error: Exception):
+        """
+        追加一批失败的 FAQ。
+        """
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for doc in docs:
+                f.write(json.dumps({"doc": doc, "error": str(error), "time": int(time.time())},
+                                   ensure_ascii=False) + "\n")
+        print(f"📮 {len(docs)} 条 FAQ 已写入死信文件 {self.path}")
+
+    def drain(self) -> list:
+        """
+        取出全部死信，文件移到 .draining 暂存；重试期间再次失败的 FAQ 追加到新的死信文件中。
+        重试完成后调用 ack 删除暂存文件，中途退出时下次 drain 会一并取出。
+
+        返回:
+            list[dict]: 失败的 FAQ 数据。
+        """
+        draining = self.path.with_suffix(".draining")
+        with self._lock:
+            if self.path.exists():
+                if draining.exists():
+                    with open(self.path, "r", encoding="utf-8") as src, open(draining, "a", encoding="utf-8") as dst:
+                        dst.write(src.read())
+                    self.path.unlink()
+                else:
+                    os.replace(self.path, draining)
+        if not draining.exists():
+            return []
+        with open(draining, "r", encoding="utf-8") as f:
+            return [json.loads(line)["doc"] for line in f if line.strip()]
+
+    def ack(self):
+        """
+        删除已重试完毕的暂存死信。
+        """
+        self.path.with_suffix(".draining").unlink(missing_ok=True)
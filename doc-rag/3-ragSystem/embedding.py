@@ -4,15 +4,34 @@
 # 存储至向量数据库（如 Milvus、Weaviate、Redis Vector、Faiss），支持高效的相似度搜索。
 
 import os
+import re
+import sys
 import json
+import time
+import hashlib
+import argparse
 import dotenv
 import dashscope
 import redis
-import numpy as np
-from http import HTTPStatus
-from redis.commands.search.field import TextField, VectorField
+from pathlib import Path
+from datetime import datetime
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from redis.commands.search.field import TextField, TagField, NumericField, VectorField
 from redis.commands.search.index_definition import IndexDefinition
 
+# 共享的本地 Embedding 缓存位于 doc-rag 根目录
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from embed_cache import cached_embed, dashscope_embed
+from answer_cache import AnswerCache
+from numpy_store import NumpyVectorStore, VECTOR_BACKEND
+from dedup import Deduplicator, DEDUP_THRESHOLD
+from embed_scheduler import EmbeddingScheduler, DeadLetterQueue
+from checkpoint import IngestCheckpoint
+from shards import ShardCluster, REDIS_SHARDS
+from reduce import reduced_dim, reduce_vector
+from quantize import VECTOR_TYPE, VECTOR_INT8, VECTOR_FIELDS, storage_fields, decode_vector, index_vector_type, index_vector_field
+
 # ========== 配置 ==========
 # 加载环境变量
 dotenv.load_dotenv()
@@ -20,9 +39,41 @@ dotenv.load_dotenv()
 dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
 
 # 定义索引名称、向量维度和距离度量方式
+# INDEX_NAME 是检索使用的别名，实际索引为 faq_index_v1、faq_index_v2……，重建索引时原子切换别名
 INDEX_NAME = "faq_index"
 VECTOR_DIM = 1024
+# 索引中的向量维度：启用降维（VECTOR_REDUCE）时为 REDUCED_DIM，见 reduce.py
+INDEX_DIM = reduced_dim(VECTOR_DIM)
 DISTANCE_METRIC = "COSINE"
+# HNSW 参数：M 为每个节点的邻居数，EF_CONSTRUCTION 为建图时的候选数，EF_RUNTIME 为查询时的候选数
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_RUNTIME = int(os.getenv("HNSW_EF_RUNTIME", "10"))
+# 索引结构：text 将元数据作为全文字段；tag 将 category/source 作为 TAG、抓取时间作为 NUMERIC，
+# 支持在 KNN 查询中做预过滤
+INDEX_SCHEMA = os.getenv("INDEX_SCHEMA", "text")
+# Embedding 模型名称
+EMBEDDING_MODEL = "multimodal-embedding-v1"
+
+# 批量写入配置
+# 单次 Embedding 请求包含的文本条数（需不超过 DashScope 单次输入上限）
+EMBED_BATCH_SIZE = 10
+# 同时在途的 Embedding 请求数
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# Redis pipeline 每次提交的命令数
+PIPELINE_CHUNK = 500
+# NumPy 索引逐条写入或记录检查点时，每写入多少条落盘一次
+NUMPY_CHECKPOINT_DOCS = 5000
+# 流式读取 JSON 数组时每次读入的字符数
+READ_CHUNK_SIZE = 1 << 20
+# 已入库 FAQ 清单（Redis Hash：文档 key -> 元数据指纹），用于增量同步
+MANIFEST_KEY = "faq_manifest"
+# 去重时被丢弃的问答在清单中记为 dup:<保留的问答 key>，不对应 Redis 中的文档
+DUP_PREFIX = "dup:"
+# 按页面索引的清单（Redis Set：faq_source:<页面 URL> -> 文档 key），变更集同步据此只读取变更页面的问答
+SOURCE_INDEX_PREFIX = "faq_source:"
+# 按页面索引已覆盖全部清单的标记，缺失时变更集同步先扫描清单建立索引
+SOURCE_INDEX_READY = "faq_source_ready"
 
 # 初始化 Redis 客户端连接
 redis_client = redis.Redis(
@@ -32,34 +83,351 @@ redis_client = redis.Redis(
     decode_responses=False
 )
 
+# 语义答案缓存：FAQ 被删除或内容变化时清除引用它的缓存答案
+answer_cache = AnswerCache(redis_client, dim=INDEX_DIM)
+
+# Embedding 请求调度：令牌桶限速、429/5xx 退避重试、自适应并发；重试耗尽的 FAQ 写入死信文件
+embed_scheduler = EmbeddingScheduler(
+    lambda texts: dashscope_embed(texts, model=EMBEDDING_MODEL),
+    max_concurrency=EMBED_CONCURRENCY
+)
+dead_letter = DeadLetterQueue()
+
+# VECTOR_BACKEND=numpy 时向量与 FAQ 字段写入进程内 NumPy 索引，不使用 Redis
+vector_store = NumpyVectorStore(dim=INDEX_DIM) if VECTOR_BACKEND == "numpy" else None
+
+# 配置 REDIS_SHARDS 时每条 FAQ 按路由写入其中一个 Redis 分片，见 shards.py
+shard_cluster = ShardCluster(REDIS_SHARDS) if REDIS_SHARDS else None
+
 # ========== 创建索引（只执行一次） ==========
-def create_index():
+def index_fields(schema: str = INDEX_SCHEMA, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION,
+                 ef_runtime: int = HNSW_EF_RUNTIME) -> list:
+    """
+    返回指定索引结构的字段定义。
+
+    参数:
+        schema (str): "text" 或 "tag"。
+        m (int): HNSW 每个节点的邻居数。
+        ef_construction (int): HNSW 建图时的候选数。
+        ef_runtime (int): HNSW 查询时的默认候选数。
+
+    返回:
+        list: RediSearch 字段列表。
+    """
+    # 向量字段的精度由 VECTOR_TYPE / VECTOR_INT8 决定，见 quantize.py
+    vector_field = VectorField(
+        index_vector_field(),
+        "HNSW",
+        {
+            "TYPE": index_vector_type(),
+            "DIM": INDEX_DIM,
+            "DISTANCE_METRIC": DISTANCE_METRIC,
+            "M": m,
+            "EF_CONSTRUCTION": ef_construction,
+            "EF_RUNTIME": ef_runtime
+        }
+    )
+    if schema == "tag":
+        return [
+            TextField("question"),
+            TextField("answer"),
+            TagField("source"),
+            TagField("category"),
+            NumericField("crawl_ts"),
+            vector_field
+        ]
+    return [
+        TextField("question"),
+        TextField("answer"),
+        TextField("source"),
+        TextField("category"),
+        TextField("crawl_time"),
+        vector_field
+    ]
+
+def live_index(client: redis.Redis = redis_client):
+    """
+    返回别名 INDEX_NAME 当前指向的实际索引名。
+
+    参数:
+        client (redis.Redis): Redis 节点，分片部署时为某个分片。
+
+    返回:
+        str | None: 实际索引名；INDEX_NAME 尚不存在时返回 None。
+            旧版本直接以 INDEX_NAME 命名的索引返回 INDEX_NAME 本身。
+    """
+    try:
+        info = client.ft(INDEX_NAME).info()
+    except redis.ResponseError:
+        return None
+    name = info.get("index_name", INDEX_NAME)
+    return name.decode() if isinstance(name, bytes) else name
+
+def next_index_version(client: redis.Redis = redis_client) -> str:
+    """
+    返回下一个版本化索引名 faq_index_vN。
+    """
+    pattern = re.compile(rf"^{INDEX_NAME}_v(\d+)$")
+    versions = [0]
+    for name in client.execute_command("FT._LIST"):
+        match = pattern.match(name.decode() if isinstance(name, bytes) else name)
+        if match:
+            versions.append(int(match.group(1)))
+    return f"{INDEX_NAME}_v{max(versions) + 1}"
+
+def build_index(name: str, schema: str = INDEX_SCHEMA, client: redis.Redis = redis_client, **hnsw):
+    """
+    以指定结构和 HNSW 参数创建一个索引。索引覆盖 faq: 前缀，
+    RediSearch 会在后台索引已有数据，之后的写入同时进入所有覆盖该前缀的索引。
+
+    参数:
+        name (str): 索引名。
+        schema (str): 索引结构，"text" 或 "tag"。
+        client (redis.Redis): Redis 节点，分片部署时为某个分片。
+        **hnsw: 传给 index_fields 的 m / ef_construction / ef_runtime。
+    """
+    client.ft(name).create_index(
+        index_fields(schema, **hnsw),
+        # 中文分词，供混合检索中的 BM25 全文查询使用
+        definition=IndexDefinition(prefix=["faq:"], language="chinese")
+    )
+
+def create_index(schema: str = INDEX_SCHEMA):
     """
     创建 Redis 向量搜索索引。
     
-    如果索引已存在，则跳过创建并提示信息；
-    否则根据预定义的字段结构创建一个新的索引，用于支持 FAQ 的文本与向量混合检索。
+    如果别名 INDEX_NAME 已存在，则跳过创建并提示信息；
+    否则创建第一个版本化索引并将别名指向它，用于支持 FAQ 的文本与向量混合检索。
+    分片部署时在每个分片上分别创建。
+
+    参数:
+        schema (str): 索引结构，"text" 或 "tag"，默认取 INDEX_SCHEMA 配置。
+    """
+    if vector_store is not None:
+        vector_store.create_index()
+        return
+    clients = shard_cluster.clients if shard_cluster is not None else [redis_client]
+    for client in clients:
+        if live_index(client) is not None:
+            print("✅ 索引已存在")
+            continue
+        name = next_index_version(client)
+        build_index(name, schema, client=client)
+        client.ft(name).aliasadd(INDEX_NAME)
+        print(f"✅ 已创建向量索引 {name}（{schema} 结构），别名 {INDEX_NAME}")
+
+def reindex(schema: str = INDEX_SCHEMA, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION,
+            ef_runtime: int = HNSW_EF_RUNTIME, keep_old_vectors: bool = False):
+    """
+    不停服重建索引：在现有索引旁建立新版本索引，完成后原子切换别名，再删除旧索引（保留数据）。
+
+    先为已有数据补写新结构所需的字段（不重新向量化），新索引在后台索引期间检索仍由旧索引提供。
+    两个索引并存期间向量索引内存约为平时的两倍。
+    切换精度（VECTOR_TYPE / VECTOR_INT8）时，别名切换后删除当前配置不再使用的向量字段，
+    否则每条文档同时保存新旧两份向量，内存不降反升。
+
+    参数:
+        schema (str): 新索引结构，"text" 或 "tag"。
+        m (int): HNSW 每个节点的邻居数。
+        ef_construction (int): HNSW 建图时的候选数。
+        ef_runtime (int): HNSW 查询时的默认候选数。
+        keep_old_vectors (bool): 保留不再使用的向量字段，便于回退到原精度。
+    """
+    old = live_index()
+    backfill_fields()
+    name = next_index_version()
+    build_index(name, schema, m=m, ef_construction=ef_construction, ef_runtime=ef_runtime)
+    print(f"⏳ 已创建 {name}（{schema} 结构，M={m}，EF_CONSTRUCTION={ef_construction}，EF_RUNTIME={ef_runtime}）")
+    wait_for_indexing(name)
+
+    if old is None:
+        redis_client.ft(name).aliasadd(INDEX_NAME)
+    elif old == INDEX_NAME:
+        # 旧版本直接以 INDEX_NAME 命名的索引：别名不能与索引重名，删除后立即建立别名
+        redis_client.ft(old).dropindex(delete_documents=False)
+        redis_client.ft(name).aliasadd(INDEX_NAME)
+    else:
+        redis_client.ft(name).aliasupdate(INDEX_NAME)
+        redis_client.ft(old).dropindex(delete_documents=False)
+    print(f"✅ 别名 {INDEX_NAME} 已切换到 {name}" + (f"，已删除旧索引 {old}" if old else ""))
+    if not keep_old_vectors:
+        drop_unused_vectors()
+
+def backfill_fields():
+    """
+    为 faq: 前缀下的已有数据补写派生字段，不调用 Embedding：
+
+    - crawl_ts：由 crawl_time 解析；
+    - 当前精度配置需要但尚不存在的向量字段：由已存储的 FLOAT32 / FLOAT16 向量转换。
+    """
+    source_types = ("FLOAT32", "FLOAT16")
+    fields = ["crawl_time"] + [VECTOR_FIELDS[t] for t in source_types]
+    keys = []
+    read = redis_client.pipeline(transaction=False)
+    for key in redis_client.scan_iter(match="faq:*", count=1000):
+        keys.append(key)
+        read.hmget(key, fields)
+        if len(keys) >= PIPELINE_CHUNK:
+            _backfill_batch(keys, read.execute(), source_types)
+            keys = []
+    if keys:
+        _backfill_batch(keys, read.execute(), source_types)
+
+def _backfill_batch(keys: list, rows: list, source_types: tuple):
+    """
+    根据一批文档已有的字段值写入派生字段。
+
+    参数:
+        keys (list[bytes]): 文档 key。
+        rows (list[list]): 与 keys 对应的 [crawl_time, FLOAT32 向量, FLOAT16 向量]。
+        source_types (tuple[str]): 向量字段对应的精度，按优先级排列。
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for key, (crawl_time, *vectors) in zip(keys, rows):
+        mapping = {}
+        if crawl_time is not None:
+            mapping["crawl_ts"] = crawl_timestamp(crawl_time.decode())
+        # 以精度最高的已有向量为来源，只补写缺失的向量字段
+        existing = {VECTOR_FIELDS[t]: (t, v) for t, v in zip(source_types, vectors) if v is not None}
+        if existing:
+            vector_type, data = next(iter(existing.values()))
+            vector = decode_vector(data, vector_type).tobytes()
+            for field, value in storage_fields(vector).items():
+                if field not in existing:
+                    mapping[field] = value
+        if mapping:
+            pipe.hset(key, mapping=mapping)
+    pipe.execute()
+
+def drop_unused_vectors():
+    """
+    删除 faq: 前缀下当前精度配置不再使用的向量字段（例如迁移到 FLOAT16 后的 FLOAT32 embedding）。
+
+    只能在别名切换到新索引、旧索引删除之后调用：旧索引仍在提供检索时，删除其向量字段会使文档退出旧索引。
+    """
+    used = {VECTOR_FIELDS[VECTOR_TYPE]} | ({VECTOR_FIELDS["INT8"]} if VECTOR_INT8 else set())
+    unused = [field for field in VECTOR_FIELDS.values() if field not in used]
+    removed = 0
+    pipe = redis_client.pipeline(transaction=False)
+    for key in redis_client.scan_iter(match="faq:*", count=1000):
+        pipe.hdel(key, *unused)
+        if len(pipe) >= PIPELINE_CHUNK:
+            removed += sum(pipe.execute())
+    removed += sum(pipe.execute())
+    print(f"🧹 已删除不再使用的向量字段 {', '.join(unused)}：{removed} 个")
+
+def wait_for_indexing(index_name: str, interval: float = 1.0):
+    """
+    轮询索引状态，直到后台索引完成。
+
+    参数:
+        index_name (str): 索引名称。
+        interval (float): 轮询间隔（秒）。
+    """
+    while True:
+        info = redis_client.ft(index_name).info()
+        if int(info.get("indexing", 0)) == 0:
+            print(f"✅ 索引 {index_name} 已完成，文档数 {info.get('num_docs')}")
+            return
+        print(f"⏳ 正在索引 {index_name}：{float(info.get('percent_indexed', 0)):.1%}")
+        time.sleep(interval)
+
+# ========== 文档字段 ==========
+def faq_key(doc: dict) -> str:
+    """
+    根据问题和答案的内容哈希生成确定性的 Redis 键名。
+
+    相同的问答无论写入多少次都对应同一个 key，重复运行不会产生重复数据。
+
+    参数:
+        doc (dict): 包含 question、answer 字段的 FAQ 数据。
+
+    返回:
+        str: 形如 faq:<sha1> 的键名。
+    """
+    content = doc["question"] + "\n" + doc["answer"]
+    return "faq:" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def meta_fingerprint(doc: dict) -> str:
+    """
+    计算 FAQ 元数据指纹，用于判断是否只需更新元数据而无需重新向量化。
+
+    crawl_time 每次处理都会变化，不参与指纹计算。
+
+    参数:
+        doc (dict): 包含 metadata 字段的 FAQ 数据。
+
+    返回:
+        str: 元数据指纹。
+    """
+    meta = doc["metadata"]
+    content = meta["source"] + "\n" + meta["category"]
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def index_sources(pipe, key: str, source: str):
+    """
+    把文档 key 登记到其每个来源页面（去重合并后 source 为逗号分隔的多个页面）的清单索引中。
+
+    索引只增不减，可能包含 source 已不再指向该页面或已删除的 key，读取方需按清单与 source 字段核对。
+
+    参数:
+        pipe: Redis 客户端或 pipeline。
+        key (str): 文档 key。
+        source (str): 来源页面 URL，多个时以逗号分隔。
+    """
+    for url in (source or "").split(","):
+        if url:
+            pipe.sadd(SOURCE_INDEX_PREFIX + url, key)
+
+def embedding_text(doc: dict) -> str:
+    """
+    拼接问题和答案，作为嵌入模型的输入文本。
+
+    参数:
+        doc (dict): 包含 question、answer 字段的 FAQ 数据。
+
+    返回:
+        str: 用于向量化的文本。
+    """
+    return doc["question"] + " " + doc["answer"]
+
+def crawl_timestamp(crawl_time: str) -> int:
+    """
+    将 ISO 格式的抓取时间转换为 Unix 时间戳，供 NUMERIC 字段做范围过滤。
+
+    参数:
+        crawl_time (str): ISO 8601 时间字符串。
+
+    返回:
+        int: Unix 时间戳（秒），无法解析时为 0。
     """
     try:
-        redis_client.ft(INDEX_NAME).info()
-        print("✅ 索引已存在")
-    except Exception:
-        redis_client.ft(INDEX_NAME).create_index(
-            [
-                TextField("question"),
-                TextField("answer"),
-                TextField("source"),
-                TextField("category"),
-                TextField("crawl_time"),
-                VectorField(
-                    "embedding",
-                    "HNSW",
-                    {"TYPE": "FLOAT32", "DIM": VECTOR_DIM, "DISTANCE_METRIC": DISTANCE_METRIC}
-                )
-            ],
-            definition=IndexDefinition(prefix=["faq:"])
-        )
-        print("✅ 已创建向量索引")
+        return int(datetime.fromisoformat(crawl_time).timestamp())
+    except ValueError:
+        return 0
+
+def faq_mapping(doc: dict, vector: bytes = None) -> dict:
+    """
+    构造写入 Redis Hash 的字段映射。
+
+    参数:
+        doc (dict): 包含问题、答案及元数据的 FAQ 数据。
+        vector (bytes): FLOAT32 向量的字节表示，按当前精度配置转换后写入；为空时只包含元数据字段。
+
+    返回:
+        dict: Redis Hash 字段映射。
+    """
+    mapping = {
+        "question": doc["question"],
+        "answer": doc["answer"],
+        "source": doc["metadata"]["source"],
+        "category": doc["metadata"]["category"],
+        "crawl_time": doc["metadata"]["crawl_time"],
+        "crawl_ts": crawl_timestamp(doc["metadata"]["crawl_time"]),
+    }
+    if vector is not None:
+        mapping.update(storage_fields(vector))
+    return mapping
 
 # ========== 插入一条 FAQ ==========
 def insert_faq(doc: dict):
@@ -74,54 +442,761 @@ def insert_faq(doc: dict):
 
     返回值:
         无返回值。结果通过打印输出表示操作是否成功。
+        NumPy 后端只写入内存，由调用方统一落盘（vector_store.flush）。
     """
-    # 拼接问题和答案作为嵌入模型的输入文本
-    text_for_embedding = doc["question"] + " " + doc["answer"]
+    # 拼接问题和答案作为嵌入模型的输入文本，获取向量表示（优先读取本地缓存）
+    try:
+        vector = embed_texts([embedding_text(doc)])[0]
+    except Exception as e:
+        print(e)
+        dead_letter.add([doc], e)
+        return
 
-    # 调用 DashScope 多模态嵌入模型获取向量表示
-    resp = dashscope.MultiModalEmbedding.call(
-        model="multimodal-embedding-v1",
-        input=[{"text": text_for_embedding}]
-    )
+    # 构造 Redis 键名
+    key = faq_key(doc)
+    if vector_store is not None:
+        vector_store.add([key], [faq_mapping(doc)], [vector])
+        print(f"✅ 已写入 NumPy 索引, key={key}")
+        return
+    # 存储 FAQ 数据及其向量表示到 Redis Hash 结构中，并登记到清单（分片部署时写入路由到的分片）
+    client = shard_cluster.client_for(key, doc) if shard_cluster is not None else redis_client
+    client.hset(key, mapping=faq_mapping(doc, vector))
+    client.hset(MANIFEST_KEY, key, meta_fingerprint(doc))
+    index_sources(client, key, doc["metadata"]["source"])
+    print(f"✅ 已写入 Redis, key={key}")
+
+# ========== 流式读取 ==========
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """
+    增量解析顶层为数组的 JSON 文件，逐个产出数组元素，内存占用与文件大小无关。
+
+    参数:
+        f (TextIO): 已打开的文本文件对象。
+        chunk_size (int): 每次读入的字符数。
+
+    返回:
+        Iterator[dict]: 数组中的每个元素。
+
+    异常:
+        ValueError: 文件不是以 JSON 数组开头或数组未闭合时抛出。
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof, started = "", 0, False, False
+    while True:
+        # 跳过空白和元素分隔符，缓冲区耗尽时继续读入
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("❌ JSON 数组未闭合")
+            chunk = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
 
-    if resp.status_code == HTTPStatus.OK:
-        # 提取嵌入向量并转换为字节格式以便存储到 Redis 中
-        embedding = resp.output["embeddings"][0]["embedding"]
-        vector = np.array(embedding, dtype=np.float32).tobytes()
-
-        # 构造 Redis 键名
-        key = f"faq:{resp.request_id}"
-        # 存储 FAQ 数据及其向量表示到 Redis Hash 结构中
-        redis_client.hset(key, mapping={
-            "question": doc["question"],
-            "answer": doc["answer"],
-            "source": doc["metadata"]["source"],
-            "category": doc["metadata"]["category"],
-            "crawl_time": doc["metadata"]["crawl_time"],
-            "embedding": vector
-        })
-        print(f"✅ 已写入 Redis, key={key}")
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("❌ 文件顶层不是 JSON 数组")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 当前元素被截断在缓冲区末尾，读入更多内容后重试
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        yield obj
+        pos = end
+
+def iter_docs_with_offsets(file_path: str, skip: int = 0, offset: int = None):
+    """
+    流式读取 FAQ 数据文件，同时产出每条数据结束处的字节偏移，用于断点续传。
+
+    参数:
+        file_path (str): FAQ 数据文件路径。
+        skip (int): 跳过开头的条数。
+        offset (int): .jsonl 文件的起始字节偏移，给出时直接定位而不再按 skip 跳过。
+
+    返回:
+        Iterator[tuple]: (doc, end_offset)；JSON 数组无法按字节定位，end_offset 为 None。
+    """
+    if file_path.endswith(".jsonl"):
+        with open(file_path, "rb") as f:
+            if offset:
+                f.seek(offset)
+            else:
+                for _ in range(skip):
+                    f.readline()
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                line = line.strip()
+                if line:
+                    yield json.loads(line), f.tell()
     else:
-        print(f"❌ Embedding 调用失败: {resp.code}, {resp.message}")
+        with open(file_path, "r", encoding="utf-8") as f:
+            for doc in islice(iter_json_array(f), skip, None):
+                yield doc, None
+
+def iter_docs(file_path: str):
+    """
+    流式读取 FAQ 数据文件：.jsonl 按行读取，其余按 JSON 数组增量解析。
+
+    参数:
+        file_path (str): FAQ 数据文件路径。
+
+    返回:
+        Iterator[dict]: 逐条产出的 FAQ 数据。
+    """
+    for doc, _ in iter_docs_with_offsets(file_path):
+        yield doc
+
+def open_checkpoint(file_path: str, resume: bool = False) -> IngestCheckpoint:
+    """
+    创建文件入库的检查点；resume 为真时从上次中断处继续。
+
+    参数:
+        file_path (str): FAQ 数据文件路径。
+        resume (bool): 是否读取已有检查点。
+
+    返回:
+        IngestCheckpoint: 入库检查点。
+    """
+    checkpoint = IngestCheckpoint(file_path)
+    if resume and not checkpoint.load():
+        print("ℹ️ 没有可用的检查点，从头开始写入")
+    return checkpoint
 
 # ========== 批量处理 ==========
-def insert_from_file(file_path="faq_processed.json"):
+def insert_from_file(file_path="faq_processed.json", resume: bool = False):
     """
-    从指定 JSON 文件中读取 FAQ 数据并逐条插入 Redis。
+    从指定 JSON / JSONL 文件中流式读取 FAQ 数据并逐条插入 Redis。
+
+    每条写入后记录检查点，中断后以 resume=True 重新运行时跳过已写入的数据。
+    NumPy 后端落盘需重写整个元数据文件，每 NUMPY_CHECKPOINT_DOCS 条落盘一次并推进检查点。
 
     参数:
-        file_path (str): JSON 格式的 FAQ 数据文件路径，默认为 "faq_processed.json"
+        file_path (str): FAQ 数据文件路径，默认为 "faq_processed.json"
+        resume (bool): 是否从上次中断处继续。
 
     返回值:
         无返回值。每条数据插入后会打印状态信息。
     """
-    with open(file_path, "r", encoding="utf-8") as f:
-        docs = json.load(f)
-
-    for doc in docs:
+    checkpoint = open_checkpoint(file_path, resume)
+    items = iter_docs_with_offsets(file_path, skip=checkpoint.docs, offset=checkpoint.offset)
+    # NumPy 索引中尚未落盘的条目对应的批次编号
+    unflushed = []
+    for doc in checkpoint.track(items):
+        batch_no = checkpoint.submit(1)
         insert_faq(doc)
+        if vector_store is None:
+            checkpoint.commit([batch_no])
+            continue
+        unflushed.append(batch_no)
+        if len(unflushed) >= NUMPY_CHECKPOINT_DOCS:
+            vector_store.flush()
+            checkpoint.commit(unflushed)
+            unflushed.clear()
+    if vector_store is not None:
+        vector_store.flush()
+        checkpoint.commit(unflushed)
+    checkpoint.clear()
+
+# ========== 批量向量化 ==========
+def embed_texts(texts: list) -> list:
+    """
+    获取多条文本的向量表示：命中本地缓存的直接返回，其余通过一次 DashScope 请求获取（经 embed_scheduler 限速与重试）。
+
+    参数:
+        texts (list[str]): 待向量化的文本列表，长度不超过 EMBED_BATCH_SIZE。
+
+    返回:
+        list[bytes]: 与 texts 顺序一致的 FLOAT32 向量字节列表。
+
+    异常:
+        RuntimeError: 当调用嵌入服务失败时抛出异常。
+    """
+    # 本地缓存保存完整维度的向量，降维在取出后进行
+    vectors = cached_embed(texts, model=EMBEDDING_MODEL, embed_fn=embed_scheduler.embed)
+    return [reduce_vector(vector) for vector in vectors]
+
+def iter_batches(items, batch_size: int):
+    """
+    将任意可迭代对象按固定大小切分为批次。
+
+    参数:
+        items (Iterable): 待切分的数据。
+        batch_size (int): 每批的数据条数。
+
+    返回:
+        Iterator[list]: 逐批产出的列表。
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _embed_batch(batch: list) -> tuple:
+    """
+    在线程池中执行的单批向量化任务，同时记录该批次的调用耗时。
+
+    参数:
+        batch (list[dict]): 一批 FAQ 数据。
+
+    返回:
+        tuple: (vectors, elapsed)
+    """
+    start = time.perf_counter()
+    vectors = embed_texts([embedding_text(doc) for doc in batch])
+    return vectors, time.perf_counter() - start
+
+# ========== 批量写入 ==========
+def bulk_insert(docs, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY,
+                pipeline_chunk=PIPELINE_CHUNK, dedup: Deduplicator = None,
+                checkpoint: IngestCheckpoint = None) -> dict:
+    """
+    批量向量化并写入 Redis。
+
+    文档按 batch_size 分批调用 Embedding 接口，最多 concurrency 个批次同时在途；
+    向量结果通过 Redis pipeline 累积，每 pipeline_chunk 条命令提交一次。
+    给出 checkpoint 时，每次 pipeline 提交后把已写入的批次登记到检查点。
+
+    参数:
+        docs (Iterable[dict]): FAQ 数据，可以是列表或生成器。
+        batch_size (int): 单次 Embedding 请求的文本条数。
+        concurrency (int): 同时在途的 Embedding 请求数上限。
+        pipeline_chunk (int): Redis pipeline 单次提交的命令数。
+        dedup (Deduplicator): 入库去重状态，见 load_deduplicator；为空时不去重。
+        checkpoint (IngestCheckpoint): 入库检查点，docs 需经 checkpoint.track 读取；为空时不记录。
+
+    返回:
+        dict: 统计信息，包括 docs、failed、embed_time、redis_time、elapsed。
+    """
+    stats = {"docs": 0, "failed": 0, "embed_time": 0.0, "redis_time": 0.0, "elapsed": 0.0}
+    # 调度器的在途请求上限与线程池一致，否则 concurrency 超过导入时的默认值也不会生效
+    embed_scheduler.limiter.resize(concurrency)
+    # 分片部署时每个分片一个 pipeline，提交时并发执行
+    pipes = shard_cluster.pipelines() if shard_cluster is not None else [redis_client.pipeline(transaction=False)]
+    pending = 0
+    # 已进入 pipeline / NumPy 索引但尚未落盘的批次编号
+    unflushed = []
+
+    def commit(batch_nos):
+        if checkpoint is not None:
+            checkpoint.commit(batch_nos)
+
+    def flush():
+        nonlocal pending
+        if pending == 0:
+            return
+        start = time.perf_counter()
+        if vector_store is not None:
+            vector_store.flush()
+        elif shard_cluster is not None:
+            list(shard_cluster.pool.map(lambda pipe: pipe.execute(), pipes))
+        else:
+            pipes[0].execute()
+        stats["redis_time"] += time.perf_counter() - start
+        pending = 0
+        commit(unflushed)
+        unflushed.clear()
+
+    def collect(future, batch, batch_no):
+        nonlocal pending
+        try:
+            vectors, elapsed = future.result()
+        except Exception as e:
+            stats["failed"] += len(batch)
+            if dedup is not None:
+                dedup.discard([faq_key(doc) for doc in batch], batch)
+            print(e)
+            # 进入死信文件的批次同样视为已处理，恢复时不再重复向量化
+            dead_letter.add(batch, e)
+            commit([batch_no])
+            return
+        stats["embed_time"] += elapsed
+        if dedup is not None:
+            kept = dedup.filter_batch([faq_key(doc) for doc in batch], batch, vectors)
+            batch, vectors = [batch[i] for i in kept], [vectors[i] for i in kept]
+            if not batch:
+                commit([batch_no])
+                return
+        unflushed.append(batch_no)
+        if vector_store is not None:
+            start = time.perf_counter()
+            vector_store.add([faq_key(doc) for doc in batch], [faq_mapping(doc) for doc in batch], vectors)
+            stats["redis_time"] += time.perf_counter() - start
+            stats["docs"] += len(batch)
+            # NumPy 索引落盘需重写整个元数据文件，只在记录检查点时按较大的间隔落盘
+            if checkpoint is not None:
+                pending += len(batch)
+                if pending >= NUMPY_CHECKPOINT_DOCS:
+                    flush()
+            return
+        for doc, vector in zip(batch, vectors):
+            key = faq_key(doc)
+            pipe = pipes[shard_cluster.shard_for(key, doc)] if shard_cluster is not None else pipes[0]
+            pipe.hset(key, mapping=faq_mapping(doc, vector))
+            pipe.hset(MANIFEST_KEY, key, meta_fingerprint(doc))
+            index_sources(pipe, key, doc["metadata"]["source"])
+            pending += 3
+        stats["docs"] += len(batch)
+        if pending >= pipeline_chunk:
+            flush()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # 在途任务 -> 对应批次；上限取并发数的两倍，保证 pipeline 提交期间线程池不空转
+        in_flight = {}
+        for batch in iter_batches(docs, batch_size):
+            # 批次编号按输入顺序分配，检查点据此计算已写入的连续前缀
+            batch_no = checkpoint.submit(len(batch)) if checkpoint is not None else None
+            # 完全重复的问答在向量化之前丢弃
+            if dedup is not None:
+                batch = [doc for doc in batch if not dedup.check_exact(faq_key(doc), doc)]
+                if not batch:
+                    commit([batch_no])
+                    continue
+            # 在途批次达到上限时先消费已完成的结果，避免一次性提交全部任务
+            while len(in_flight) >= concurrency * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future, *in_flight.pop(future))
+            in_flight[pool.submit(_embed_batch, batch)] = (batch, batch_no)
+        for future in list(in_flight):
+            collect(future, *in_flight.pop(future))
+    flush()
+    if dedup is not None:
+        apply_merges(dedup)
+    if vector_store is not None:
+        vector_store.flush()
+    stats["elapsed"] = time.perf_counter() - start
+
+    print_stats(stats, concurrency)
+    embed_scheduler.print_stats()
+    if dedup is not None:
+        dedup.print_stats()
+    return stats
+
+def load_deduplicator(threshold: float = DEDUP_THRESHOLD) -> Deduplicator:
+    """
+    创建入库去重状态，并登记索引中已有的问答，使新数据也与已有数据比较。
+
+    参数:
+        threshold (float): 近似重复的余弦相似度阈值。
+
+    返回:
+        Deduplicator: 去重状态。
+    """
+    dedup = Deduplicator(dim=INDEX_DIM, threshold=threshold)
+    if vector_store is not None:
+        for key, row in vector_store.keys.items():
+            dedup.add_existing(key, vector_store.rows[row], vector_store.vectors[row])
+        return dedup
+
+    fields = ["question", "answer", "source", "category", VECTOR_FIELDS[VECTOR_TYPE]]
+    keys = []
+    pipe = redis_client.pipeline(transaction=False)
+
+    def register():
+        for key, values in zip(keys, pipe.execute()):
+            if values[-1] is None:
+                continue
+            row = {name: value.decode() for name, value in zip(fields[:4], values[:4]) if value is not None}
+            dedup.add_existing(key.decode(), row, decode_vector(values[-1], VECTOR_TYPE))
+        keys.clear()
+
+    for key in redis_client.scan_iter(match="faq:*", count=1000):
+        keys.append(key)
+        pipe.hmget(key, fields)
+        if len(keys) >= PIPELINE_CHUNK:
+            register()
+    register()
+    print(f"🧹 已载入 {dedup.count} 条已有问答参与去重")
+    return dedup
+
+def apply_merges(dedup: Deduplicator):
+    """
+    将去重时合并的 source / category 写回保留的问答，并同步更新清单中的元数据指纹（按合并后的元数据计算）；
+    被丢弃的问答以 dup:<保留的问答 key> 登记到清单，之后的增量同步不会把它们当作新增再次向量化。
+
+    参数:
+        dedup (Deduplicator): 入库去重状态。
+    """
+    merged = dedup.merged_fields()
+    if vector_store is not None:
+        for key, fields in merged.items():
+            vector_store.update(key, fields)
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for key, fields in merged.items():
+        pipe.hset(key, mapping=fields)
+        pipe.hset(MANIFEST_KEY, key, meta_fingerprint({"metadata": fields}))
+        index_sources(pipe, key, fields["source"])
+        if len(pipe) >= PIPELINE_CHUNK:
+            pipe.execute()
+    for key, canonical in dedup.dropped.items():
+        pipe.hset(MANIFEST_KEY, key, DUP_PREFIX + canonical)
+        index_sources(pipe, key, dedup.dropped_sources.get(key))
+        if len(pipe) >= PIPELINE_CHUNK:
+            pipe.execute()
+    pipe.execute()
+
+def print_stats(stats: dict, concurrency: int):
+    """
+    打印批量写入的吞吐量与耗时分布。
+
+    参数:
+        stats (dict): bulk_insert 返回的统计信息。
+        concurrency (int): Embedding 并发数，用于换算墙钟耗时。
+    """
+    elapsed = stats["elapsed"] or 1e-9
+    print(f"📊 写入 {stats['docs']} 条，失败 {stats['failed']} 条，"
+          f"总耗时 {stats['elapsed']:.2f}s，吞吐 {stats['docs'] / elapsed:.1f} docs/s")
+    print(f"   Embedding 累计耗时 {stats['embed_time']:.2f}s"
+          f"（{concurrency} 路并发，约合墙钟 {stats['embed_time'] / concurrency:.2f}s）")
+    print(f"   {'NumPy' if vector_store is not None else 'Redis'} 写入耗时 {stats['redis_time']:.2f}s")
+
+def retry_dead_letter(**kwargs) -> dict:
+    """
+    重新写入死信文件中的 FAQ，再次失败的会重新进入死信文件。
+
+    参数:
+        **kwargs: 透传给 bulk_insert 的批量参数。
+
+    返回:
+        dict: bulk_insert 的统计信息。
+    """
+    docs = dead_letter.drain()
+    if not docs:
+        print("✅ 死信文件为空")
+        return {}
+    print(f"📮 重试死信文件中的 {len(docs)} 条 FAQ")
+    stats = bulk_insert(docs, **kwargs)
+    dead_letter.ack()
+    return stats
+
+def bulk_insert_from_file(file_path="faq_processed.json", resume: bool = False, **kwargs) -> dict:
+    """
+    从 JSON / JSONL 文件中流式读取 FAQ 数据，以批量模式写入 Redis。
+
+    文件按批次读取，内存中只保留在途批次和待提交的 pipeline，不随文件大小增长。
+    每次 pipeline 提交后记录检查点，中断后以 resume=True 重新运行时从最后一个已提交的批次之后继续。
+
+    参数:
+        file_path (str): FAQ 数据文件路径。
+        resume (bool): 是否从上次中断处继续。
+        **kwargs: 透传给 bulk_insert 的批量参数。
+
+    返回:
+        dict: bulk_insert 的统计信息。
+    """
+    checkpoint = open_checkpoint(file_path, resume)
+    items = iter_docs_with_offsets(file_path, skip=checkpoint.docs, offset=checkpoint.offset)
+    stats = bulk_insert(checkpoint.track(items), checkpoint=checkpoint, **kwargs)
+    checkpoint.clear()
+    return stats
+
+# ========== 增量同步 ==========
+def load_manifest() -> dict:
+    """
+    读取已入库 FAQ 清单。
+
+    清单为空时（例如首次启用增量同步），扫描 faq: 前缀下的已有数据作为清单，
+    元数据指纹置空：内容哈希键会只刷新元数据，旧的随机键则会被当作过期数据清理。
+
+    返回:
+        dict: 文档 key -> 元数据指纹。
+    """
+    manifest = {
+        key.decode(): fp.decode()
+        for key, fp in redis_client.hgetall(MANIFEST_KEY).items()
+    }
+    if not manifest:
+        manifest = {key.decode(): "" for key in redis_client.scan_iter(match="faq:*", count=1000)}
+    return manifest
+
+def load_change_scope(change_file: str) -> set:
+    """
+    读取 collect.py --state 输出的变更集，返回其中页面（新增、变化与删除）的 URL。
+    """
+    with open(change_file, "r", encoding="utf-8") as f:
+        return {json.loads(line)["url"] for line in f if line.strip()}
+
+def out_of_scope(keys: list, scope: set) -> set:
+    """
+    返回来源不全在 scope 内的文档 key：去重合并后 source 为逗号分隔的多个页面，
+    只要还有未变化的页面包含该问答就保留。
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hget(key, "source")
+    kept = set()
+    for key, source in zip(keys, pipe.execute()):
+        if source is None or not set(source.decode().split(",")) <= scope:
+            kept.add(key)
+    return kept
+
+def lookup_manifest(keys: list) -> dict:
+    """
+    按 key 读取清单中的元数据指纹，不在清单中的 key 不出现在结果中。
+    """
+    if not keys:
+        return {}
+    return {key: fp.decode() for key, fp in zip(keys, redis_client.hmget(MANIFEST_KEY, keys)) if fp is not None}
+
+def build_source_index():
+    """
+    扫描清单与各问答的 source 字段，建立按页面的清单索引（首次使用变更集同步时执行一次）。
+
+    dup: 项没有对应的文档，来源未知，不登记；下次全量同步会按其所在页面补登。
+    """
+    print("🗂️ 首次建立按页面的清单索引")
+    keys = []
+    pipe = redis_client.pipeline(transaction=False)
+
+    def register():
+        for key, source in zip(keys, pipe.execute()):
+            if source is not None:
+                index_sources(pipe, key, source.decode())
+        pipe.execute()
+        keys.clear()
+
+    for key, fp in redis_client.hscan_iter(MANIFEST_KEY, count=1000):
+        if fp.startswith(DUP_PREFIX.encode()):
+            continue
+        keys.append(key.decode())
+        pipe.hget(key, "source")
+        if len(keys) >= PIPELINE_CHUNK:
+            register()
+    register()
+    redis_client.set(SOURCE_INDEX_READY, 1)
+
+def scope_candidates(scope: set) -> set:
+    """
+    返回按页面的清单索引中登记在 scope 页面下的文档 key，即变更集同步中可能需要删除的问答。
+    """
+    if not redis_client.exists(SOURCE_INDEX_READY):
+        build_source_index()
+    return {key.decode() for key in redis_client.sunion([SOURCE_INDEX_PREFIX + url for url in scope])}
+
+def sync_docs(docs, scope: set = None, **kwargs) -> dict:
+    """
+    将 FAQ 数据与 Redis 中的索引增量同步。
+
+    - 新增或内容变化的问答：重新向量化并写入（内容变化即 key 变化）；
+    - 仅元数据变化的问答：只更新元数据字段，不调用 Embedding；
+    - 数据源中已不存在的问答：从 Redis 与清单中删除，并清除引用它们的缓存答案。
+
+    docs 可以是生成器。全量同步在内存中保留整个清单和已出现的 key 集合；
+    给出 scope 时 docs 只包含变更集中页面的 FAQ，清单按 key 分批读取，删除候选取自按页面的清单索引，
+    读取量与变更集大小成正比，删除也只限于来源全部在 scope 内的问答。
+
+    启用去重（dedup）时，保留问答的元数据由本次出现的全部重复问答重新合并，
+    与清单中的指纹（按合并后的元数据计算）比较，变化时随 bulk_insert 的合并结果一起写回；
+    清单中记为 dup: 的问答不再向量化，只把来源合并到保留的问答上，并使保留的问答不被当作过期数据删除。
+
+    参数:
+        docs (Iterable[dict]): 当前全量 FAQ 数据，或变更集页面的 FAQ 数据。
+        scope (set[str]): 变更集中的页面 URL，见 load_change_scope；为空时按全量同步。
+        **kwargs: 透传给 bulk_insert 的批量参数。
+
+    返回:
+        dict: 统计信息，包括 added、updated、unchanged、deleted。
+    """
+    # 清单尚不存在时（首次启用增量同步）变更集同步同样按 load_manifest 扫描已有数据
+    scoped = scope is not None and bool(redis_client.exists(MANIFEST_KEY))
+    manifest = {} if scoped else load_manifest()
+    dedup = kwargs.get("dedup")
+    seen = set()
+    # 仍被重复问答引用的保留问答，即使自身不在本次数据中也不删除
+    alive = set()
+    # 本次同步中重新合并过元数据的保留问答
+    restated = set()
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    pipe = redis_client.pipeline(transaction=False)
+
+    def lookup(keys: list):
+        if scoped:
+            manifest.update(lookup_manifest([key for key in keys if key not in manifest]))
+
+    def merge(key: str, doc: dict):
+        if key not in restated:
+            restated.add(key)
+            keep = None
+            if scope is not None:
+                # 变更集同步只重新合并变更页面的来源，其余页面的来源原样保留
+                stored = dedup.meta.get(key, {})
+                keep = {
+                    "source": ",".join(url for url in stored.get("source", "").split(",") if url and url not in scope),
+                    "category": stored.get("category", "")
+                }
+            dedup.restate(key, keep)
+        dedup.merge_into(key, doc)
+
+    def changed_docs():
+        for batch in iter_batches(docs, PIPELINE_CHUNK):
+            keys = [faq_key(doc) for doc in batch]
+            lookup(keys)
+            lookup([manifest[key][len(DUP_PREFIX):] for key in keys if manifest.get(key, "").startswith(DUP_PREFIX)])
+            for key, doc in zip(keys, batch):
+                if key in seen:
+                    continue
+                seen.add(key)
+                # 每个出现的问答都登记到所在页面，全量同步后按页面的清单索引即覆盖全部问答
+                index_sources(pipe, key, doc["metadata"]["source"])
+                fp = manifest.get(key)
+                canonical = fp[len(DUP_PREFIX):] if fp and fp.startswith(DUP_PREFIX) else None
+                if canonical is not None and canonical in manifest:
+                    # 已被去重归并的问答：不再向量化，来源合并到保留的问答上
+                    alive.add(canonical)
+                    index_sources(pipe, canonical, doc["metadata"]["source"])
+                    if dedup is not None:
+                        merge(canonical, doc)
+                    stats["unchanged"] += 1
+                elif fp is None or canonical is not None:
+                    stats["added"] += 1
+                    yield doc
+                elif dedup is not None:
+                    # 合并后的元数据在全部数据读完后统一与清单比较
+                    merge(key, doc)
+                elif fp != meta_fingerprint(doc):
+                    # 只刷新元数据字段，保留已有向量
+                    pipe.hset(key, mapping=faq_mapping(doc))
+                    pipe.hset(MANIFEST_KEY, key, meta_fingerprint(doc))
+                    stats["updated"] += 1
+                else:
+                    stats["unchanged"] += 1
+                if len(pipe) >= PIPELINE_CHUNK:
+                    pipe.execute()
+
+        if dedup is not None:
+            # 合并结果有变化的保留问答交给 bulk_insert 结束时的 apply_merges 写回
+            for key in restated:
+                if meta_fingerprint({"metadata": dedup.meta[key]}) != manifest.get(key):
+                    dedup.merged.add(key)
+                    stats["updated"] += 1
+                else:
+                    dedup.merged.discard(key)
+                    stats["unchanged"] += 1
+        # 元数据更新必须先于 apply_merges 执行，否则会覆盖合并后的 source / category
+        pipe.execute()
+
+    bulk_insert(changed_docs(), **kwargs)
+    if dedup is not None:
+        alive.update(dedup.dropped.values())
+
+    orphans = []
+    if scoped:
+        candidates = [key for key in scope_candidates(scope) if key not in seen and key not in alive]
+        lookup(candidates)
+        # 索引中已不在清单里的 key（此前已删除的问答）顺带从索引中清除
+        orphans = [key for key in candidates if key not in manifest]
+        stale = [key for key in candidates if key in manifest]
+    else:
+        stale = [key for key in manifest if key not in seen and key not in alive]
+    if scope is not None:
+        # dup: 项没有对应的文档，登记在变更页面下却未再出现即已删除；其余问答按 source 核对
+        documents = [key for key in stale if not manifest[key].startswith(DUP_PREFIX)]
+        kept = set()
+        for start in range(0, len(documents), PIPELINE_CHUNK):
+            kept |= out_of_scope(documents[start:start + PIPELINE_CHUNK], scope)
+        stale = [key for key in stale if key not in kept]
+    for key in stale:
+        pipe.delete(key)
+        pipe.hdel(MANIFEST_KEY, key)
+        if len(pipe) >= PIPELINE_CHUNK:
+            pipe.execute()
+    if scoped and (stale or orphans):
+        for url in scope:
+            pipe.srem(SOURCE_INDEX_PREFIX + url, *stale, *orphans)
+    if scope is None:
+        pipe.set(SOURCE_INDEX_READY, 1)
+    stats["deleted"] = len(stale)
+    pipe.execute()
+    invalidated = answer_cache.invalidate_docs(stale)
+
+    print(f"🔄 增量同步完成：新增 {stats['added']}，元数据更新 {stats['updated']}，"
+          f"未变化 {stats['unchanged']}，删除 {stats['deleted']}，失效缓存答案 {invalidated}")
+    return stats
+
+def sync_from_file(file_path="faq_processed.json", change_file: str = None, **kwargs) -> dict:
+    """
+    从 JSON / JSONL 文件流式读取 FAQ 数据并与 Redis 增量同步。
+
+    参数:
+        file_path (str): FAQ 数据文件路径；给出 change_file 时为 process.py --changes 的输出。
+        change_file (str): collect.py --state 输出的变更集，只同步其中页面的 FAQ；为空时按全量同步。
+        **kwargs: 透传给 bulk_insert 的批量参数。
+
+    返回:
+        dict: sync_docs 的统计信息。
+    """
+    scope = load_change_scope(change_file) if change_file else None
+    if scope is not None and not scope:
+        print("✅ 变更集为空，无需同步")
+        return {}
+    return sync_docs(iter_docs(file_path), scope=scope, **kwargs)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FAQ 向量化并写入 Redis")
+    parser.add_argument("--file", default="faq_processed.json", help="FAQ 数据文件（.json 或 .jsonl）")
+    parser.add_argument("--bulk", action="store_true", help="使用批量并发模式写入")
+    parser.add_argument("--sync", action="store_true", help="增量同步：只写入新增/变化的 FAQ，并删除已移除的 FAQ")
+    parser.add_argument("--changes", help="与 --sync 一起使用：collect.py --state 输出的变更集，只同步其中的页面")
+    parser.add_argument("--reindex", action="store_true", help="不停服重建索引并切换别名后退出")
+    parser.add_argument("--migrate-schema", choices=["text", "tag"], help="按新的索引结构重建索引后退出")
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M, help="重建索引的 HNSW M")
+    parser.add_argument("--hnsw-ef-construction", type=int, default=HNSW_EF_CONSTRUCTION, help="重建索引的 HNSW EF_CONSTRUCTION")
+    parser.add_argument("--hnsw-ef-runtime", type=int, default=HNSW_EF_RUNTIME, help="重建索引的 HNSW EF_RUNTIME")
+    parser.add_argument("--keep-old-vectors", action="store_true",
+                        help="重建索引后保留当前精度配置不再使用的向量字段（默认删除，例如迁移到 FLOAT16 后删除 FLOAT32 向量）")
+    parser.add_argument("--resume", action="store_true", help="从上次中断时的检查点继续写入 --file")
+    parser.add_argument("--retry-dead-letter", action="store_true", help="重新写入死信文件中向量化失败的 FAQ")
+    parser.add_argument("--dedup", action="store_true", help="批量写入 / 增量同步时去除完全重复与近似重复的 FAQ")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD, help="近似重复的余弦相似度阈值")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="单次 Embedding 请求的文本条数")
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY, help="同时在途的 Embedding 请求数")
+    parser.add_argument("--pipeline-size", type=int, default=PIPELINE_CHUNK, help="Redis pipeline 单次提交的命令数")
+    args = parser.parse_args()
+
+    if vector_store is not None and (args.reindex or args.migrate_schema or args.sync):
+        parser.error("NumPy 后端不支持 --reindex / --migrate-schema / --sync，请使用 VECTOR_BACKEND=redis")
+    if shard_cluster is not None and (args.reindex or args.migrate_schema or args.sync or args.dedup):
+        parser.error("分片部署（REDIS_SHARDS）不支持 --reindex / --migrate-schema / --sync / --dedup")
+
+    if args.reindex or args.migrate_schema:
+        reindex(
+            args.migrate_schema or INDEX_SCHEMA,
+            m=args.hnsw_m,
+            ef_construction=args.hnsw_ef_construction,
+            ef_runtime=args.hnsw_ef_runtime,
+            keep_old_vectors=args.keep_old_vectors
+        )
+        sys.exit(0)
+
     # 程序入口：先创建索引再批量插入数据
     create_index()
-    insert_from_file("faq_processed.json")
+    batch_kwargs = dict(
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        pipeline_chunk=args.pipeline_size,
+        dedup=load_deduplicator(args.dedup_threshold) if args.dedup else None
+    )
+    if args.retry_dead_letter:
+        retry_dead_letter(**batch_kwargs)
+    elif args.sync:
+        sync_from_file(args.file, change_file=args.changes, **batch_kwargs)
+    elif args.bulk or args.dedup:
+        bulk_insert_from_file(args.file, resume=args.resume, **batch_kwargs)
+    else:
+        insert_from_file(args.file, resume=args.resume)
@@ -0,0 +1,6 @@
+# 安装问答系统依赖
+pip install dashscope redis numpy python-dotenv openai
+# 可选：混合检索使用 jieba 分词
+pip install jieba
+# 异步服务（serve_async.py）依赖
+pip install fastapi uvicorn httpx
@@ -0,0 +1,246 @@
+# 进程内 NumPy 向量索引：无需 Redis Stack，适合 10 万条以内的 FAQ 以及开发、CI 环境。
+#
+# - 向量：归一化后的 FLOAT32 矩阵，存为 vectors.npy 并以内存映射方式打开，容量不足时按倍数扩容；
+# - 元数据：旁路文件 meta.jsonl，第 i 行对应矩阵第 i 行（key 与 FAQ 字段），已删除的行为 null，新写入时复用；
+# - 检索：一次矩阵乘法得到余弦相似度，argpartition 取精确 top-k，支持多个问题批量检索。
+#
+# 通过 VECTOR_BACKEND=numpy 切换，embedding.py 与 retrieve.py 的写入、检索接口保持不变。
+
+import os
+import json
+import threading
+import numpy as np
+from pathlib import Path
+from redis.commands.search.document import Document
+
+# ========== 配置 ==========
+# 向量后端：redis 或 numpy
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "redis")
+# NumPy 后端的数据目录
+NUMPY_STORE_DIR = os.getenv("NUMPY_STORE_DIR", str(Path(__file__).resolve().parent / "faq_store"))
+# 初始容量（行数），之后按两倍扩容
+INITIAL_CAPACITY = 1024
+
+
+class NumpyVectorStore:
+    """
+    基于内存映射 .npy 矩阵与 JSONL 元数据的精确向量索引。
+
+    属性:
+        path (Path): 数据目录。
+        dim (int): 向量维度。
+        keys (dict): 文档 key -> 矩阵行号。
+    """
+
+    def __init__(self, path: str = NUMPY_STORE_DIR, dim: int = 1024):
+        self.path = Path(path)
+        self.dim = dim
+        self.vectors = None
+        self.rows = []
+        self.keys = {}
+        self.free = []
+        self._columns = None
+        self._lock = threading.Lock()
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.path / "vectors.npy"
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path / "meta.jsonl"
+
+    # ========== 创建 / 加载 ==========
+    def create_index(self):
+        """
+        打开已有数据目录，不存在时创建空索引。
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        if self.vectors_path.exists():
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.rows = [json.loads(line) for line in f]
+            self.keys = {row["key"]: i for i, row in enumerate(self.rows) if row is not None}
+            self.free = [i for i, row in enumerate(self.rows) if row is None]
+            print(f"✅ 已加载 NumPy 索引：{len(self.keys)} 条")
+        else:
+            self.vectors = np.lib.format.open_memmap(
+                self.vectors_path, mode="w+", dtype=np.float32, shape=(INITIAL_CAPACITY, self.dim)
+            )
+            self.flush()
+            print(f"✅ 已创建 NumPy 索引：{self.path}")
+
+    def _grow(self, needed: int):
+        """
+        矩阵容量不足时新建两倍大小的 .npy 文件并拷贝已有行。
+        """
+        capacity = len(self.vectors)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        tmp = self.vectors_path.with_suffix(".tmp.npy")
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        grown[:len(self.rows)] = self.vectors[:len(self.rows)]
+        grown.flush()
+        del grown
+        self.vectors = None
+        os.replace(tmp, self.vectors_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+    # ========== 写入 ==========
+    def add(self, keys: list, mappings: list, vectors: list):
+        """
+        写入或覆盖一批文档。
+
+        参数:
+            keys (list[str]): 文档 key。
+            mappings (list[dict]): 文档字段（不含向量），见 embedding.faq_mapping。
+            vectors (list[bytes]): FLOAT32 向量字节。
+        """
+        matrix = np.vstack([np.frombuffer(v, dtype=np.float32) for v in vectors])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+
+        with self._lock:
+            new = sum(1 for key in set(keys) if key not in self.keys)
+            self._grow(len(self.rows) + max(new - len(self.free), 0))
+            for key, mapping, vector in zip(keys, mappings, matrix):
+                row = self.keys.get(key)
+                if row is None:
+                    row = self.free.pop() if self.free else len(self.rows)
+                    if row == len(self.rows):
+                        self.rows.append(None)
+                    self.keys[key] = row
+                self.vectors[row] = vector
+                self.rows[row] = {"key": key, **mapping}
+            self._columns = None
+
+    def update(self, key: str, fields: dict) -> bool:
+        """
+        只更新文档字段，不改动向量。
+
+        返回:
+            bool: 文档存在并已更新时返回 True。
+        """
+        with self._lock:
+            row = self.keys.get(key)
+            if row is None:
+                return False
+            self.rows[row].update(fields)
+            self._columns = None
+            return True
+
+    def delete(self, keys) -> int:
+        """
+        删除文档，被删除的行留作后续写入复用。
+
+        返回:
+            int: 实际删除的条数。
+        """
+        removed = 0
+        with self._lock:
+            for key in keys:
+                row = self.keys.pop(key, None)
+                if row is None:
+                    continue
+                self.rows[row] = None
+                self.vectors[row] = 0
+                self.free.append(row)
+                removed += 1
+            self._columns = None
+        return removed
+
+    def flush(self):
+        """
+        将矩阵与元数据写回磁盘。元数据先写临时文件再替换，避免写入中断导致文件损坏。
+        """
+        with self._lock:
+            self.vectors.flush()
+            tmp = self.meta_path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for row in self.rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.meta_path)
+
+    # ========== 检索 ==========
+    def _filter_columns(self) -> dict:
+        """
+        过滤用的列数组，写入或删除后重新构建。
+        """
+        if self._columns is None:
+            rows = [row or {} for row in self.rows]
+            self._columns = {
+                "alive": np.array([bool(row) for row in rows], dtype=bool),
+                # 去重合并后的 category / source 为逗号分隔的多值
+                "category": [set(row.get("category", "").split(",")) for row in rows],
+                "source": [set(row.get("source", "").split(",")) for row in rows],
+                "crawl_ts": np.array([row.get("crawl_ts", 0) for row in rows], dtype=np.int64),
+            }
+        return self._columns
+
+    def _mask(self, filters: dict = None) -> np.ndarray:
+        """
+        将与 retrieve.build_filter 相同格式的过滤条件转换为行掩码。
+        """
+        columns = self._filter_columns()
+        mask = columns["alive"].copy()
+        for field in ("category", "source"):
+            values = (filters or {}).get(field)
+            if values:
+                wanted = {values} if isinstance(values, str) else set(values)
+                mask &= np.fromiter((bool(tags & wanted) for tags in columns[field]), dtype=bool, count=len(mask))
+        if filters and "crawl_after" in filters:
+            mask &= columns["crawl_ts"] >= filters["crawl_after"]
+        if filters and "crawl_before" in filters:
+            mask &= columns["crawl_ts"] <= filters["crawl_before"]
+        return mask
+
+    def search_batch(self, q_vectors: list, top_k: int, filters: dict = None) -> list:
+        """
+        批量精确检索：多个问题向量拼成矩阵，一次矩阵乘法得到全部相似度。
+
+        参数:
+            q_vectors (list[bytes]): 问题的 FLOAT32 向量字节。
+            top_k (int): 每个问题返回的结果数量。
+            filters (dict): 元数据过滤条件，见 retrieve.build_filter。
+
+        返回:
+            list[list[Document]]: 与 q_vectors 一一对应的结果，score 为余弦距离（与 Redis 一致，越小越相似）。
+        """
+        queries = np.vstack([np.frombuffer(v, dtype=np.float32) for v in q_vectors])
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        with self._lock:
+            count = len(self.rows)
+            if count == 0:
+                return [[] for _ in q_vectors]
+            mask = self._mask(filters)
+            scores = queries @ self.vectors[:count].T
+            scores[:, ~mask] = -np.inf
+            k = min(top_k, int(mask.sum()))
+            if k == 0:
+                return [[] for _ in q_vectors]
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+            results = []
+            for q_scores, candidates in zip(scores, top):
+                ordered = candidates[np.argsort(-q_scores[candidates])]
+                results.append([
+                    Document(id=self.rows[i]["key"], score=str(1 - float(q_scores[i])),
+                             **{name: value for name, value in self.rows[i].items() if name != "key"})
+                    for i in ordered
+                ])
+            return results
+
+    def search(self, q_vector: bytes, top_k: int, filters: dict = None) -> list:
+        """
+        单个问题的精确检索，返回结构与 Redis ft().search(...).docs 一致。
+        """
+        return self.search_batch([q_vector], top_k, filters)[0]
+
+    def __len__(self):
+        return len(self.keys)
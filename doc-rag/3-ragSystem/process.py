@@ -3,11 +3,39 @@
 # 文本清洗（去除 HTML 标签、无关字符）
 # 分段切分（按规则或语义将文档拆分成小片段，便于检索）
 # 元数据标注（来源、时间、业务类别等）。
+#
+# 目录模式：python process.py --input-dir pages --output faq_processed.jsonl
+# 批量抓取（collect.py --format files）得到的页面文件按批分给多个进程处理，
+# 每个任务写一个 JSONL 分片，全部完成后按顺序合并为一个输出文件。
+# 页面文件旁的同名 .url 文件（collect.py --format files 写入）记录页面 URL，作为问答的 source，
+# 与变更集同步、按页面的清单索引及 source 过滤使用的 URL 一致；没有 .url 文件时以相对路径作为 source。
+# 已删除页面的文件已由 collect.py 删除（墓碑记录在 removed.jsonl 中，不匹配 *.txt），输出即全部现存页面的 FAQ。
+# 吞吐对比：python process.py --input-dir pages --bench
 
+import os
 import re
+import io
 import json
+import time
+import shutil
+import argparse
+import tempfile
 from pathlib import Path
+from contextlib import redirect_stdout
 from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+# ========== 配置 ==========
+# 目录模式的进程数
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", str(os.cpu_count() or 1)))
+# 每个任务处理的文件数，任务过小时进程间通信开销占比升高
+FILES_PER_TASK = 64
+# 保存页面 URL 的附属文件后缀，与 collect.py 一致
+PAGE_URL_SUFFIX = ".url"
+
+# 预编译的正则：HTML 标签与 Q/A 分隔符
+TAG_PATTERN = re.compile(r"<.*?>")
+QA_SPLIT_PATTERN = re.compile(r"(?:^|\n)Q[:：]")
 
 def clean_text(text: str) -> str:
     """
@@ -20,7 +48,7 @@ def clean_text(text: str) -> str:
         str: 清洗后的文本内容。
     """
     # 去掉 HTML 标签（如果有残留）
-    text = re.sub(r"<.*?>", "", text)
+    text = TAG_PATTERN.sub("", text)
     # 去掉多余空格并过滤空行
     lines = [line.strip() for line in text.splitlines() if line.strip()]
     return "\n".join(lines)
@@ -36,7 +64,7 @@ def split_faq(text: str):
         list[dict]: 每个元素是一个包含"question"和"answer"键的字典。
     """
     # 按 Q： 或 Q: 分割文本
-    parts = re.split(r"(?:^|\n)Q[:：]", text)
+    parts = QA_SPLIT_PATTERN.split(text)
     qa_pairs = []
     for part in parts:
         part = part.strip()
@@ -52,47 +80,233 @@ def split_faq(text: str):
         })
     return qa_pairs
 
-def process_faq(input_file: str, output_file: str, source_url: str, category="FAQ"):
+def build_docs(raw_text: str, source_url: str, category: str, crawl_time: str) -> list:
     """
-    处理FAQ文本文件，清洗、分割并添加元数据后保存为JSON格式。
+    清洗并切分一个页面的 FAQ 文本，为每个问答对添加元数据。
 
     参数:
-        input_file (str): 输入的原始FAQ文本文件路径。
-        output_file (str): 输出处理后的JSON文件路径。
+        raw_text (str): 页面中 FAQ 区域的原始文本。
         source_url (str): 数据来源URL。
-        category (str): FAQ分类，默认为"FAQ"。
+        category (str): FAQ分类。
+        crawl_time (str): 抓取时间（ISO 8601）。
 
     返回:
-        None
+        list[dict]: 带 metadata 的问答对。
     """
-    raw_text = Path(input_file).read_text(encoding="utf-8")
-    cleaned_text = clean_text(raw_text)
-    qa_pairs = split_faq(cleaned_text)
-
-    # 添加元数据信息
-    now = datetime.now(timezone.utc).isoformat()
-    processed = []
-    for qa in qa_pairs:
-        processed.append({
+    qa_pairs = split_faq(clean_text(raw_text))
+    return [
+        {
             "question": qa["question"],
             "answer": qa["answer"],
             "metadata": {
                 "source": source_url,
                 "category": category,
-                "crawl_time": now
+                "crawl_time": crawl_time
             }
-        })
+        }
+        for qa in qa_pairs
+    ]
+
+def save_docs(processed: list, output_file: str):
+    """
+    保存处理结果：.jsonl 按行写入，其余写为 JSON 数组。
+    """
+    if output_file.endswith(".jsonl"):
+        # 每行一条 FAQ
+        with open(output_file, "w", encoding="utf-8") as f:
+            for doc in processed:
+                f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+    else:
+        Path(output_file).write_text(
+            json.dumps(processed, ensure_ascii=False, indent=2),
+            encoding="utf-8"
+        )
+
+def process_faq(input_file: str, output_file: str, source_url: str, category="FAQ"):
+    """
+    处理FAQ文本文件，清洗、分割并添加元数据后保存为JSON格式。
 
-    Path(output_file).write_text(
-        json.dumps(processed, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
+    输出文件以 .jsonl 结尾时按行写入 JSON Lines，供 embedding.py 流式读取。
+
+    参数:
+        input_file (str): 输入的原始FAQ文本文件路径。
+        output_file (str): 输出处理后的JSON / JSONL文件路径。
+        source_url (str): 数据来源URL。
+        category (str): FAQ分类，默认为"FAQ"。
+
+    返回:
+        None
+    """
+    raw_text = Path(input_file).read_text(encoding="utf-8")
+    processed = build_docs(raw_text, source_url, category, datetime.now(timezone.utc).isoformat())
+    save_docs(processed, output_file)
     print(f"✅ 已处理 {len(processed)} 条 FAQ，结果保存到 {output_file}")
 
+def process_changes(change_file: str, output_file: str, category="FAQ") -> int:
+    """
+    处理 collect.py --state 输出的变更集：只清洗、切分新增和变化的页面，未变化的页面不会出现在变更集中。
+
+    已删除的页面不产生问答，由 embedding.py --sync --changes 按变更集删除其 FAQ。
+
+    参数:
+        change_file (str): 变更集 JSONL 文件，每行一个页面。
+        output_file (str): 输出处理后的JSON / JSONL文件路径。
+        category (str): FAQ分类，默认为"FAQ"。
+
+    返回:
+        int: 处理的页面数。
+    """
+    processed, pages = [], 0
+    with open(change_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("change") == "removed":
+                continue
+            crawl_time = datetime.fromtimestamp(record["fetched_at"], timezone.utc).isoformat()
+            processed.extend(build_docs(record["content"], record["url"], category, crawl_time))
+            pages += 1
+    save_docs(processed, output_file)
+    if pages == 0:
+        print("✅ 没有变化的页面，无需处理")
+    else:
+        print(f"✅ 已处理 {pages} 个变化页面、{len(processed)} 条 FAQ，结果保存到 {output_file}")
+    return pages
+
+# ========== 目录模式 ==========
+def page_source(path: str, fallback: str) -> str:
+    """
+    读取页面文件旁 .url 附属文件中的页面 URL，不存在时返回 fallback（文件相对输入目录的路径）。
+    """
+    url_path = Path(path).with_suffix(PAGE_URL_SUFFIX)
+    if url_path.exists():
+        return url_path.read_text(encoding="utf-8").strip() or fallback
+    return fallback
+
+def _process_task(files: list, shard_path: str, category: str, crawl_time: str) -> tuple:
+    """
+    在子进程中处理一批页面文件，结果逐条写入该任务的 JSONL 分片。
+
+    source 取自 .url 附属文件中的页面 URL，没有附属文件时以文件相对输入目录的路径代替（见 page_source）。
+
+    返回:
+        tuple: (文件数, 问答数)
+    """
+    count = 0
+    with open(shard_path, "w", encoding="utf-8") as out:
+        for path, relative in files:
+            raw_text = Path(path).read_text(encoding="utf-8")
+            for doc in build_docs(raw_text, page_source(path, relative), category, crawl_time):
+                out.write(json.dumps(doc, ensure_ascii=False) + "\n")
+                count += 1
+    return len(files), count
+
+def merge_shards(shards: list, output_file: str):
+    """
+    按顺序合并 JSONL 分片：.jsonl 输出直接拼接，其余输出逐行写为 JSON 数组，不在内存中汇总。
+    """
+    with open(output_file, "w", encoding="utf-8") as out:
+        if output_file.endswith(".jsonl"):
+            for shard in shards:
+                with open(shard, "r", encoding="utf-8") as f:
+                    shutil.copyfileobj(f, out)
+            return
+        out.write("[")
+        first = True
+        for shard in shards:
+            with open(shard, "r", encoding="utf-8") as f:
+                for line in f:
+                    out.write(("\n" if first else ",\n") + line.rstrip("\n"))
+                    first = False
+        out.write("\n]\n")
+
+def process_directory(input_dir: str, output_file: str, category="FAQ", pattern="*.txt",
+                      workers: int = PROCESS_WORKERS, files_per_task: int = FILES_PER_TASK) -> dict:
+    """
+    用进程池并行处理目录下的全部页面文件，合并为一个 JSON / JSONL 文件。
+
+    参数:
+        input_dir (str): 页面文件目录（递归查找）。
+        output_file (str): 输出处理后的JSON / JSONL文件路径。
+        category (str): FAQ分类，默认为"FAQ"。
+        pattern (str): 页面文件名的匹配模式。
+        workers (int): 进程数。
+        files_per_task (int): 每个任务处理的文件数。
+
+    返回:
+        dict: files（文件数）、docs（问答数）、elapsed（总耗时）。
+    """
+    start = time.perf_counter()
+    root = Path(input_dir)
+    files = [(str(path), str(path.relative_to(root))) for path in sorted(root.rglob(pattern))]
+    tasks = [files[i:i + files_per_task] for i in range(0, len(files), files_per_task)]
+    crawl_time = datetime.now(timezone.utc).isoformat()
+    stats = {"files": 0, "docs": 0, "elapsed": 0.0}
+
+    with tempfile.TemporaryDirectory(prefix="faq_shards_", dir=Path(output_file).resolve().parent) as shard_dir:
+        shards = [os.path.join(shard_dir, f"shard-{i:05d}.jsonl") for i in range(len(tasks))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_process_task, task, shard, category, crawl_time)
+                for task, shard in zip(tasks, shards)
+            ]
+            for future in futures:
+                n_files, n_docs = future.result()
+                stats["files"] += n_files
+                stats["docs"] += n_docs
+        merge_shards(shards, output_file)
+
+    stats["elapsed"] = time.perf_counter() - start
+    elapsed = stats["elapsed"] or 1e-9
+    print(f"✅ 已处理 {stats['files']} 个文件、{stats['docs']} 条 FAQ（{workers} 个进程），"
+          f"耗时 {stats['elapsed']:.2f}s，{stats['files'] / elapsed:.1f} 文件/s，结果保存到 {output_file}")
+    return stats
+
+def benchmark(input_dir: str, pattern="*.txt", workers: int = PROCESS_WORKERS):
+    """
+    对比逐个文件调用 process_faq 与目录模式的吞吐。
+
+    参数:
+        input_dir (str): 页面文件目录。
+        pattern (str): 页面文件名的匹配模式。
+        workers (int): 目录模式的进程数。
+    """
+    files = sorted(Path(input_dir).rglob(pattern))
+    with tempfile.TemporaryDirectory(prefix="faq_bench_") as tmp:
+        start = time.perf_counter()
+        # 逐文件的保存提示不计入对比
+        with redirect_stdout(io.StringIO()):
+            for i, path in enumerate(files):
+                process_faq(str(path), os.path.join(tmp, f"{i}.json"), source_url=page_source(str(path), str(path)))
+        baseline = time.perf_counter() - start
+        parallel = process_directory(input_dir, os.path.join(tmp, "merged.jsonl"), pattern=pattern,
+                                     workers=workers)["elapsed"]
+    print(f"📊 {len(files)} 个文件：逐个 process_faq {baseline:.2f}s（{len(files) / (baseline or 1e-9):.1f} 文件/s），"
+          f"目录模式 {parallel:.2f}s（{len(files) / (parallel or 1e-9):.1f} 文件/s），加速 {baseline / (parallel or 1e-9):.1f} 倍")
+
 if __name__ == "__main__":
-    process_faq(
-        input_file="faq.txt",
-        output_file="faq_processed.json",
-        source_url="https://waimai.meituan.com/help/faq",
-        category="支付问题"
-    )
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="清洗、切分 FAQ 文档并添加元数据")
+    parser.add_argument("--changes", help="collect.py --state 输出的变更集（JSONL），只处理变化的页面")
+    parser.add_argument("--input-dir", help="目录模式：并行处理目录下的全部页面文件")
+    parser.add_argument("--pattern", default="*.txt", help="目录模式下页面文件名的匹配模式")
+    parser.add_argument("--workers", type=int, default=PROCESS_WORKERS, help="目录模式的进程数")
+    parser.add_argument("--bench", action="store_true", help="对比逐个 process_faq 与目录模式的吞吐")
+    parser.add_argument("--output", help="输出文件（.json 或 .jsonl）")
+    parser.add_argument("--category", default="支付问题", help="FAQ 分类")
+    args = parser.parse_args()
+
+    if args.input_dir and args.bench:
+        benchmark(args.input_dir, pattern=args.pattern, workers=args.workers)
+    elif args.input_dir:
+        process_directory(args.input_dir, args.output or "faq_processed.jsonl", category=args.category,
+                          pattern=args.pattern, workers=args.workers)
+    elif args.changes:
+        process_changes(args.changes, args.output or "faq_changes.jsonl", category=args.category)
+    else:
+        process_faq(
+            input_file="faq.txt",
+            output_file=args.output or "faq_processed.json",
+            source_url="https://waimai.meituan.com/help/faq",
+            category=args.category
+        )
@@ -1,103 +1,28 @@
 # 把 用户问题 + 检索召回的上下文 拼接成一个高质量的 Prompt 送给大模型。
 
-import os
-import dotenv
-import dashscope
-import redis
-import numpy as np
-from http import HTTPStatus
-from redis.commands.search.query import Query
-
-# ========== 配置 ==========
-# 加载环境变量
-dotenv.load_dotenv()
-# 设置 DashScope API Key
-dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
-
-# Redis 向量索引名称
-INDEX_NAME = "faq_index"
-# 向量维度
-VECTOR_DIM = 1024
-# 相似度搜索返回的最相似结果数量
-TOP_K = 3
-
-# 初始化 Redis 客户端连接
-redis_client = redis.Redis(
-    host="localhost",
-    port=6379,
-    password=None,
-    decode_responses=False
-)
-
-# ========== 将问题转为向量 ==========
-def embed_question(question: str):
-    """
-    使用 DashScope 的多模态嵌入模型将文本问题转换为向量表示。
-
-    参数:
-        question (str): 用户输入的问题文本。
-
-    返回:
-        bytes: 问题对应的向量表示（以字节形式存储）。
-
-    异常:
-        RuntimeError: 当调用嵌入服务失败时抛出异常。
-    """
-    resp = dashscope.MultiModalEmbedding.call(
-        model="multimodal-embedding-v1",
-        input=[{"text": question}]
-    )
-    if resp.status_code == HTTPStatus.OK:
-        embedding = resp.output["embeddings"][0]["embedding"]
-        return np.array(embedding, dtype=np.float32).tobytes()
-    else:
-        raise RuntimeError(f"❌ Embedding 调用失败: {resp.code}, {resp.message}")
-
-# ========== 相似度搜索 ==========
-def search_faq(question: str, top_k=TOP_K):
-    """
-    在 Redis 中基于向量相似度搜索与用户问题最相关的 FAQ 文档。
-
-    参数:
-        question (str): 用户提出的问题。
-        top_k (int): 返回最相似的前 K 个文档，默认使用 TOP_K 常量。
-
-    返回:
-        list: 包含匹配文档对象的列表，每个对象包含字段如 question、answer、source 等。
-    """
-    q_vector = embed_question(question)
-
-    # 构造 Redis 向量搜索查询语句
-    query = (
-        Query(f"*=>[KNN {top_k} @embedding $vec AS score]")
-        .sort_by("score")
-        .return_fields("question", "answer", "source", "category", "crawl_time", "score")
-        .dialect(2)
-    )
-
-    # 执行搜索并返回结果
-    results = redis_client.ft(INDEX_NAME).search(query, query_params={"vec": q_vector})
-    return results.docs
+# 问题向量化与相似度搜索由常驻检索服务完成（retrieval_daemon.py），未启动时回退为进程内检索
+from retrieval_client import search_faq, print_stats, TOP_K
+from context_pack import pack_context, print_pack_stats, CONTEXT_TOKEN_BUDGET
 
 # ========== 构建 Prompt ==========
-def build_prompt(user_question: str, retrieved_docs, top_k=TOP_K) -> str:
+def build_prompt(user_question: str, retrieved_docs, top_k=TOP_K, budget=CONTEXT_TOKEN_BUDGET) -> str:
     """
     根据用户问题和检索到的相关文档构建用于大模型推理的 Prompt。
 
+    文档片段按 token 预算打包：去除重复片段，超长答案在句子边界截断，按相关度贪心装填。
+
     参数:
         user_question (str): 用户提出的问题。
         retrieved_docs (list): 检索到的相关文档列表。
         top_k (int): 使用的文档数量上限，默认为 TOP_K。
+        budget (int): 文档片段的 token 预算，默认为 CONTEXT_TOKEN_BUDGET。
 
     返回:
         str: 构建完成的 Prompt 字符串。
     """
-    context_parts = []
-    for i, doc in enumerate(retrieved_docs[:top_k], start=1):
-        context_parts.append(
-            f"【文档片段{i}】\nQ: {doc.question}\nA: {doc.answer}"
-        )
-    context_text = "\n\n".join(context_parts)
+    packed = pack_context(retrieved_docs[:top_k], budget)
+    print_pack_stats(packed)
+    context_text = packed["text"]
 
     prompt = f"""
 你是一个智能问答助手，请仅根据提供的文档片段回答用户问题。
@@ -119,6 +44,7 @@ if __name__ == "__main__":
     while True:
         user_question = input("\n请输入问题（输入 exit 退出）：")
         if user_question.lower() in ["exit", "quit"]:
+            print_stats()
             break
 
         docs = search_faq(user_question, top_k=TOP_K)
@@ -0,0 +1,255 @@
+# 向量精度：FLOAT32 之外支持 FLOAT16 存储，以及可选的 INT8 标量量化副本。
+#
+# - VECTOR_TYPE=FLOAT16：向量以半精度写入 embedding_f16 字段并建立索引，每条文档的向量内存减半；
+# - VECTOR_INT8=1：额外写入 INT8 量化副本 embedding_i8，KNN 在 INT8 字段上召回
+#   top_k * RESCORE_FACTOR 条候选，再用浮点向量精确重排（INT8 向量类型需要 Redis 8 / RediSearch 8）。
+#   重排所需的 VECTOR_TYPE 向量仍保存在每条 Hash 中，INT8 只缩小向量索引（HNSW）的内存，
+#   Hash 本身反而多存一份 INT8 副本（每条多 维度 × 1 字节）；混合检索的向量一路同样先重排再融合。
+#
+# 对比报告：python quantize.py --sample 5000 --queries 200
+# 从现有索引中抽样向量，分别建立 FLOAT32 / FLOAT16 / INT8+重排 的临时索引，
+# 以 FLOAT32 暴力检索结果为基准统计 recall@k、查询延迟和索引内存。
+
+import os
+import time
+import argparse
+import numpy as np
+import redis
+from redis.commands.search.field import VectorField
+from redis.commands.search.index_definition import IndexDefinition
+from redis.commands.search.query import Query
+
+# ========== 配置 ==========
+# 向量存储精度：FLOAT32 或 FLOAT16
+VECTOR_TYPE = os.getenv("VECTOR_TYPE", "FLOAT32")
+# 是否额外存储 INT8 量化副本，并在其上做 KNN 召回
+VECTOR_INT8 = os.getenv("VECTOR_INT8", "0") == "1"
+# INT8 召回的候选倍数，候选经浮点向量重排后取前 top_k
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+
+# 各精度对应的 Hash 字段名与 NumPy 类型
+VECTOR_FIELDS = {"FLOAT32": "embedding", "FLOAT16": "embedding_f16", "INT8": "embedding_i8"}
+NUMPY_DTYPES = {"FLOAT32": np.float32, "FLOAT16": np.float16, "INT8": np.int8}
+
+
+# ========== 精度转换 ==========
+def quantize_int8(vector: np.ndarray) -> np.ndarray:
+    """
+    按向量自身的最大绝对值做对称标量量化。余弦距离与向量长度无关，逐向量缩放不影响排序。
+
+    参数:
+        vector (np.ndarray): FLOAT32 向量（一维或按行的二维矩阵）。
+
+    返回:
+        np.ndarray: INT8 向量，取值范围 [-127, 127]。
+    """
+    scale = np.abs(vector).max(axis=-1, keepdims=True)
+    scale[scale == 0] = 1.0
+    return np.clip(np.round(vector / scale * 127), -127, 127).astype(np.int8)
+
+
+def encode_vector(vector: bytes, vector_type: str) -> bytes:
+    """
+    将 FLOAT32 向量字节转换为指定精度的字节表示。
+
+    参数:
+        vector (bytes): FLOAT32 向量字节。
+        vector_type (str): 目标精度，FLOAT32 / FLOAT16 / INT8。
+
+    返回:
+        bytes: 目标精度的向量字节。
+    """
+    if vector_type == "FLOAT32":
+        return vector
+    array = np.frombuffer(vector, dtype=np.float32)
+    if vector_type == "INT8":
+        return quantize_int8(array).tobytes()
+    return array.astype(NUMPY_DTYPES[vector_type]).tobytes()
+
+
+def decode_vector(data: bytes, vector_type: str) -> np.ndarray:
+    """
+    将指定精度的向量字节还原为 FLOAT32 数组（INT8 仅还原方向，不还原长度）。
+
+    参数:
+        data (bytes): 向量字节。
+        vector_type (str): 字节对应的精度。
+
+    返回:
+        np.ndarray: FLOAT32 向量。
+    """
+    return np.frombuffer(data, dtype=NUMPY_DTYPES[vector_type]).astype(np.float32)
+
+
+def index_vector_type() -> str:
+    """
+    返回建立 KNN 索引的向量精度：启用 INT8 副本时为 INT8，否则为 VECTOR_TYPE。
+    """
+    return "INT8" if VECTOR_INT8 else VECTOR_TYPE
+
+
+def index_vector_field() -> str:
+    """
+    返回建立 KNN 索引的向量字段名。
+    """
+    return VECTOR_FIELDS[index_vector_type()]
+
+
+def storage_fields(vector: bytes) -> dict:
+    """
+    按当前精度配置生成需要写入 Hash 的向量字段。
+
+    参数:
+        vector (bytes): FLOAT32 向量字节。
+
+    返回:
+        dict: 字段名 -> 向量字节。
+    """
+    fields = {VECTOR_FIELDS[VECTOR_TYPE]: encode_vector(vector, VECTOR_TYPE)}
+    if VECTOR_INT8:
+        fields[VECTOR_FIELDS["INT8"]] = encode_vector(vector, "INT8")
+    return fields
+
+
+def storage_bytes(dim: int, vector_type: str) -> int:
+    """
+    返回一条指定精度、指定维度的向量占用的字节数。
+    """
+    return dim * np.dtype(NUMPY_DTYPES[vector_type]).itemsize
+
+
+# ========== 重排 ==========
+def rescore(docs: list, q_vector: bytes, vectors: list, top_k: int) -> list:
+    """
+    用浮点向量对 INT8 召回的候选做精确余弦重排。
+
+    参数:
+        docs (list): 候选文档对象。
+        q_vector (bytes): 问题的 FLOAT32 向量字节。
+        vectors (list[bytes | None]): 与 docs 对应的 VECTOR_TYPE 精度向量字节。
+        top_k (int): 返回的结果数量。
+
+    返回:
+        list: 重排后的前 top_k 个文档，score 为浮点余弦距离。
+    """
+    q = np.frombuffer(q_vector, dtype=np.float32)
+    q = q / (np.linalg.norm(q) or 1.0)
+    scored = []
+    for doc, data in zip(docs, vectors):
+        if data is None:
+            continue
+        v = decode_vector(data, VECTOR_TYPE)
+        doc.score = str(1 - float(v @ q) / (float(np.linalg.norm(v)) or 1.0))
+        scored.append(doc)
+    scored.sort(key=lambda doc: float(doc.score))
+    return scored[:top_k]
+
+
+# ========== 对比报告 ==========
+def load_sample(redis_client, sample: int) -> np.ndarray:
+    """
+    从 faq: 前缀下抽取向量，还原为 FLOAT32 矩阵。
+    """
+    rows = []
+    field = VECTOR_FIELDS[VECTOR_TYPE]
+    for key in redis_client.scan_iter(match="faq:*", count=1000):
+        data = redis_client.hget(key, field)
+        if data:
+            rows.append(decode_vector(data, VECTOR_TYPE))
+        if len(rows) >= sample:
+            break
+    return np.vstack(rows)
+
+
+def build_bench_index(redis_client, name: str, vectors: np.ndarray, vector_type: str):
+    """
+    以指定精度建立临时索引并写入向量，等待后台索引完成。
+    """
+    prefix = f"{name}:"
+    redis_client.ft(name).create_index(
+        [VectorField("v", "HNSW", {"TYPE": vector_type, "DIM": vectors.shape[1], "DISTANCE_METRIC": "COSINE"})],
+        definition=IndexDefinition(prefix=[prefix])
+    )
+    pipe = redis_client.pipeline(transaction=False)
+    for i, vector in enumerate(vectors):
+        pipe.hset(f"{prefix}{i}", "v", encode_vector(vector.astype(np.float32).tobytes(), vector_type))
+        if len(pipe) >= 500:
+            pipe.execute()
+    pipe.execute()
+    while int(redis_client.ft(name).info().get("indexing", 0)):
+        time.sleep(0.5)
+
+
+def report(redis_client, sample: int = 5000, queries: int = 200, top_k: int = 10):
+    """
+    对比 FLOAT32 / FLOAT16 / INT8+重排 三种精度的召回率、延迟与索引内存。
+
+    从现有数据中抽样向量，留出 queries 条作为查询，其余建立临时索引；
+    以 FLOAT32 暴力检索的前 top_k 为基准计算 recall@k。
+
+    参数:
+        redis_client (redis.Redis): Redis 客户端。
+        sample (int): 抽样向量条数。
+        queries (int): 作为查询的向量条数。
+        top_k (int): 统计 recall@k 的 k。
+    """
+    data = load_sample(redis_client, sample + queries)
+    rng = np.random.default_rng(0)
+    rng.shuffle(data)
+    query_vectors, corpus = data[:queries], data[queries:]
+
+    # FLOAT32 暴力检索作为基准
+    normed = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    q_normed = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    truth = np.argsort(-(q_normed @ normed.T), axis=1)[:, :top_k]
+
+    print(f"📊 {len(corpus)} 条向量，{len(query_vectors)} 条查询，维度 {corpus.shape[1]}，recall@{top_k}")
+    for vector_type in ("FLOAT32", "FLOAT16", "INT8"):
+        name = f"qbench_{vector_type.lower()}"
+        try:
+            build_bench_index(redis_client, name, corpus, vector_type)
+        except redis.ResponseError as e:
+            print(f"⚠️ {vector_type}: 当前 Redis 不支持该向量类型（{e}）")
+            continue
+        # INT8 召回更多候选后用 FLOAT32 向量重排
+        fetch = top_k * RESCORE_FACTOR if vector_type == "INT8" else top_k
+        query = Query(f"*=>[KNN {fetch} @v $vec AS score]").sort_by("score").paging(0, fetch).dialect(2)
+
+        recalls, latencies = [], []
+        for q, expected in zip(query_vectors, truth):
+            start = time.perf_counter()
+            result = redis_client.ft(name).search(
+                query, query_params={"vec": encode_vector(q.astype(np.float32).tobytes(), vector_type)}
+            )
+            ids = [int(doc.id.split(":")[1]) for doc in result.docs]
+            if vector_type == "INT8":
+                ids = sorted(ids, key=lambda i: -float(normed[i] @ (q / np.linalg.norm(q))))[:top_k]
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(set(ids) & set(expected)) / top_k)
+
+        info = redis_client.ft(name).info()
+        memory = float(info.get("vector_index_sz_mb", 0))
+        index_bytes = corpus.shape[1] * np.dtype(NUMPY_DTYPES[vector_type]).itemsize
+        # 线上 INT8 模式的 Hash 同时保存重排用的 VECTOR_TYPE 向量与 INT8 副本
+        hash_bytes = index_bytes + (storage_bytes(corpus.shape[1], VECTOR_TYPE) if vector_type == "INT8" else 0)
+        print(f"   {vector_type:<8} recall={np.mean(recalls):.4f}  "
+              f"p50={np.percentile(latencies, 50) * 1000:.2f}ms  p95={np.percentile(latencies, 95) * 1000:.2f}ms  "
+              f"索引内存={memory:.1f}MB  每条索引向量 {index_bytes} 字节  每条 Hash 向量 {hash_bytes} 字节")
+        redis_client.ft(name).dropindex(delete_documents=True)
+    print(f"ℹ️ INT8 只减少索引内存：Hash 中仍保存 {VECTOR_TYPE} 向量用于重排，每条文档的 Hash 内存比不启用 INT8 时多 "
+          f"{storage_bytes(corpus.shape[1], 'INT8')} 字节")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="向量精度对比报告")
+    parser.add_argument("--sample", type=int, default=5000, help="建立临时索引的向量条数")
+    parser.add_argument("--queries", type=int, default=200, help="留出作为查询的向量条数")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    report(
+        redis.Redis(host="localhost", port=6379, password=None, decode_responses=False),
+        sample=args.sample,
+        queries=args.queries,
+        top_k=args.top_k
+    )
@@ -0,0 +1,187 @@
+# 问题向量缓存：在 embed_question 前增加一层进程内 LRU + TTL 缓存。
+#
+# 客服流量集中在少量高频问题上，归一化后的问题文本直接映射到 FLOAT32 向量字节，
+# 命中时无需任何网络调用。可选开启 Redis 共享层，多个 worker 之间共享已计算的向量。
+
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# ========== 配置 ==========
+# 进程内缓存的最大条目数
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+# 缓存有效期（秒），进程内与 Redis 共享层一致
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "3600"))
+# 是否启用 Redis 共享层
+QUERY_CACHE_SHARED = os.getenv("QUERY_CACHE_SHARED", "0") == "1"
+# Redis 共享层的键前缀
+SHARED_PREFIX = "qemb:"
+
+# 问题末尾可忽略的标点
+TRAILING_PUNCT = re.compile(r"[?？!！。.~～\s]+$")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    归一化问题文本，使仅有全半角、大小写、空白或句末标点差异的问题命中同一缓存。
+
+    参数:
+        question (str): 用户输入的问题。
+
+    返回:
+        str: 归一化后的问题文本。
+    """
+    text = unicodedata.normalize("NFKC", question).strip().lower()
+    text = WHITESPACE.sub(" ", text)
+    return TRAILING_PUNCT.sub("", text)
+
+
+class QueryEmbeddingCache:
+    """
+    问题向量的两级缓存：进程内 LRU + TTL，以及可选的 Redis 共享层。
+
+    属性:
+        hits (int): 进程内缓存命中次数。
+        shared_hits (int): Redis 共享层命中次数。
+        misses (int): 两级均未命中、需要重新向量化的次数。
+    """
+
+    def __init__(self, embed_fn, model: str, maxsize: int = QUERY_CACHE_SIZE,
+                 ttl: int = QUERY_CACHE_TTL, redis_client=None):
+        """
+        初始化缓存。
+
+        参数:
+            embed_fn (callable): 未命中时调用的向量化函数，签名为 embed_fn(text) -> bytes。
+            model (str): Embedding 模型名称，作为共享层键的一部分。
+            maxsize (int): 进程内缓存的最大条目数。
+            ttl (int): 缓存有效期（秒）。
+            redis_client (redis.Redis): Redis 客户端，为空时不启用共享层。
+        """
+        self.embed_fn = embed_fn
+        self.model = model
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shared_key(self, text: str) -> str:
+        return SHARED_PREFIX + hashlib.sha1(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_local(self, text: str):
+        with self._lock:
+            entry = self._entries.get(text)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at < time.monotonic():
+                del self._entries[text]
+                return None
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return vector
+
+    def _put_local(self, text: str, vector: bytes):
+        with self._lock:
+            self._entries[text] = (time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, question: str) -> bytes:
+        """
+        获取问题的向量表示，依次查询进程内缓存、Redis 共享层和 embed_fn。
+
+        参数:
+            question (str): 用户输入的问题。
+
+        返回:
+            bytes: 问题对应的 FLOAT32 向量字节。
+        """
+        text = normalize_question(question)
+        vector = self._get_local(text)
+        if vector is not None:
+            return vector
+
+        if self.redis_client is not None:
+            vector = self.redis_client.get(self._shared_key(text))
+            if vector is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                self._put_local(text, vector)
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        vector = self.embed_fn(text)
+        self._put_local(text, vector)
+        if self.redis_client is not None:
+            self.redis_client.set(self._shared_key(text), vector, ex=self.ttl)
+        return vector
+
+    async def aget(self, question: str, aembed_fn, aredis=None) -> bytes:
+        """
+        get 的异步版本，供 asyncio 服务使用。
+
+        参数:
+            question (str): 用户输入的问题。
+            aembed_fn (callable): 异步向量化函数，签名为 await aembed_fn(text) -> bytes。
+            aredis (redis.asyncio.Redis): 异步 Redis 客户端，为空时不访问共享层。
+
+        返回:
+            bytes: 问题对应的 FLOAT32 向量字节。
+        """
+        text = normalize_question(question)
+        vector = self._get_local(text)
+        if vector is not None:
+            return vector
+
+        if aredis is not None:
+            vector = await aredis.get(self._shared_key(text))
+            if vector is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                self._put_local(text, vector)
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        vector = await aembed_fn(text)
+        self._put_local(text, vector)
+        if aredis is not None:
+            await aredis.set(self._shared_key(text), vector, ex=self.ttl)
+        return vector
+
+    def stats(self) -> dict:
+        """
+        返回缓存命中统计。
+
+        返回:
+            dict: hits、shared_hits、misses、hit_rate 与当前条目数 size。
+        """
+        with self._lock:
+            total = self.hits + self.shared_hits + self.misses
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / total if total else 0.0,
+                "size": len(self._entries),
+            }
+
+    def print_stats(self):
+        """
+        打印缓存命中统计。
+        """
+        s = self.stats()
+        print(f"📦 问题向量缓存: 命中率 {s['hit_rate']:.1%}（进程内 {s['hits']}，"
+              f"共享层 {s['shared_hits']}，未命中 {s['misses']}），当前 {s['size']} 条")
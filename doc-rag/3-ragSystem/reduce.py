@@ -0,0 +1,287 @@
+# 向量降维：1024 维向量对 FAQ 领域而言偏大，入库与检索前统一投影到 REDUCED_DIM 维，
+# 索引内存与 KNN 计算量随维度线性下降。
+#
+# - VECTOR_REDUCE=pca：在语料向量上拟合 PCA 投影（python reduce.py --fit），投影保存在 PROJECTION_PATH，
+#   embedding.py 入库与 retrieve.embed_question 检索共用同一份投影；
+# - VECTOR_REDUCE=truncate：直接截取前 REDUCED_DIM 维，仅适用于前缀维度可单独使用的模型（Matryoshka 训练）；
+# - 本地 Embedding 缓存中始终保存完整维度的向量，更换降维配置后无需重新调用 DashScope，
+#   但索引维度随之变化，需要删除旧索引后重新入库。
+#
+# 对比报告：python reduce.py --report --sample 5000 --queries 200
+# 从本地 Embedding 缓存中抽样向量，按 1024/512/256/128 维分别建立临时索引，
+# 以完整维度暴力检索结果为基准统计 recall@k、查询延迟和索引内存。
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import redis
+from pathlib import Path
+from redis.commands.search.query import Query
+
+# 共享的本地 Embedding 缓存位于 doc-rag 根目录
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from embed_cache import get_cache
+from quantize import build_bench_index
+
+# ========== 配置 ==========
+# 降维方式：none、pca 或 truncate
+VECTOR_REDUCE = os.getenv("VECTOR_REDUCE", "none")
+# 降维后的维度
+REDUCED_DIM = int(os.getenv("REDUCED_DIM", "256"))
+# PCA 投影文件路径
+PROJECTION_PATH = os.getenv("PROJECTION_PATH", str(Path(__file__).resolve().parent / "faq_projection.npz"))
+# 抽样向量所属的 Embedding 模型，需与 embedding.py 一致
+EMBEDDING_MODEL = "multimodal-embedding-v1"
+# 对比报告中的维度
+REPORT_DIMS = (1024, 512, 256, 128)
+
+
+class Projection:
+    """
+    从完整维度到 dim 维的线性投影。
+
+    属性:
+        method (str): "pca" 或 "truncate"。
+        dim (int): 投影后的维度。
+        mean (np.ndarray | None): PCA 的语料均值。
+        components (np.ndarray | None): PCA 主成分，形状为 (dim, 完整维度)。
+    """
+
+    def __init__(self, method: str, dim: int, mean: np.ndarray = None, components: np.ndarray = None):
+        self.method = method
+        self.dim = dim
+        self.mean = mean
+        self.components = components
+        # PCA 保留的方差比例，仅拟合得到的投影有值
+        self.explained = None
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dim: int) -> "Projection":
+        """
+        在语料向量上拟合 PCA 投影。
+
+        参数:
+            vectors (np.ndarray): 语料向量矩阵，按行排列，行数不少于 dim。
+            dim (int): 保留的主成分个数。
+
+        返回:
+            Projection: PCA 投影。
+
+        异常:
+            ValueError: 样本数少于 dim 时抛出。
+        """
+        if len(vectors) < dim:
+            raise ValueError(f"❌ 拟合 {dim} 维 PCA 至少需要 {dim} 条向量，当前只有 {len(vectors)} 条")
+        # 先归一化，使主成分反映方向（余弦距离）而不是向量长度
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        mean = vectors.mean(axis=0)
+        _, singular, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        projection = cls("pca", dim, mean.astype(np.float32), vt[:dim].astype(np.float32))
+        projection.explained = float((singular[:dim] ** 2).sum() / (singular ** 2).sum())
+        return projection
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        投影一个向量或按行排列的向量矩阵。
+        """
+        if self.method == "truncate":
+            return np.ascontiguousarray(vectors[..., :self.dim], dtype=np.float32)
+        vectors = vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return ((vectors - self.mean) @ self.components.T).astype(np.float32)
+
+    def apply(self, vector: bytes) -> bytes:
+        """
+        投影 FLOAT32 向量字节。
+        """
+        return self.transform(np.frombuffer(vector, dtype=np.float32)).tobytes()
+
+    def save(self, path: str = PROJECTION_PATH):
+        np.savez(path, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path: str = PROJECTION_PATH) -> "Projection":
+        with np.load(path) as data:
+            return cls("pca", len(data["components"]), data["mean"], data["components"])
+
+
+_projection = None
+
+
+def get_projection():
+    """
+    返回当前配置的投影（懒加载），VECTOR_REDUCE=none 时返回 None。
+
+    异常:
+        ValueError: 降维方式未知、PCA 投影文件缺失或维度与 REDUCED_DIM 不一致时抛出。
+    """
+    global _projection
+    if VECTOR_REDUCE == "none":
+        return None
+    if _projection is None:
+        if VECTOR_REDUCE == "truncate":
+            projection = Projection("truncate", REDUCED_DIM)
+        elif VECTOR_REDUCE == "pca":
+            if not os.path.exists(PROJECTION_PATH):
+                raise ValueError(f"❌ 未找到 PCA 投影 {PROJECTION_PATH}，请先执行 python reduce.py --fit")
+            projection = Projection.load(PROJECTION_PATH)
+        else:
+            raise ValueError(f"❌ 未知的降维方式: {VECTOR_REDUCE}")
+        if projection.dim != REDUCED_DIM:
+            raise ValueError(f"❌ PCA 投影为 {projection.dim} 维，与 REDUCED_DIM={REDUCED_DIM} 不一致")
+        _projection = projection
+    return _projection
+
+
+def reduced_dim(dim: int) -> int:
+    """
+    返回索引中的向量维度：启用降维时为 REDUCED_DIM，否则为原始维度 dim。
+    """
+    return dim if VECTOR_REDUCE == "none" else REDUCED_DIM
+
+
+def reduce_vector(vector: bytes) -> bytes:
+    """
+    按当前配置对 FLOAT32 向量字节降维，未启用降维时原样返回。
+    """
+    projection = get_projection()
+    return vector if projection is None else projection.apply(vector)
+
+
+# ========== 拟合 ==========
+def load_sample(sample: int) -> np.ndarray:
+    """
+    从本地 Embedding 缓存中随机抽取完整维度的向量。
+    """
+    vectors = get_cache().sample(EMBEDDING_MODEL, sample)
+    if not vectors:
+        raise ValueError("❌ 本地 Embedding 缓存为空，请先执行一次 python embedding.py")
+    return np.vstack([np.frombuffer(v, dtype=np.float32) for v in vectors])
+
+
+def fit(dim: int = REDUCED_DIM, sample: int = 20000, path: str = PROJECTION_PATH) -> Projection:
+    """
+    在缓存的语料向量上拟合 PCA 投影并保存。
+
+    参数:
+        dim (int): 降维后的维度。
+        sample (int): 参与拟合的向量条数上限。
+        path (str): 投影文件路径。
+
+    返回:
+        Projection: 拟合得到的投影。
+    """
+    vectors = load_sample(sample)
+    start = time.perf_counter()
+    projection = Projection.fit(vectors, dim)
+    projection.save(path)
+    print(f"✅ 已在 {len(vectors)} 条向量上拟合 {vectors.shape[1]} -> {dim} 维 PCA，"
+          f"保留方差 {projection.explained:.1%}，耗时 {time.perf_counter() - start:.2f}s，已保存到 {path}")
+    return projection
+
+
+# ========== 对比报告 ==========
+def search_numpy(corpus: np.ndarray, q: np.ndarray, top_k: int) -> list:
+    scores = corpus @ (q / (np.linalg.norm(q) or 1.0))
+    # 语料不足 top_k 条时全部返回，argpartition 要求 kth < len(scores)
+    top_k = min(top_k, len(scores))
+    top = np.argpartition(-scores, top_k - 1)[:top_k] if top_k else np.arange(0)
+    return top[np.argsort(-scores[top])].tolist()
+
+
+def report(redis_client=None, sample: int = 5000, queries: int = 200, top_k: int = 10, dims=REPORT_DIMS):
+    """
+    对比不同维度下 PCA 与前缀截断的召回率、延迟与索引内存。
+
+    从缓存向量中留出 queries 条作为查询，其余建立临时索引；以完整维度暴力检索的前 top_k 为基准计算 recall@k。
+    查询延迟包含问题向量的投影开销。
+
+    参数:
+        redis_client (redis.Redis): Redis 客户端；为空时使用进程内 NumPy 暴力检索，内存按矩阵大小计算。
+        sample (int): 建立临时索引的向量条数。
+        queries (int): 作为查询的向量条数。
+        top_k (int): 统计 recall@k 的 k。
+        dims (tuple[int]): 对比的维度。
+    """
+    data = load_sample(sample + queries)
+    if len(data) < 2:
+        raise ValueError("❌ 本地 Embedding 缓存中的向量不足 2 条，无法生成对比报告")
+    rng = np.random.default_rng(0)
+    rng.shuffle(data)
+    # 缓存较小时至少留一半向量建立索引
+    queries = min(queries, len(data) // 2)
+    query_vectors, corpus = data[:queries], data[queries:]
+    top_k = min(top_k, len(corpus))
+    full_dim = corpus.shape[1]
+
+    normed = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    q_normed = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    truth = np.argsort(-(q_normed @ normed.T), axis=1)[:, :top_k]
+
+    print(f"📊 {len(corpus)} 条向量，{len(query_vectors)} 条查询，原始维度 {full_dim}，recall@{top_k}，"
+          f"{'Redis HNSW' if redis_client is not None else 'NumPy 暴力检索'}")
+    for dim in dims:
+        if dim > full_dim:
+            continue
+        if dim == full_dim:
+            methods = ("truncate",)
+        else:
+            # 样本数少于目标维度时无法拟合 PCA，只对比前缀截断
+            methods = ("pca", "truncate") if len(corpus) >= dim else ("truncate",)
+        for method in methods:
+            projection = Projection.fit(corpus, dim) if method == "pca" else Projection("truncate", dim)
+            reduced = projection.transform(corpus)
+            name = f"rbench_{method}_{dim}"
+            if redis_client is not None:
+                build_bench_index(redis_client, name, reduced, "FLOAT32")
+                query = Query(f"*=>[KNN {top_k} @v $vec AS score]").sort_by("score").paging(0, top_k).dialect(2)
+            else:
+                reduced = reduced / np.linalg.norm(reduced, axis=1, keepdims=True)
+
+            recalls, latencies = [], []
+            for q, expected in zip(query_vectors, truth):
+                start = time.perf_counter()
+                q_reduced = projection.transform(q)
+                if redis_client is not None:
+                    result = redis_client.ft(name).search(query, query_params={"vec": q_reduced.tobytes()})
+                    ids = [int(doc.id.split(":")[1]) for doc in result.docs]
+                else:
+                    ids = search_numpy(reduced, q_reduced, top_k)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len(set(ids) & set(expected)) / top_k)
+
+            if redis_client is not None:
+                memory = float(redis_client.ft(name).info().get("vector_index_sz_mb", 0))
+                redis_client.ft(name).dropindex(delete_documents=True)
+            else:
+                memory = reduced.nbytes / 1024 / 1024
+            label = "原始" if dim == full_dim else method
+            print(f"   {dim:>5} 维 {label:<8} recall={np.mean(recalls):.4f}  "
+                  f"p50={np.percentile(latencies, 50) * 1000:.2f}ms  p95={np.percentile(latencies, 95) * 1000:.2f}ms  "
+                  f"索引内存={memory:.1f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="向量降维：拟合 PCA 投影 / 维度对比报告")
+    parser.add_argument("--fit", action="store_true", help="在缓存的语料向量上拟合 PCA 投影")
+    parser.add_argument("--report", action="store_true", help="对比不同维度的召回率、延迟与索引内存")
+    parser.add_argument("--dim", type=int, default=REDUCED_DIM, help="拟合的目标维度")
+    parser.add_argument("--backend", choices=["redis", "numpy"], default="redis", help="对比报告的索引后端")
+    parser.add_argument("--sample", type=int, default=5000, help="拟合 / 建立临时索引的向量条数")
+    parser.add_argument("--queries", type=int, default=200, help="留出作为查询的向量条数")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.fit:
+        fit(args.dim, sample=args.sample)
+    if args.report:
+        report(
+            redis.Redis(host="localhost", port=6379, password=None, decode_responses=False)
+            if args.backend == "redis" else None,
+            sample=args.sample,
+            queries=args.queries,
+            top_k=args.top_k
+        )
+    if not args.fit and not args.report:
+        parser.print_help()
@@ -0,0 +1,128 @@
+# 常驻检索服务（retrieval_daemon.py）的轻量客户端，只依赖标准库，导入几乎没有开销。
+#
+# 服务未启动时自动回退为进程内调用（与服务端相同的处理逻辑），脚本无需修改即可单独运行。
+
+import os
+import json
+import socket
+from types import SimpleNamespace
+
+# ========== 配置 ==========
+# 检索服务的 Unix socket 路径，需与 retrieval_daemon.py 一致
+RETRIEVAL_SOCKET = os.getenv("RETRIEVAL_SOCKET", "/tmp/doc-rag-retrieval.sock")
+# 默认返回最相似的前 K 条结果，与 retrieve.TOP_K 一致
+TOP_K = 3
+
+
+class RetrievalClient:
+    """
+    复用同一个 socket 连接的检索客户端。
+    """
+
+    def __init__(self, path: str = RETRIEVAL_SOCKET):
+        self.path = path
+        self.sock = None
+        self.file = None
+        self.local = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock, self.file = sock, sock.makefile("rwb")
+
+    def _close(self):
+        if self.sock is not None:
+            self.file.close()
+            self.sock.close()
+        self.sock = self.file = None
+
+    def _remote(self, op: str, params: dict):
+        if self.sock is None:
+            self._connect()
+        self.file.write(json.dumps({"op": op, **params}, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionResetError("检索服务已断开")
+        return json.loads(line)
+
+    def call(self, op: str, **params):
+        """
+        发送一条请求并返回结果。
+
+        参数:
+            op (str): 操作名称，见 retrieval_daemon.RetrievalService。
+            **params: 操作参数。
+
+        返回:
+            操作结果。
+
+        异常:
+            RuntimeError: 服务端处理请求失败时抛出。
+        """
+        if self.local is None:
+            try:
+                try:
+                    response = self._remote(op, params)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 服务重启后旧连接失效，重连一次
+                    self._close()
+                    response = self._remote(op, params)
+            except (FileNotFoundError, ConnectionRefusedError):
+                self._close()
+                print("⚠️ 检索服务未启动（python retrieval_daemon.py），改为进程内检索")
+                from retrieval_daemon import RetrievalService
+                self.local = RetrievalService()
+            else:
+                if "error" in response:
+                    raise RuntimeError(f"❌ 检索服务出错: {response['error']}")
+                return response["result"]
+        return self.local.handle(op, params)
+
+
+client = RetrievalClient()
+
+
+def search_faq(question: str, top_k=TOP_K, mode=None, filters=None) -> list:
+    """
+    与 retrieve.search_faq 相同的检索接口，返回的文档对象支持 doc.id、doc.question 等属性访问。
+    """
+    docs = client.call("search", question=question, top_k=top_k, mode=mode, filters=filters)
+    return [SimpleNamespace(**doc) for doc in docs]
+
+
+def search_faq_batch(questions: list, top_k=TOP_K, filters=None) -> list:
+    """
+    与 retrieve.search_faq_batch 相同的批量检索接口。
+    """
+    results = client.call("search_batch", questions=questions, top_k=top_k, filters=filters)
+    return [[SimpleNamespace(**doc) for doc in docs] for docs in results]
+
+
+def answer_lookup(question: str):
+    """
+    在服务端的语义答案缓存中查找相似问题的答案，未命中时返回 None。
+    """
+    return client.call("answer_lookup", question=question)
+
+
+def answer_store(question: str, answer: str, doc_ids: list):
+    """
+    将大模型生成的答案写入服务端的语义答案缓存。
+    """
+    client.call("answer_store", question=question, answer=answer, doc_ids=doc_ids)
+
+
+def print_stats():
+    """
+    打印服务端的问题向量缓存与答案缓存统计。
+    """
+    s = client.call("stats")
+    q, a = s["query_cache"], s["answer_cache"]
+    print(f"📦 问题向量缓存: 命中率 {q['hit_rate']:.1%}（进程内 {q['hits']}，"
+          f"共享层 {q['shared_hits']}，未命中 {q['misses']}），当前 {q['size']} 条")
+    print(f"📦 答案缓存: 命中 {a['hits']}，未命中 {a['misses']}")
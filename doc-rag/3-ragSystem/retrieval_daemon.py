@@ -0,0 +1,162 @@
+# 常驻检索服务：在 Unix socket 上提供问题向量化、相似度检索与语义答案缓存。
+#
+# retrieve.py / prompt.py / run.py 每次启动都要加载环境变量、初始化 DashScope 与 Redis 连接，
+# 问题向量缓存也随进程退出而丢失。检索服务常驻后，这些状态只初始化一次：
+# Redis 连接池保持热连接，问题向量缓存、NumPy 索引常驻内存。
+# 脚本通过 retrieval_client.py 调用，每次请求只是一次本机 socket 往返。
+#
+# 协议：每行一个 JSON 请求 {"op": ..., ...}，每行一个 JSON 响应 {"result": ...} 或 {"error": ...}。
+#
+# 启动服务：python retrieval_daemon.py
+
+import os
+import json
+import socketserver
+
+from retrieve import (
+    search_faq, search_faq_batch, embed_question, get_vector_store, docs_exist, query_cache, redis_client,
+    INDEX_DIM, TOP_K
+)
+from answer_cache import AnswerCache
+from numpy_store import VECTOR_BACKEND
+
+# ========== 配置 ==========
+# 服务监听的 Unix socket 路径，需与 retrieval_client.py 一致
+RETRIEVAL_SOCKET = os.getenv("RETRIEVAL_SOCKET", "/tmp/doc-rag-retrieval.sock")
+
+
+def doc_to_dict(doc) -> dict:
+    """
+    将检索结果中的文档对象转换为可 JSON 序列化的字典。
+    """
+    return {name: value for name, value in vars(doc).items() if name != "payload"}
+
+
+class RetrievalService:
+    """
+    检索请求的处理逻辑，socket 服务与客户端的进程内回退共用。
+    """
+
+    def __init__(self):
+        # 答案缓存的向量索引依赖 Redis Stack，NumPy 后端不使用 Redis，不启用答案缓存
+        if VECTOR_BACKEND == "numpy":
+            self.answer_cache = None
+            print("ℹ️ NumPy 后端不启用语义答案缓存（缓存索引依赖 Redis Stack）")
+        else:
+            self.answer_cache = AnswerCache(redis_client, dim=INDEX_DIM, exists=docs_exist)
+        self._answer_index_ready = False
+        self.ops = {
+            "search": self.search,
+            "search_batch": self.search_batch,
+            "answer_lookup": self.answer_lookup,
+            "answer_store": self.answer_store,
+            "stats": self.stats,
+        }
+
+    def warm_up(self):
+        """
+        预先加载索引并建立 Redis 连接，使第一条请求不承担初始化开销。
+        """
+        if get_vector_store() is None:
+            redis_client.ping()
+
+    def handle(self, op: str, params: dict):
+        """
+        执行一条请求。
+
+        参数:
+            op (str): 操作名称，见 self.ops。
+            params (dict): 操作参数。
+
+        返回:
+            可 JSON 序列化的结果。
+
+        异常:
+            ValueError: 未知的操作名称。
+        """
+        if op not in self.ops:
+            raise ValueError(f"未知操作: {op}")
+        return self.ops[op](**params)
+
+    def search(self, question: str, top_k: int = TOP_K, mode: str = None, filters: dict = None) -> list:
+        return [doc_to_dict(doc) for doc in search_faq(question, top_k=top_k, mode=mode, filters=filters)]
+
+    def search_batch(self, questions: list, top_k: int = TOP_K, filters: dict = None) -> list:
+        return [
+            [doc_to_dict(doc) for doc in docs]
+            for docs in search_faq_batch(questions, top_k=top_k, filters=filters)
+        ]
+
+    def _ensure_answer_index(self):
+        if not self._answer_index_ready:
+            self.answer_cache.create_index()
+            self._answer_index_ready = True
+
+    def answer_lookup(self, question: str):
+        if self.answer_cache is None:
+            return None
+        self._ensure_answer_index()
+        return self.answer_cache.lookup(embed_question(question))
+
+    def answer_store(self, question: str, answer: str, doc_ids: list):
+        if self.answer_cache is None:
+            return
+        self._ensure_answer_index()
+        self.answer_cache.store(question, embed_question(question), answer, doc_ids)
+
+    def stats(self) -> dict:
+        cache = self.answer_cache
+        return {
+            "query_cache": query_cache.stats(),
+            "answer_cache": {"hits": cache.hits if cache else 0, "misses": cache.misses if cache else 0},
+        }
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    一个连接上按行读取请求，客户端可以长期复用同一连接。
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = {"result": self.server.service.handle(request.pop("op"), request)}
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class RetrievalServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, service: RetrievalService):
+        self.service = service
+        super().__init__(path, RequestHandler)
+
+
+def serve(path: str = RETRIEVAL_SOCKET):
+    """
+    启动常驻检索服务，直到收到 Ctrl+C。
+
+    参数:
+        path (str): Unix socket 路径。
+    """
+    service = RetrievalService()
+    service.warm_up()
+    if os.path.exists(path):
+        os.unlink(path)
+    with RetrievalServer(path, service) as server:
+        print(f"✅ 检索服务已启动：{path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+            query_cache.print_stats()
+
+
+if __name__ == "__main__":
+    serve()
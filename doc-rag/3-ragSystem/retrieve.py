@@ -4,12 +4,37 @@
 # 召回与问题最相关的文档片段（如退款流程、配送延误规则），并返回给上层系统。
 
 import os
+import re
+import sys
+import json
+import time
+import argparse
+import numpy as np
 import dotenv
 import dashscope
 import redis
-import numpy as np
-from http import HTTPStatus
+from pathlib import Path
+from contextlib import contextmanager
 from redis.commands.search.query import Query
+from redis.commands.search.document import Document
+
+# 可选依赖：jieba 分词用于混合检索的关键词切分
+try:
+    import jieba
+except ImportError:
+    jieba = None
+
+# 共享的本地 Embedding 缓存位于 doc-rag 根目录
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from embed_cache import cached_embed
+from query_cache import QueryEmbeddingCache, QUERY_CACHE_SHARED
+from numpy_store import NumpyVectorStore, VECTOR_BACKEND
+from shards import ShardCluster, REDIS_SHARDS, merge_top_k
+from reduce import reduced_dim, reduce_vector
+from quantize import (
+    VECTOR_TYPE, VECTOR_INT8, VECTOR_FIELDS, RESCORE_FACTOR,
+    encode_vector, index_vector_type, index_vector_field, rescore
+)
 
 # ========== 配置 ==========
 # 加载环境变量
@@ -17,12 +42,31 @@ dotenv.load_dotenv()
 # 设置 DashScope API 密钥
 dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
 
-# Redis 向量索引名称
+# Redis 向量索引别名，指向 embedding.py 当前的版本化索引，重建索引时原子切换
 INDEX_NAME = "faq_index"
 # 向量维度，用于模型 "multimodal-embedding-v1"
 VECTOR_DIM = 1024
+# 索引中的向量维度，需与 embedding.INDEX_DIM 一致
+INDEX_DIM = reduced_dim(VECTOR_DIM)
+# Embedding 模型名称
+EMBEDDING_MODEL = "multimodal-embedding-v1"
 # 默认返回最相似的前 K 条结果
 TOP_K = 3
+# 索引结构，需与 embedding.py 建索引时一致：text 或 tag（category/source 为 TAG，crawl_ts 为 NUMERIC）
+INDEX_SCHEMA = os.getenv("INDEX_SCHEMA", "text")
+# 检索模式：vector 仅向量检索；hybrid 向量 + BM25 全文检索，按倒数排名融合
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+# 混合检索时每一路召回 top_k * HYBRID_CANDIDATES 条候选
+HYBRID_CANDIDATES = 4
+# RRF 平滑常数
+RRF_K = 60
+# 检索结果返回的字段
+RETURN_FIELDS = ("question", "answer", "source", "category", "crawl_time")
+
+# 关键词切分：字母数字串（订单号、编号等）或连续中文片段
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-]*|[\u4e00-\u9fff]+")
+# RediSearch 查询语法中需要转义的字符
+ESCAPE_PATTERN = re.compile(r"[,.<>{}\[\]\"':;!@#$%^&*()\-+=~|/\\ ]")
 
 # 初始化 Redis 客户端连接
 redis_client = redis.Redis(
@@ -32,11 +76,28 @@ redis_client = redis.Redis(
     decode_responses=False
 )
 
+# VECTOR_BACKEND=numpy 时在进程内 NumPy 索引中检索，首次检索时加载
+vector_store = NumpyVectorStore(dim=INDEX_DIM) if VECTOR_BACKEND == "numpy" else None
+_vector_store_loaded = False
+
+# 配置 REDIS_SHARDS 时 FAQ 分布在多个 Redis 节点上，检索并发查询各分片后合并，见 shards.py
+shard_cluster = ShardCluster(REDIS_SHARDS) if REDIS_SHARDS else None
+
+# 问题向量缓存：进程内 LRU + TTL，可选 Redis 共享层；未命中时再查本地磁盘缓存和 DashScope
+query_cache = QueryEmbeddingCache(
+    embed_fn=lambda text: cached_embed([text], model=EMBEDDING_MODEL)[0],
+    model=EMBEDDING_MODEL,
+    redis_client=redis_client if QUERY_CACHE_SHARED else None
+)
+
 # ========== 将问题转为向量 ==========
 def embed_question(question: str):
     """
     使用 DashScope 的多模态嵌入模型将文本问题转换为向量表示。
 
+    高频问题直接命中问题向量缓存，不再产生网络调用。
+    启用降维时使用与入库相同的投影，缓存中保存的是完整维度的向量。
+
     参数:
         question (str): 需要转换为向量的文本问题。
 
@@ -46,44 +107,379 @@ def embed_question(question: str):
     异常:
         RuntimeError: 如果调用嵌入服务失败，则抛出运行时错误。
     """
-    resp = dashscope.MultiModalEmbedding.call(
-        model="multimodal-embedding-v1",
-        input=[{"text": question}]
+    return reduce_vector(query_cache.get(question))
+
+# ========== 查询构造 ==========
+def build_filter(filters: dict = None) -> str:
+    """
+    将元数据过滤条件编译为 RediSearch 预过滤表达式，在 KNN 之前缩小候选集。
+
+    参数:
+        filters (dict): 过滤条件，支持的键：
+            - category (str | list[str]): 业务类别，多个值取并集
+            - source (str | list[str]): 来源 URL，多个值取并集
+            - crawl_after (int): 抓取时间下限（Unix 时间戳，含）
+            - crawl_before (int): 抓取时间上限（Unix 时间戳，含）
+
+    返回:
+        str: 过滤表达式，无过滤条件时为 "*"。
+
+    异常:
+        ValueError: text 索引结构下使用抓取时间过滤时抛出。
+    """
+    if not filters:
+        return "*"
+    clauses = []
+    for field in ("category", "source"):
+        values = filters.get(field)
+        if not values:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        if INDEX_SCHEMA == "tag":
+            tags = "|".join(ESCAPE_PATTERN.sub(r"\\\g<0>", value) for value in values)
+            clauses.append(f"@{field}:{{{tags}}}")
+        else:
+            # text 结构下退化为短语匹配
+            phrases = "|".join('"' + value.replace('"', "") + '"' for value in values)
+            clauses.append(f"@{field}:({phrases})")
+
+    if "crawl_after" in filters or "crawl_before" in filters:
+        if INDEX_SCHEMA != "tag":
+            raise ValueError("❌ 按抓取时间过滤需要 tag 索引结构，请先执行 python embedding.py --migrate-schema tag")
+        low = filters.get("crawl_after", "-inf")
+        high = filters.get("crawl_before", "+inf")
+        clauses.append(f"@crawl_ts:[{low} {high}]")
+
+    return f"({' '.join(clauses)})" if clauses else "*"
+
+def build_knn_query(top_k: int, filter_expr: str = "*") -> Query:
+    """
+    构造 RediSearch 的 KNN 向量查询。
+
+    参数:
+        top_k (int): 返回最相似的前 K 条结果。
+        filter_expr (str): build_filter 生成的预过滤表达式。
+
+    返回:
+        Query: 需配合 knn_params(向量字节) 使用的查询对象。
+    """
+    return (
+        Query(f"{filter_expr}=>[KNN {top_k} @{index_vector_field()} $vec AS score]")
+        .sort_by("score")
+        .return_fields(*RETURN_FIELDS, "score")
+        .paging(0, top_k)
+        .dialect(2)
     )
-    if resp.status_code == HTTPStatus.OK:
-        embedding = resp.output["embeddings"][0]["embedding"]
-        return np.array(embedding, dtype=np.float32).tobytes()
+
+def knn_params(q_vector: bytes) -> dict:
+    """
+    将问题的 FLOAT32 向量转换为索引字段的精度，作为 KNN 查询参数。
+
+    参数:
+        q_vector (bytes): 问题的 FLOAT32 向量字节。
+
+    返回:
+        dict: KNN 查询的 query_params。
+    """
+    return {"vec": encode_vector(q_vector, index_vector_type())}
+
+def rescore_candidates(docs: list, q_vector: bytes, top_k: int, client: redis.Redis = redis_client) -> list:
+    """
+    INT8 召回的候选用浮点向量精确重排，一次 pipeline 取回全部候选的浮点向量。
+
+    参数:
+        docs (list): INT8 KNN 召回的候选文档对象。
+        q_vector (bytes): 问题的 FLOAT32 向量字节。
+        top_k (int): 返回的结果数量。
+        client (redis.Redis): 候选所在的 Redis 节点，分片部署时为对应分片。
+
+    返回:
+        list: 重排后的前 top_k 个文档对象。
+    """
+    pipe = client.pipeline(transaction=False)
+    for doc in docs:
+        pipe.hget(doc.id, VECTOR_FIELDS[VECTOR_TYPE])
+    return rescore(docs, q_vector, pipe.execute(), top_k)
+
+def tokenize_question(question: str) -> list:
+    """
+    将问题切分为全文检索关键词。
+
+    已安装 jieba 时使用其搜索引擎模式分词；否则按字母数字串和连续中文片段切分。
+    单个汉字（多为虚词）不参与检索。
+
+    参数:
+        question (str): 用户提出的问题。
+
+    返回:
+        list[str]: 去重后的关键词列表。
+    """
+    if jieba is not None:
+        words = jieba.lcut_for_search(question)
     else:
-        raise RuntimeError(f"❌ Embedding 调用失败: {resp.code}, {resp.message}")
+        words = TOKEN_PATTERN.findall(question)
+    tokens = []
+    for word in words:
+        word = word.strip()
+        # 过滤空白、标点和单个汉字
+        if len(word) > 1 or (word.isascii() and word.isalnum()):
+            tokens.append(word)
+    return list(dict.fromkeys(tokens))
+
+def build_text_query(question: str, top_k: int, filter_expr: str = "*"):
+    """
+    构造 BM25 全文检索查询：关键词之间取并集，在 question 与 answer 字段中匹配。
+
+    参数:
+        question (str): 用户提出的问题。
+        top_k (int): 返回的结果数量。
+        filter_expr (str): build_filter 生成的过滤表达式。
+
+    返回:
+        Query | None: 查询对象；问题中没有可检索的关键词时返回 None。
+    """
+    tokens = [ESCAPE_PATTERN.sub(r"\\\g<0>", token) for token in tokenize_question(question)]
+    if not tokens:
+        return None
+    query_string = f"@question|answer:({' | '.join(tokens)})"
+    if filter_expr != "*":
+        query_string += f" {filter_expr}"
+    return (
+        Query(query_string)
+        .scorer("BM25")
+        .language("chinese")
+        .return_fields(*RETURN_FIELDS)
+        .paging(0, top_k)
+        .dialect(2)
+    )
+
+def parse_search_reply(reply) -> list:
+    """
+    解析 pipeline 中 FT.SEARCH 的原始返回值。
+
+    参数:
+        reply (list): [总数, key1, [字段, 值, ...], key2, [...], ...]
+
+    返回:
+        list[Document]: 文档对象列表，与 ft().search(...).docs 的结构一致。
+    """
+    docs = []
+    for i in range(1, len(reply), 2):
+        fields = reply[i + 1]
+        values = {
+            fields[j].decode(): fields[j + 1].decode("utf-8", "ignore")
+            for j in range(0, len(fields), 2)
+        }
+        docs.append(Document(id=reply[i].decode(), **values))
+    return docs
+
+def search_args(query: Query, query_params: dict = None) -> list:
+    """
+    将查询对象展开为 FT.SEARCH 的命令参数，用于在 pipeline 中发送。
+    """
+    args = [INDEX_NAME, *query.get_args()]
+    if query_params:
+        args += ["PARAMS", len(query_params) * 2]
+        for name, value in query_params.items():
+            args += [name, value]
+    return args
 
 # ========== 相似度搜索 ==========
-def search_faq(question: str, top_k=TOP_K):
+def get_vector_store() -> NumpyVectorStore:
+    """
+    返回已加载的 NumPy 索引，VECTOR_BACKEND 不是 numpy 时返回 None。
+    """
+    global _vector_store_loaded
+    if vector_store is not None and not _vector_store_loaded:
+        vector_store.create_index()
+        _vector_store_loaded = True
+    return vector_store
+
+def docs_exist(keys: list) -> int:
+    """
+    返回 keys 中仍然存在于 Redis 的 FAQ 文档个数，分片部署时在各分片上分别计数后求和。
+    超时或出错的分片计为不存在，调用方（语义答案缓存）按未命中处理。
+    """
+    if shard_cluster is not None:
+        return sum(shard_cluster.scatter(lambda client: client.exists(*keys)))
+    return redis_client.exists(*keys)
+
+@contextmanager
+def override_backend(index_name: str = None, embed_fn=None, store: NumpyVectorStore = None):
+    """
+    临时替换检索使用的索引、问题向量化函数与后端，离线基准（bench_retrieval.py）借此走完整的 search_faq 流程。
+    替换期间不使用分片部署与问题向量缓存的 Redis 共享层。
+
+    参数:
+        index_name (str): Redis 索引名，为空时沿用 INDEX_NAME。
+        embed_fn (callable): 问题向量化函数，签名为 embed_fn(text) -> bytes（完整维度的 FLOAT32 向量）；
+            为空时沿用当前的问题向量缓存。
+        store (NumpyVectorStore): 已加载的 NumPy 索引；为空时在 Redis 上检索。
+    """
+    global INDEX_NAME, query_cache, vector_store, _vector_store_loaded, shard_cluster
+    saved = (INDEX_NAME, query_cache, vector_store, _vector_store_loaded, shard_cluster)
+    INDEX_NAME = index_name or INDEX_NAME
+    if embed_fn is not None:
+        query_cache = QueryEmbeddingCache(embed_fn=embed_fn, model=EMBEDDING_MODEL)
+    vector_store, _vector_store_loaded, shard_cluster = store, True, None
+    try:
+        yield
+    finally:
+        INDEX_NAME, query_cache, vector_store, _vector_store_loaded, shard_cluster = saved
+
+def search_faq(question: str, top_k=TOP_K, mode=None, filters=None):
     """
     根据用户输入的问题，在 Redis 中进行向量相似度搜索，返回最相关的 FAQ 条目。
+    分片部署时并发查询各分片，合并为全局 top_k；超时的分片被跳过。
 
     参数:
         question (str): 用户提出的问题。
         top_k (int): 返回最相似的前 K 条结果，默认值为 TOP_K。
+        mode (str): 检索模式，"vector" 仅向量检索，"hybrid" 向量 + BM25 融合；
+            默认取 SEARCH_MODE 配置。
+        filters (dict): 元数据预过滤条件，见 build_filter。
+
+    返回:
+        list: 包含匹配文档对象的列表，每个对象包含字段如 question、answer、source 等。
     """
+    mode = mode or SEARCH_MODE
+    store = get_vector_store()
+    if mode == "hybrid":
+        if store is not None:
+            raise ValueError("❌ NumPy 后端不支持混合检索，请使用 VECTOR_BACKEND=redis")
+        if shard_cluster is not None:
+            raise ValueError("❌ 分片部署不支持混合检索：各分片的 RRF 分数不可比较")
+        return hybrid_search(question, top_k, filters=filters)
+
     # 将问题转换为向量表示
     q_vector = embed_question(question)
+    if store is not None:
+        return store.search(q_vector, top_k, filters)
 
-    # 构造 RediSearch 的 KNN 查询语句
-    query = (
-        Query(f"*=>[KNN {top_k} @embedding $vec AS score]")
-        .sort_by("score")
-        .return_fields("question", "answer", "source", "category", "crawl_time", "score")
-        .dialect(2)
-    )
+    # 构造 RediSearch 的 KNN 查询语句（带元数据预过滤）；INT8 索引多召回候选再重排
+    fetch = top_k * RESCORE_FACTOR if VECTOR_INT8 else top_k
+    query = build_knn_query(fetch, build_filter(filters))
+    if shard_cluster is not None:
+        return merge_top_k(shard_cluster.scatter(
+            lambda client: shard_search(client, [query], [q_vector], top_k)[0], filters
+        ), top_k)
 
     # 执行查询并获取结果
-    results = redis_client.ft(INDEX_NAME).search(query, query_params={"vec": q_vector})
+    results = redis_client.ft(INDEX_NAME).search(query, query_params=knn_params(q_vector))
+    if VECTOR_INT8:
+        return rescore_candidates(results.docs, q_vector, top_k)
+    return results.docs
+
+def search_faq_batch(questions: list, top_k=TOP_K, filters=None) -> list:
+    """
+    批量向量检索。NumPy 后端一次矩阵乘法完成全部问题；Redis 后端在一个 pipeline 中发送全部 KNN 查询。
+
+    参数:
+        questions (list[str]): 用户提出的问题。
+        top_k (int): 每个问题返回的结果数量。
+        filters (dict): 元数据预过滤条件，对全部问题生效。
+
+    返回:
+        list[list]: 与 questions 一一对应的文档对象列表。
+    """
+    q_vectors = [embed_question(question) for question in questions]
+    store = get_vector_store()
+    if store is not None:
+        return store.search_batch(q_vectors, top_k, filters)
+
+    fetch = top_k * RESCORE_FACTOR if VECTOR_INT8 else top_k
+    queries = [build_knn_query(fetch, build_filter(filters))] * len(q_vectors)
+    if shard_cluster is None:
+        return shard_search(redis_client, queries, q_vectors, top_k)
+    # 每个分片一个 pipeline 发送全部问题，再逐个问题合并各分片的结果
+    shard_results = shard_cluster.scatter(lambda client: shard_search(client, queries, q_vectors, top_k), filters)
+    return [merge_top_k([results[i] for results in shard_results], top_k) for i in range(len(questions))]
+
+def shard_search(client: redis.Redis, queries: list, q_vectors: list, top_k: int) -> list:
+    """
+    在一个 Redis 节点上用一个 pipeline 执行一组 KNN 查询，INT8 索引在节点内完成重排。
+
+    参数:
+        client (redis.Redis): Redis 节点，单机部署时为 redis_client，分片部署时为某个分片。
+        queries (list[Query]): build_knn_query 生成的查询。
+        q_vectors (list[bytes]): 与 queries 对应的问题 FLOAT32 向量字节。
+        top_k (int): 每个查询返回的结果数量。
+
+    返回:
+        list[list]: 与 queries 一一对应的文档对象列表。
+    """
+    pipe = client.pipeline(transaction=False)
+    for query, q_vector in zip(queries, q_vectors):
+        pipe.execute_command("FT.SEARCH", *search_args(query, knn_params(q_vector)))
+    results = [parse_search_reply(reply) for reply in pipe.execute()]
+    if VECTOR_INT8:
+        return [rescore_candidates(docs, q_vector, top_k, client) for docs, q_vector in zip(results, q_vectors)]
+    return results
+
+def hybrid_search(question: str, top_k=TOP_K, rrf_k=RRF_K, filters=None):
+    """
+    混合检索：在同一个 pipeline 中发送 BM25 全文查询和 KNN 向量查询，
+    再用倒数排名融合（RRF）合并两路结果。
+
+    订单号、退款条款等精确关键词由全文检索召回，语义相近的问法由向量检索召回。
+    融合后的文档带有 rrf_score 属性（越大越相关）；仅由全文检索召回的文档 score 为空。
+
+    参数:
+        question (str): 用户提出的问题。
+        top_k (int): 返回的结果数量。
+        rrf_k (int): RRF 平滑常数，score = Σ 1 / (rrf_k + rank)。
+        filters (dict): 元数据预过滤条件，两路查询同时生效。
+
+    返回:
+        list: 按融合分数排序的文档对象列表。
+    """
+    q_vector = embed_question(question)
+    candidates = top_k * HYBRID_CANDIDATES
+    filter_expr = build_filter(filters)
+    text_query = build_text_query(question, candidates, filter_expr)
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.execute_command("FT.SEARCH", *search_args(build_knn_query(candidates, filter_expr), knn_params(q_vector)))
+    if text_query is not None:
+        pipe.execute_command("FT.SEARCH", *search_args(text_query))
+    rankings = [parse_search_reply(reply) for reply in pipe.execute()]
+    if VECTOR_INT8:
+        # 与纯向量检索一致：INT8 召回的候选先按浮点向量重排，融合时使用重排后的名次与距离
+        rankings[0] = rescore_candidates(rankings[0], q_vector, candidates)
 
+    fused = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused[doc.id] = fused.get(doc.id, 0.0) + 1.0 / (rrf_k + rank)
+            # 同一文档优先保留向量检索的结果（带有向量距离 score）
+            docs.setdefault(doc.id, doc)
+
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    results = []
+    for doc_id in ranked:
+        doc = docs[doc_id]
+        if not hasattr(doc, "score"):
+            doc.score = ""
+        doc.rrf_score = fused[doc_id]
+        results.append(doc)
+    return results
+
+# ========== 打印结果 ==========
+def print_results(question: str, docs):
+    """
+    打印召回结果的详细信息。
+
+    参数:
+        question (str): 用户提出的问题。
+        docs (list): search_faq 返回的文档列表。
+    """
     print(f"\n🔎 用户问题: {question}")
-    print(f"📊 召回 {len(results.docs)} 条结果\n")
+    print(f"📊 召回 {len(docs)} 条结果\n")
 
     # 打印每条匹配结果的详细信息
-    for i, doc in enumerate(results.docs, start=1):
+    for i, doc in enumerate(docs, start=1):
         print(f"--- Top {i} ---")
         print(f"相似度分数: {doc.score}")
         print(f"Q: {doc.question}")
@@ -93,8 +489,57 @@ def search_faq(question: str, top_k=TOP_K):
         print(f"时间: {doc.crawl_time}")
         print()
 
+# ========== 检索模式对比 ==========
+def compare_modes(labeled_file: str, ks=(1, 3, 5)):
+    """
+    对比向量检索与混合检索在标注问题集上的召回率和延迟。
+
+    参数:
+        labeled_file (str): JSONL 文件，每行形如 {"question": "...", "expected": ["faq:<key>", ...]}。
+        ks (tuple[int]): 需要统计 recall@k 的 k 值。
+    """
+    with open(labeled_file, "r", encoding="utf-8") as f:
+        labeled = [json.loads(line) for line in f if line.strip()]
+    max_k = max(ks)
+
+    # 预先向量化所有问题，使两种模式的延迟只包含检索本身
+    for item in labeled:
+        embed_question(item["question"])
+
+    for mode in ("vector", "hybrid"):
+        hits = {k: 0 for k in ks}
+        latencies = []
+        for item in labeled:
+            start = time.perf_counter()
+            docs = search_faq(item["question"], top_k=max_k, mode=mode)
+            latencies.append(time.perf_counter() - start)
+            ids = [doc.id for doc in docs]
+            expected = set(item["expected"])
+            for k in ks:
+                if expected & set(ids[:k]):
+                    hits[k] += 1
+        recall = "，".join(f"recall@{k}={hits[k] / len(labeled):.3f}" for k in ks)
+        print(f"📊 {mode:<6}: {recall}，延迟 p50 {np.percentile(latencies, 50) * 1000:.1f}ms，"
+              f"p95 {np.percentile(latencies, 95) * 1000:.1f}ms")
+
 # ========== 主函数 ==========
 if __name__ == "__main__":
-    # 测试用例：模拟用户提问
-    test_question = "为什么会出现无法下单的情况？"
-    search_faq(test_question, top_k=3)
+    parser = argparse.ArgumentParser(description="FAQ 相似度检索")
+    parser.add_argument("--mode", choices=["vector", "hybrid"], default=SEARCH_MODE, help="检索模式")
+    parser.add_argument("--compare", metavar="FILE", help="在标注问题集上对比两种检索模式")
+    parser.add_argument("--category", action="append", help="只在指定业务类别中检索，可重复")
+    parser.add_argument("--source", action="append", help="只在指定来源中检索，可重复")
+    args = parser.parse_args()
+    filters = {"category": args.category, "source": args.source}
+
+    if args.compare:
+        compare_modes(args.compare)
+    else:
+        # 测试用例：模拟用户提问
+        test_question = "为什么会出现无法下单的情况？"
+        print_results(test_question, search_faq(test_question, top_k=3, mode=args.mode, filters=filters))
+        # 再次提问相同问题（仅标点不同），直接命中问题向量缓存
+        print_results(test_question, search_faq("为什么会出现无法下单的情况", top_k=3, mode=args.mode, filters=filters))
+        query_cache.print_stats()
+        if shard_cluster is not None:
+            shard_cluster.print_stats()
@@ -1,26 +1,13 @@
 import os
 import dotenv
-import dashscope
-import redis
-import numpy as np
-from http import HTTPStatus
-from redis.commands.search.query import Query
 from openai import OpenAI
 
+# 问题向量化、相似度搜索与语义答案缓存由常驻检索服务完成（retrieval_daemon.py），未启动时回退为进程内检索
+from retrieval_client import search_faq, answer_lookup, answer_store, print_stats, TOP_K
+from context_pack import pack_context, print_pack_stats, CONTEXT_TOKEN_BUDGET
+
 # ========== 配置 ==========
 dotenv.load_dotenv()
-dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
-
-INDEX_NAME = "faq_index"
-VECTOR_DIM = 1024
-TOP_K = 3
-
-redis_client = redis.Redis(
-    host="localhost",
-    port=6379,
-    password=None,
-    decode_responses=False
-)
 
 # 初始化 OpenAI 客户端（兼容 DashScope）
 client = OpenAI(
@@ -28,40 +15,12 @@ client = OpenAI(
     base_url=os.getenv("BAILIAN_BASE_URL")
 )
 
-# ========== 将问题转为向量 ==========
-def embed_question(question: str):
-    resp = dashscope.MultiModalEmbedding.call(
-        model="multimodal-embedding-v1",
-        input=[{"text": question}]
-    )
-    if resp.status_code == HTTPStatus.OK:
-        embedding = resp.output["embeddings"][0]["embedding"]
-        return np.array(embedding, dtype=np.float32).tobytes()
-    else:
-        raise RuntimeError(f"❌ Embedding 调用失败: {resp.code}, {resp.message}")
-
-# ========== 相似度搜索 ==========
-def search_faq(question: str, top_k=TOP_K):
-    q_vector = embed_question(question)
-
-    query = (
-        Query(f"*=>[KNN {top_k} @embedding $vec AS score]")
-        .sort_by("score")
-        .return_fields("question", "answer", "source", "category", "crawl_time", "score")
-        .dialect(2)
-    )
-
-    results = redis_client.ft(INDEX_NAME).search(query, query_params={"vec": q_vector})
-    return results.docs
-
 # ========== 构建 Prompt ==========
-def build_prompt(user_question: str, retrieved_docs, top_k=TOP_K) -> str:
-    context_parts = []
-    for i, doc in enumerate(retrieved_docs[:top_k], start=1):
-        context_parts.append(
-            f"【文档片段{i}】\nQ: {doc.question}\nA: {doc.answer}"
-        )
-    context_text = "\n\n".join(context_parts)
+def build_prompt(user_question: str, retrieved_docs, top_k=TOP_K, budget=CONTEXT_TOKEN_BUDGET) -> str:
+    # 按 token 预算打包文档片段：去重、句子边界截断、按相关度贪心装填
+    packed = pack_context(retrieved_docs[:top_k], budget)
+    print_pack_stats(packed)
+    context_text = packed["text"]
 
     prompt = f"""
     你是一个智能问答助手，请仅根据提供的文档片段回答用户问题。
@@ -87,23 +46,38 @@ def ask_llm(prompt: str) -> str:
     # 输出最终答案
     return completion.choices[0].message.content
 
+# ========== 问答（带语义缓存） ==========
+def answer_question(user_question: str):
+    # 语义答案缓存：相似问题且引用的 FAQ 未变化时直接复用答案
+    cached = answer_lookup(user_question)
+    if cached is not None:
+        return cached, True
+
+    docs = search_faq(user_question, top_k=TOP_K)
+    if not docs:
+        return None, False
+
+    prompt = build_prompt(user_question, docs)
+    # print("\n===== 构建的 Prompt =====\n")
+    # print(prompt)
+    # print("\n=========================\n")
+
+    answer = ask_llm(prompt)
+    answer_store(user_question, answer, [doc.id for doc in docs[:TOP_K]])
+    return answer, False
+
 # ========== 主程序 ==========
 if __name__ == "__main__":
     while True:
         user_question = input("\n请输入问题（输入 exit 退出）：")
         if user_question.lower() in ["exit", "quit"]:
+            print_stats()
             break
 
-        docs = search_faq(user_question, top_k=TOP_K)
-        if not docs:
+        answer, cached = answer_question(user_question)
+        if answer is None:
             print("⚠️ 未检索到相关文档")
             continue
 
-        prompt = build_prompt(user_question, docs)
-        # print("\n===== 构建的 Prompt =====\n")
-        # print(prompt)
-        # print("\n=========================\n")
-
-        answer = ask_llm(prompt)
-        print("💡 大模型回答：")
+        print("💡 大模型回答（命中缓存）：" if cached else "💡 大模型回答：")
         print(answer)
@@ -0,0 +1,311 @@
+# run.py 的异步服务版本：以 HTTP 接口对外提供问答，单进程即可并发处理大量请求。
+#
+# - Redis：redis.asyncio + 连接池
+# - Embedding：httpx.AsyncClient 直接调用 DashScope 多模态向量接口
+# - 大模型：AsyncOpenAI 流式输出
+# - 每个上游服务各用一个有界信号量限制在途请求数
+#
+# 启动服务：python serve_async.py serve
+# 异步检索只查询单个 Redis Stack 节点上的 INDEX_NAME；VECTOR_BACKEND=numpy 或配置了 REDIS_SHARDS 时服务拒绝启动，
+# 请改用 retrieval_daemon.py / run.py 的同步检索。
+# 压测对比：python serve_async.py bench --questions questions.txt --concurrency 32
+
+import os
+import time
+import asyncio
+import argparse
+import dotenv
+import httpx
+import numpy as np
+import redis.asyncio as aioredis
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from openai import AsyncOpenAI
+
+from retrieve import (
+    search_faq, build_knn_query, build_filter, knn_params, query_cache, INDEX_NAME, TOP_K, EMBEDDING_MODEL
+)
+from reduce import reduce_vector
+from numpy_store import VECTOR_BACKEND
+from shards import REDIS_SHARDS
+from quantize import VECTOR_TYPE, VECTOR_INT8, VECTOR_FIELDS, RESCORE_FACTOR, rescore
+from query_cache import QUERY_CACHE_SHARED
+from prompt import build_prompt
+
+# ========== 配置 ==========
+dotenv.load_dotenv()
+
+DASHSCOPE_EMBEDDING_URL = (
+    "https://dashscope.aliyuncs.com/api/v1/services/embeddings/"
+    "multimodal-embedding/multimodal-embedding"
+)
+LLM_MODEL = "deepseek-r1-distill-llama-70b"
+
+# 各上游服务的最大在途请求数
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+EMBED_MAX_INFLIGHT = int(os.getenv("EMBED_MAX_INFLIGHT", "16"))
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "32"))
+
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+
+
+# ========== 共享客户端 ==========
+class Clients:
+    """
+    服务生命周期内复用的异步客户端与信号量，在 FastAPI lifespan 中创建和关闭。
+    """
+
+    def __init__(self):
+        self.redis = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool(
+                host="localhost",
+                port=6379,
+                password=None,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                decode_responses=False
+            )
+        )
+        self.http = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=EMBED_MAX_INFLIGHT, max_keepalive_connections=EMBED_MAX_INFLIGHT),
+            headers={"Authorization": f"Bearer {os.getenv('DASHSCOPE_API_KEY')}"}
+        )
+        self.llm = AsyncOpenAI(
+            api_key=os.getenv("BAILIAN_API_KEY"),
+            base_url=os.getenv("BAILIAN_BASE_URL")
+        )
+        self.redis_sem = asyncio.BoundedSemaphore(REDIS_MAX_CONNECTIONS)
+        self.embed_sem = asyncio.BoundedSemaphore(EMBED_MAX_INFLIGHT)
+        self.llm_sem = asyncio.BoundedSemaphore(LLM_MAX_INFLIGHT)
+
+    async def close(self):
+        await self.http.aclose()
+        await self.llm.close()
+        await self.redis.aclose()
+
+
+clients: Clients = None
+
+
+def unsupported_backend() -> str:
+    """
+    返回异步检索不支持当前部署的原因，支持时返回 None。
+    """
+    if VECTOR_BACKEND == "numpy":
+        return "NumPy 后端（VECTOR_BACKEND=numpy）"
+    if REDIS_SHARDS:
+        return "分片部署（REDIS_SHARDS）"
+    return None
+
+
+# ========== 异步检索 ==========
+async def aembed_text(text: str) -> bytes:
+    """
+    异步调用 DashScope 多模态嵌入模型。
+
+    参数:
+        text (str): 待向量化的文本。
+
+    返回:
+        bytes: FLOAT32 向量字节。
+
+    异常:
+        RuntimeError: 当调用嵌入服务失败时抛出异常。
+    """
+    async with clients.embed_sem:
+        resp = await clients.http.post(DASHSCOPE_EMBEDDING_URL, json={
+            "model": EMBEDDING_MODEL,
+            "input": {"contents": [{"text": text}]}
+        })
+    if resp.status_code != 200:
+        raise RuntimeError(f"❌ Embedding 调用失败: {resp.status_code}, {resp.text}")
+    embedding = resp.json()["output"]["embeddings"][0]["embedding"]
+    return np.array(embedding, dtype=np.float32).tobytes()
+
+
+async def aembed_question(question: str) -> bytes:
+    """
+    带问题向量缓存的异步向量化，与 retrieve.embed_question 共用同一份进程内缓存，降维方式也与其一致。
+    """
+    return reduce_vector(await query_cache.aget(
+        question, aembed_text, aredis=clients.redis if QUERY_CACHE_SHARED else None
+    ))
+
+
+async def asearch_faq(question: str, top_k=TOP_K, filters=None):
+    """
+    异步版本的 search_faq。
+
+    参数:
+        question (str): 用户提出的问题。
+        top_k (int): 返回最相似的前 K 个文档。
+        filters (dict): 元数据预过滤条件，见 retrieve.build_filter。
+
+    返回:
+        list: 匹配的文档对象列表。
+    """
+    q_vector = await aembed_question(question)
+    fetch = top_k * RESCORE_FACTOR if VECTOR_INT8 else top_k
+    query = build_knn_query(fetch, build_filter(filters))
+    async with clients.redis_sem:
+        results = await clients.redis.ft(INDEX_NAME).search(query, query_params=knn_params(q_vector))
+        if not VECTOR_INT8:
+            return results.docs
+        # INT8 召回的候选取回浮点向量后重排
+        pipe = clients.redis.pipeline(transaction=False)
+        for doc in results.docs:
+            pipe.hget(doc.id, VECTOR_FIELDS[VECTOR_TYPE])
+        vectors = await pipe.execute()
+    return rescore(results.docs, q_vector, vectors, top_k)
+
+
+async def astream_answer(prompt: str):
+    """
+    流式调用大模型，逐段产出回答文本。
+
+    参数:
+        prompt (str): 构建好的 Prompt。
+
+    返回:
+        AsyncIterator[str]: 回答文本片段。
+    """
+    async with clients.llm_sem:
+        stream = await clients.llm.chat.completions.create(
+            model=LLM_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+# ========== HTTP 接口 ==========
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global clients
+    reason = unsupported_backend()
+    if reason:
+        raise RuntimeError(f"❌ 异步服务不支持{reason}，请使用 VECTOR_BACKEND=redis 的单节点部署")
+    clients = Clients()
+    yield
+    await clients.close()
+
+
+app = FastAPI(title="FAQ 智能问答", version="v1.0", lifespan=lifespan)
+
+
+class AskRequest(BaseModel):
+    question: str
+    top_k: int = TOP_K
+    filters: dict | None = None
+
+
+@app.post("/search")
+async def search(req: AskRequest):
+    docs = await asearch_faq(req.question, req.top_k, req.filters)
+    return [
+        {"id": doc.id, "question": doc.question, "answer": doc.answer, "score": float(doc.score)}
+        for doc in docs
+    ]
+
+
+@app.post("/ask")
+async def ask(req: AskRequest):
+    docs = await asearch_faq(req.question, req.top_k, req.filters)
+    if not docs:
+        return StreamingResponse(iter(["未找到相关信息"]), media_type="text/plain; charset=utf-8")
+    prompt = build_prompt(req.question, docs, top_k=req.top_k)
+    return StreamingResponse(astream_answer(prompt), media_type="text/plain; charset=utf-8")
+
+
+@app.get("/stats")
+async def stats():
+    return query_cache.stats()
+
+
+# ========== 压测 ==========
+def percentile(values, p):
+    return float(np.percentile(values, p)) if values else 0.0
+
+
+def print_report(name: str, latencies: list, elapsed: float, errors: int):
+    print(f"📊 {name}: {len(latencies)} 次成功，{errors} 次失败，总耗时 {elapsed:.2f}s，"
+          f"QPS {len(latencies) / elapsed:.2f}")
+    print(f"   延迟 p50 {percentile(latencies, 50) * 1000:.0f}ms，"
+          f"p95 {percentile(latencies, 95) * 1000:.0f}ms，p99 {percentile(latencies, 99) * 1000:.0f}ms")
+
+
+async def bench_async(questions: list, concurrency: int, url: str):
+    """
+    以 concurrency 个并发请求压测 /ask 接口，读取完整的流式回答后计时；非 2xx 响应与网络错误计为失败。
+    """
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=300) as http:
+        async def one(question):
+            nonlocal errors
+            async with sem:
+                start = time.perf_counter()
+                try:
+                    async with http.stream("POST", f"{url}/ask", json={"question": question}) as resp:
+                        # 非 2xx 响应记为失败，不计入延迟（HTTPStatusError 是 HTTPError 的子类）
+                        resp.raise_for_status()
+                        async for _ in resp.aiter_text():
+                            pass
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in questions))
+        print_report(f"异步服务（并发 {concurrency}）", latencies, time.perf_counter() - start, errors)
+
+
+def bench_blocking(questions: list):
+    """
+    用 run.py 的同步流程逐条处理相同的问题，作为对照组。
+    """
+    from run import ask_llm
+
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for question in questions:
+        t0 = time.perf_counter()
+        try:
+            docs = search_faq(question, top_k=TOP_K)
+            if docs:
+                ask_llm(build_prompt(question, docs))
+            latencies.append(time.perf_counter() - t0)
+        except Exception:
+            errors += 1
+    print_report("同步循环", latencies, time.perf_counter() - start, errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FAQ 问答异步服务")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("serve", help="启动 HTTP 服务")
+    bench = sub.add_parser("bench", help="对比异步服务与同步循环的吞吐和延迟")
+    bench.add_argument("--questions", required=True, help="问题文件，每行一个问题")
+    bench.add_argument("--concurrency", type=int, default=32)
+    bench.add_argument("--url", default=f"http://{SERVE_HOST}:{SERVE_PORT}")
+    bench.add_argument("--skip-blocking", action="store_true", help="只压测异步服务")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        reason = unsupported_backend()
+        if reason:
+            parser.error(f"异步服务不支持{reason}，请使用 VECTOR_BACKEND=redis 的单节点部署")
+        import uvicorn
+        uvicorn.run(app, host=SERVE_HOST, port=SERVE_PORT)
+    else:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        asyncio.run(bench_async(questions, args.concurrency, args.url))
+        if not args.skip_blocking:
+            bench_blocking(questions)
@@ -0,0 +1,162 @@
+# 分片部署：FAQ 按 key 哈希或按业务类别分布到多个 Redis 节点，检索时并发查询各分片再合并全局 top-k。
+#
+# - 写入：每条 FAQ 只写入一个分片，各分片各自维护 faq_index 索引与 faq_manifest 清单；
+# - 检索：查询并发发往全部相关分片（按类别分片且带类别过滤时只查对应分片），
+#   各分片返回本地 top-k，按向量距离合并为全局 top-k；
+# - 降级：分片超时或出错时跳过该分片，返回其余分片的结果并打印告警。
+#
+# 配置 REDIS_SHARDS=host:port,host:port,... 启用，未配置时仍使用单个 Redis。
+# 本地多实例测试：
+#   docker run --name redis-shard0 -p 6380:6379 -d redis/redis-stack:latest
+#   docker run --name redis-shard1 -p 6381:6379 -d redis/redis-stack:latest
+#   REDIS_SHARDS=localhost:6380,localhost:6381 python embedding.py --bulk
+
+import os
+import zlib
+import threading
+import redis
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# ========== 配置 ==========
+# 分片节点列表，逗号分隔的 host:port；为空时不分片
+REDIS_SHARDS = [node.strip() for node in os.getenv("REDIS_SHARDS", "").split(",") if node.strip()]
+# 路由方式：hash 按文档 key 哈希；category 按业务类别哈希，同一类别的 FAQ 位于同一分片
+SHARD_BY = os.getenv("SHARD_BY", "hash")
+# 单次检索等待各分片的最长时间（秒），超时的分片不计入结果
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "0.5"))
+# 单个命令的 socket 超时（秒），批量写入的 pipeline 也受此限制
+SHARD_SOCKET_TIMEOUT = 10.0
+
+
+def shard_slot(value: str, count: int) -> int:
+    return zlib.crc32(value.encode("utf-8")) % count
+
+
+class ShardCluster:
+    """
+    一组 Redis 分片节点，负责写入路由与检索的并发分发、合并。
+
+    属性:
+        nodes (list[str]): 节点地址。
+        clients (list[redis.Redis]): 与 nodes 对应的客户端。
+        stats (dict): queries（检索次数）、partial（缺少分片结果的次数）、failures（各节点失败次数）。
+    """
+
+    def __init__(self, nodes: list, shard_by: str = SHARD_BY, timeout: float = SHARD_TIMEOUT):
+        """
+        参数:
+            nodes (list[str]): host:port 列表。
+            shard_by (str): 路由方式，"hash" 或 "category"。
+            timeout (float): 单次检索等待各分片的最长时间（秒）。
+
+        异常:
+            ValueError: 路由方式未知时抛出。
+        """
+        if shard_by not in ("hash", "category"):
+            raise ValueError(f"❌ 未知的分片方式: {shard_by}")
+        self.nodes = nodes
+        self.shard_by = shard_by
+        self.timeout = timeout
+        self.clients = []
+        for node in nodes:
+            host, _, port = node.rpartition(":")
+            self.clients.append(redis.Redis(
+                host=host or "localhost",
+                port=int(port),
+                decode_responses=False,
+                socket_timeout=SHARD_SOCKET_TIMEOUT
+            ))
+        # 超时的分片请求会继续占用线程直到 socket 超时，线程数留出余量
+        self.pool = ThreadPoolExecutor(max_workers=len(nodes) * 4, thread_name_prefix="shard")
+        self.stats = {"queries": 0, "partial": 0, "failures": {node: 0 for node in nodes}}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.clients)
+
+    # ========== 写入路由 ==========
+    def shard_for(self, key: str, doc: dict) -> int:
+        """
+        返回文档所在分片的下标。
+
+        参数:
+            key (str): 文档 key，见 embedding.faq_key。
+            doc (dict): FAQ 数据。
+        """
+        if self.shard_by == "category":
+            return shard_slot(doc.get("metadata", {}).get("category", ""), len(self))
+        return shard_slot(key, len(self))
+
+    def client_for(self, key: str, doc: dict) -> redis.Redis:
+        return self.clients[self.shard_for(key, doc)]
+
+    def pipelines(self) -> list:
+        """
+        每个分片一个非事务 pipeline，下标与 clients 对应。
+        """
+        return [client.pipeline(transaction=False) for client in self.clients]
+
+    # ========== 检索分发 ==========
+    def shards_for(self, filters: dict = None) -> list:
+        """
+        返回检索需要查询的分片下标：按类别分片且带类别过滤时只查对应分片，否则查全部分片。
+        """
+        categories = (filters or {}).get("category")
+        if self.shard_by != "category" or not categories:
+            return list(range(len(self)))
+        if isinstance(categories, str):
+            categories = [categories]
+        return sorted({shard_slot(category, len(self)) for category in categories})
+
+    def scatter(self, fn, filters: dict = None) -> list:
+        """
+        在相关分片上并发执行 fn(client)，超时或出错的分片被跳过。
+
+        参数:
+            fn (callable): 单个分片上的查询，签名为 fn(client) -> result。
+            filters (dict): 检索的元数据过滤条件，用于裁剪分片。
+
+        返回:
+            list: 成功返回的分片结果，顺序不固定。
+        """
+        futures = {self.pool.submit(fn, self.clients[i]): self.nodes[i] for i in self.shards_for(filters)}
+        done, not_done = wait(futures, timeout=self.timeout)
+        results, failed = [], []
+        for future in done:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failed.append(futures[future])
+                print(f"⚠️ 分片 {futures[future]} 检索出错，已跳过: {e}")
+        for future in not_done:
+            future.cancel()
+            failed.append(futures[future])
+            print(f"⚠️ 分片 {futures[future]} 超过 {self.timeout}s 未返回，已跳过")
+        with self._lock:
+            self.stats["queries"] += 1
+            if failed:
+                self.stats["partial"] += 1
+            for node in failed:
+                self.stats["failures"][node] += 1
+        return results
+
+    def print_stats(self):
+        s = self.stats
+        failures = "，".join(f"{node} {count} 次" for node, count in s["failures"].items() if count)
+        print(f"🧩 分片检索 {s['queries']} 次，结果不完整 {s['partial']} 次" + (f"（{failures}）" if failures else ""))
+
+
+def merge_top_k(shard_results: list, top_k: int) -> list:
+    """
+    合并各分片的本地 top-k：按向量距离 score 升序取全局前 top_k 条。
+
+    参数:
+        shard_results (list[list]): 各分片返回的文档对象列表。
+        top_k (int): 返回的结果数量。
+
+    返回:
+        list: 全局前 top_k 个文档对象。
+    """
+    docs = [doc for docs in shard_results for doc in docs]
+    docs.sort(key=lambda doc: float(doc.score))
+    return docs[:top_k]
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# 各模块以脚本形式平铺在 3-ragSystem 目录下，共享的 embed_cache 位于 doc-rag 根目录
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT.parent)]
@@ -0,0 +1,62 @@
+import json
+
+import checkpoint
+from checkpoint import IngestCheckpoint
+
+
+def make_checkpoint(tmp_path, name="faq.jsonl"):
+    data = tmp_path / name
+    data.write_text("{}\n" * 10, encoding="utf-8")
+    return IngestCheckpoint(str(data))
+
+
+def test_watermark_advances_only_over_contiguous_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_INTERVAL", 0.0)
+    ckpt = make_checkpoint(tmp_path)
+    # 每条数据之后的字节偏移为 3 * 序号
+    docs = list(ckpt.track(({"n": i}, 3 * (i + 1)) for i in range(10)))
+    assert len(docs) == 10
+    batches = [ckpt.submit(size) for size in (4, 4, 2)]
+
+    ckpt.commit([batches[1]])
+    assert (ckpt.docs, ckpt.offset) == (0, 0)
+    ckpt.commit([batches[0]])
+    assert (ckpt.docs, ckpt.offset) == (8, 24)
+    ckpt.commit([batches[2]])
+    assert (ckpt.docs, ckpt.offset) == (10, 30)
+
+    state = json.loads(ckpt.path.read_text(encoding="utf-8"))
+    assert (state["docs"], state["offset"]) == (10, 30)
+
+
+def test_load_resumes_and_track_continues_numbering(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_INTERVAL", 0.0)
+    ckpt = make_checkpoint(tmp_path)
+    list(ckpt.track(({}, 3 * (i + 1)) for i in range(4)))
+    ckpt.commit([ckpt.submit(4)])
+
+    resumed = IngestCheckpoint(ckpt.file_path)
+    assert resumed.load()
+    assert (resumed.docs, resumed.offset) == (4, 12)
+    list(resumed.track(({}, 3 * (i + 1)) for i in range(4, 6)))
+    resumed.commit([resumed.submit(2)])
+    assert (resumed.docs, resumed.offset) == (6, 18)
+
+
+def test_load_ignores_checkpoint_of_modified_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_INTERVAL", 0.0)
+    ckpt = make_checkpoint(tmp_path)
+    ckpt.commit([ckpt.submit(2)])
+    with open(ckpt.file_path, "a", encoding="utf-8") as f:
+        f.write("{}\n")
+    assert not IngestCheckpoint(ckpt.file_path).load()
+
+
+def test_json_array_checkpoint_has_no_offset(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_INTERVAL", 0.0)
+    ckpt = make_checkpoint(tmp_path, "faq.json")
+    list(ckpt.track(({}, None) for _ in range(3)))
+    ckpt.commit([ckpt.submit(3)])
+    assert (ckpt.docs, ckpt.offset) == (3, None)
+    ckpt.clear()
+    assert not ckpt.path.exists()
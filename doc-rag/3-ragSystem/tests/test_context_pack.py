@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from context_pack import hard_cut, truncate_sentences, pack_context, format_passage
+from tokens import count_tokens
+
+
+def make_doc(question, answer, score):
+    return SimpleNamespace(question=question, answer=answer, score=str(score))
+
+
+def test_hard_cut_returns_longest_prefix_within_budget():
+    text = "退款规则" * 50
+    cut = hard_cut(text, 20)
+    assert text.startswith(cut)
+    assert count_tokens(cut) <= 20
+    assert count_tokens(text[:len(cut) + 1]) > 20
+    assert hard_cut(text, 0) == ""
+
+
+def test_truncate_sentences_keeps_whole_sentences():
+    text = "第一句话。第二句话。" + "第三句" * 100 + "。"
+    truncated = truncate_sentences(text, count_tokens("第一句话。第二句话。……"))
+    assert truncated == "第一句话。第二句话。……"
+    assert truncate_sentences("短句。", 100) == "短句。"
+
+
+def test_truncate_sentences_hard_cuts_overlong_first_sentence():
+    text = "没有标点的超长段落" * 100
+    truncated = truncate_sentences(text, 30)
+    assert truncated.endswith("……")
+    assert text.startswith(truncated[:-2])
+    assert count_tokens(truncated) <= 30
+
+
+def test_pack_context_orders_by_relevance_and_skips_duplicates():
+    docs = [
+        make_doc("怎么退款", "在订单页点击申请退款即可", 0.4),
+        make_doc("如何退款", "在订单页点击申请退款即可", 0.1),
+        make_doc("配送多久", "一般三十分钟内送达", 0.2),
+    ]
+    packed = pack_context(docs, budget=1000)
+    assert packed["used"] == 2
+    assert packed["dropped"] == 1
+    assert packed["text"].index("如何退款") < packed["text"].index("配送多久")
+    assert "怎么退款" not in packed["text"]
+
+
+def test_pack_context_keeps_passage_whose_first_sentence_exceeds_budget():
+    answer = "没有标点的超长政策段落" * 200
+    packed = pack_context([make_doc("退款政策", answer, 0.1)], budget=100, max_passage_tokens=100)
+    assert packed["used"] == 1
+    assert packed["tokens"] <= 100
+    assert packed["saved"] > 0
+    assert packed["text"].startswith(format_passage(1, "退款政策", "")[:-1])
@@ -0,0 +1,78 @@
+import numpy as np
+
+from dedup import Deduplicator, merge_values
+
+
+def make_doc(question, source, category="FAQ", answer="在订单页申请退款"):
+    return {"question": question, "answer": answer, "metadata": {"source": source, "category": category}}
+
+
+def vec(*values):
+    return np.array(values, dtype=np.float32).tobytes()
+
+
+def test_merge_values_keeps_first_seen_order():
+    assert merge_values("a,b", "b, c", "", None, "a") == "a,b,c"
+
+
+def test_check_exact_collapses_normalized_duplicates():
+    dedup = Deduplicator(dim=4)
+    assert not dedup.check_exact("faq:1", make_doc("如何退款？", "p1"))
+    assert dedup.check_exact("faq:2", make_doc("如何退款", "p2", category="售后"))
+    assert dedup.exact == 1
+    assert dedup.dropped == {"faq:2": "faq:1"}
+    assert dedup.dropped_sources == {"faq:2": "p2"}
+    assert dedup.merged_fields() == {"faq:1": {"source": "p1,p2", "category": "FAQ,售后"}}
+
+
+def test_filter_batch_drops_near_duplicates_within_batch():
+    dedup = Deduplicator(dim=4, threshold=0.97)
+    docs = [make_doc("q1", "p1"), make_doc("q2", "p2"), make_doc("q3", "p3")]
+    kept = dedup.filter_batch(
+        ["faq:1", "faq:2", "faq:3"], docs, [vec(1, 0, 0, 0), vec(0.99, 0.01, 0, 0), vec(0, 1, 0, 0)]
+    )
+    assert kept == [0, 2]
+    assert dedup.near == 1
+    assert dedup.dropped == {"faq:2": "faq:1"}
+    assert dedup.meta["faq:1"]["source"] == "p1,p2"
+    assert "faq:2" not in dedup.meta
+    assert dedup.count == 2
+
+
+def test_filter_batch_compares_against_existing_and_later_exact_copies():
+    dedup = Deduplicator(dim=4, threshold=0.97)
+    dedup.add_existing("faq:old", {"question": "q0", "answer": "a0", "source": "p0", "category": "FAQ"},
+                       np.array([0, 0, 2, 0], dtype=np.float32))
+    doc = make_doc("q1", "p1")
+    assert dedup.filter_batch(["faq:new"], [doc], [vec(0, 0, 1, 0.01)]) == []
+    assert dedup.dropped == {"faq:new": "faq:old"}
+    # 近似重复问答的完全相同副本直接归并到保留的问答
+    assert dedup.check_exact("faq:new2", make_doc("q1", "p9"))
+    assert dedup.dropped["faq:new2"] == "faq:old"
+    assert dedup.meta["faq:old"]["source"] == "p0,p1,p9"
+
+
+def test_restate_replaces_stored_metadata_with_contributions():
+    dedup = Deduplicator(dim=4)
+    dedup.add_existing("faq:1", {"question": "q", "answer": "a", "source": "p1,p2,p3", "category": "FAQ"},
+                       np.ones(4, dtype=np.float32))
+    dedup.restate("faq:1")
+    dedup.merge_into("faq:1", make_doc("q", "p1"))
+    assert dedup.meta["faq:1"] == {"source": "p1", "category": "FAQ"}
+
+    # 变更集同步：保留未变化页面的来源
+    dedup.restate("faq:1", keep={"source": "p4", "category": "FAQ"})
+    assert dedup.meta["faq:1"] == {"source": "p4,p1", "category": "FAQ"}
+
+
+def test_discard_forgets_failed_canonical_and_its_duplicates():
+    dedup = Deduplicator(dim=4)
+    canonical, copy = make_doc("如何退款", "p1"), make_doc("如何退款？", "p2")
+    dedup.check_exact("faq:1", canonical)
+    dedup.check_exact("faq:2", copy)
+    dedup.discard(["faq:1"], [canonical])
+    assert dedup.dropped == {}
+    assert dedup.dropped_sources == {}
+    assert "faq:1" not in dedup.merged
+    # 向量化失败后，相同问答可以重新作为保留的问答写入
+    assert not dedup.check_exact("faq:2", copy)
@@ -0,0 +1,62 @@
+import fakeredis
+
+import query_cache
+from query_cache import QueryEmbeddingCache, normalize_question
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return text.encode("utf-8")
+
+    return QueryEmbeddingCache(embed, model="m", **kwargs), calls, clock
+
+
+def test_normalize_question_ignores_width_case_space_and_trailing_punctuation():
+    assert normalize_question("  如何  退款ＡＢＣ？？ ") == normalize_question("如何 退款abc")
+
+
+def test_lru_evicts_least_recently_used(monkeypatch):
+    cache, calls, _ = make_cache(monkeypatch, maxsize=2)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")  # 淘汰最久未使用的 b
+    cache.get("a")
+    cache.get("b")
+    assert calls == ["a", "b", "c", "b"]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["size"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache, calls, clock = make_cache(monkeypatch, ttl=10)
+    cache.get("退款？")
+    clock.now += 9
+    cache.get("退款")
+    clock.now += 2
+    cache.get("退款")
+    assert calls == ["退款", "退款"]
+    assert cache.stats()["misses"] == 2
+
+
+def test_shared_tier_is_used_across_instances(monkeypatch):
+    redis_client = fakeredis.FakeRedis()
+    first, first_calls, _ = make_cache(monkeypatch, redis_client=redis_client)
+    second, second_calls, _ = make_cache(monkeypatch, redis_client=redis_client)
+    assert first.get("如何退款") == second.get("如何退款")
+    assert first_calls == ["如何退款"]
+    assert second_calls == []
+    assert second.stats()["shared_hits"] == 1
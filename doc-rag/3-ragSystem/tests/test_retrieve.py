@@ -0,0 +1,84 @@
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("dashscope")
+
+import retrieve  # noqa: E402
+
+
+def reply(*docs):
+    """
+    构造 FT.SEARCH 的原始返回值：[总数, key, [字段, 值, ...], ...]。
+    """
+    result = [len(docs)]
+    for doc_id, fields in docs:
+        result += [doc_id.encode(), [item.encode() for pair in fields.items() for item in pair]]
+    return result
+
+
+class FakePipeline:
+    def __init__(self, replies):
+        self.replies = replies
+        self.commands = []
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    def execute(self):
+        return self.replies[:len(self.commands)]
+
+
+class FakeRedis:
+    def __init__(self, replies):
+        self.replies = replies
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self.replies)
+
+
+@pytest.fixture
+def hybrid(monkeypatch):
+    def run(knn, text, question="退款 订单", top_k=3, rrf_k=60):
+        monkeypatch.setattr(retrieve, "redis_client", FakeRedis([knn, text]))
+        monkeypatch.setattr(retrieve, "embed_question", lambda q: b"\0" * 16)
+        monkeypatch.setattr(retrieve, "VECTOR_INT8", False)
+        return retrieve.hybrid_search(question, top_k=top_k, rrf_k=rrf_k)
+    return run
+
+
+def test_rrf_fuses_both_rankings(hybrid):
+    knn = reply(("faq:a", {"question": "A", "score": "0.1"}), ("faq:b", {"question": "B", "score": "0.2"}))
+    text = reply(("faq:b", {"question": "B"}), ("faq:c", {"question": "C"}))
+    docs = hybrid(knn, text, rrf_k=60)
+
+    assert [doc.id for doc in docs] == ["faq:b", "faq:a", "faq:c"]
+    assert docs[0].rrf_score == pytest.approx(1 / 62 + 1 / 61)
+    assert docs[1].rrf_score == pytest.approx(1 / 61)
+    # 两路都召回的文档保留向量检索的距离；仅由全文检索召回的文档 score 为空
+    assert docs[0].score == "0.2"
+    assert docs[2].score == ""
+
+
+def test_rrf_truncates_to_top_k(hybrid):
+    knn = reply(*[(f"faq:{i}", {"score": f"0.{i}"}) for i in range(1, 6)])
+    docs = hybrid(knn, reply(), top_k=2)
+    assert [doc.id for doc in docs] == ["faq:1", "faq:2"]
+
+
+def test_int8_rescores_vector_leg_before_fusion(monkeypatch):
+    knn = reply(("faq:a", {"score": "0.1"}), ("faq:b", {"score": "0.2"}))
+    rescored = []
+
+    def rescore_candidates(docs, q_vector, top_k):
+        rescored.append(top_k)
+        for doc, score in zip(docs, ("0.5", "0.05")):
+            doc.score = score
+        return sorted(docs, key=lambda doc: float(doc.score))
+
+    monkeypatch.setattr(retrieve, "rescore_candidates", rescore_candidates)
+    monkeypatch.setattr(retrieve, "redis_client", FakeRedis([knn, reply()]))
+    monkeypatch.setattr(retrieve, "embed_question", lambda q: b"\0" * 16)
+    monkeypatch.setattr(retrieve, "VECTOR_INT8", True)
+    docs = retrieve.hybrid_search("退款", top_k=2)
+    assert rescored == [2 * retrieve.HYBRID_CANDIDATES]
+    assert [(doc.id, doc.score) for doc in docs] == [("faq:b", "0.05"), ("faq:a", "0.5")]
@@ -0,0 +1,16 @@
+from types import SimpleNamespace
+
+from shards import merge_top_k
+
+
+def doc(doc_id, score):
+    return SimpleNamespace(id=doc_id, score=score)
+
+
+def test_merge_top_k_orders_by_distance_across_shards():
+    merged = merge_top_k([[doc("a", "0.30"), doc("b", "0.05")], [], [doc("c", "0.10"), doc("d", "0.9")]], 3)
+    assert [d.id for d in merged] == ["b", "c", "a"]
+
+
+def test_merge_top_k_returns_all_when_fewer_than_top_k():
+    assert [d.id for d in merge_top_k([[doc("a", "0.2")], [doc("b", "0.1")]], 10)] == ["b", "a"]
@@ -0,0 +1,33 @@
+# token 计数：上下文打包（context_pack.py）与 Embedding 请求调度（embed_scheduler.py）共用。
+#
+# 按字符类别估算（中文约 1 字 1 token，英文约 4 字符 1 token）；安装了 tiktoken 时使用其编码器。
+# 计数结果按文本缓存，同一段文本重复出现时不再重新计算。
+
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+
+_encoder = tiktoken.get_encoding("cl100k_base") if tiktoken is not None else None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    估算文本的 token 数，结果按文本缓存。
+
+    参数:
+        text (str): 待计数的文本。
+
+    返回:
+        int: token 数。
+    """
+    if _encoder is not None:
+        return len(_encoder.encode(text))
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -0,0 +1,327 @@
+# 本地 Embedding 缓存：同一段文本在同一模型下只向量化一次。
+#
+# 以 (模型名, 文本哈希) 为键，把 FLOAT32 向量的原始字节存入单文件 SQLite 数据库，
+# 读取时直接返回字节，无需重新解析 JSON 浮点数组。缓存按最近访问时间做 LRU 淘汰，
+# 总大小超过上限时删除最久未访问的条目。
+#
+# doc-rag 下各目录的脚本通过把本目录加入 sys.path 来共享该模块：
+#   python embed_cache.py stats   # 查看命中率统计
+#   python embed_cache.py clear   # 清空缓存
+
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from http import HTTPStatus
+
+import numpy as np
+
+# ========== 配置 ==========
+# 缓存文件路径，可通过环境变量覆盖
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", str(Path.home() / ".cache" / "doc-rag" / "embeddings.sqlite"))
+# 缓存大小上限（MB），超过后按 LRU 淘汰
+CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "1024"))
+# 淘汰时清理到上限的比例，避免每次写入都触发淘汰
+EVICT_TARGET_RATIO = 0.9
+
+
+class EmbeddingCache:
+    """
+    基于 SQLite 的持久化 Embedding 缓存。
+
+    属性:
+        path (str): 缓存数据库文件路径。
+        max_bytes (int): 向量数据总大小上限。
+        hits (int): 本进程内的命中次数。
+        misses (int): 本进程内的未命中次数。
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_mb: int = CACHE_MAX_MB):
+        """
+        打开（或创建）缓存数据库。
+
+        参数:
+            path (str): 缓存数据库文件路径。
+            max_mb (int): 缓存大小上限，单位 MB。
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        # 批量写入时会在线程池中调用，统一用一把锁串行化对连接的访问
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> bytes:
+        """
+        计算缓存键：模型名与文本内容的 SHA-256 摘要。
+
+        参数:
+            model (str): Embedding 模型名称。
+            text (str): 原始文本。
+
+        返回:
+            bytes: 32 字节摘要。
+        """
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, model: str, texts: list) -> list:
+        """
+        批量查询缓存。
+
+        参数:
+            model (str): Embedding 模型名称。
+            texts (list[str]): 待查询的文本列表。
+
+        返回:
+            list[bytes | None]: 与 texts 一一对应的向量字节，未命中为 None。
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # SQLite 单条语句的参数个数有限，分段查询
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            self._bump_stats(hits, len(keys) - hits)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model: str, texts: list, vectors: list):
+        """
+        批量写入缓存，写入后按需执行 LRU 淘汰。
+
+        参数:
+            model (str): Embedding 模型名称。
+            texts (list[str]): 文本列表。
+            vectors (list[bytes]): 与 texts 对应的 FLOAT32 向量字节。
+        """
+        now = time.time()
+        rows = [(self.make_key(model, text), model, vector, len(vector), now)
+                for text, vector in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def sample(self, model: str, limit: int) -> list:
+        """
+        随机抽取某个模型下的缓存向量，用于拟合降维投影和对比报告，不计入命中统计。
+
+        参数:
+            model (str): Embedding 模型名称。
+            limit (int): 最多返回的条数。
+
+        返回:
+            list[bytes]: FLOAT32 向量字节。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE model = ? ORDER BY RANDOM() LIMIT ?", (model, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _evict(self):
+        """
+        删除最久未访问的条目，直到总大小降到上限的 EVICT_TARGET_RATIO 以下。
+        调用方需持有锁。
+        """
+        # 其他进程也可能写入同一文件，淘汰前以数据库中的实际大小为准
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+            removed = []
+            for key, size in rows:
+                removed.append((key,))
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", removed)
+
+    def _bump_stats(self, hits: int, misses: int):
+        """
+        累加持久化的命中/未命中计数。调用方需持有锁。
+        """
+        self._conn.executemany(
+            "INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [("hits", hits), ("misses", misses)]
+        )
+
+    def stats(self) -> dict:
+        """
+        返回缓存统计信息。
+
+        返回:
+            dict: 包含本进程命中率、累计命中率、条目数和占用大小。
+        """
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+            lifetime = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        session_total = self.hits + self.misses
+        lifetime_total = lifetime.get("hits", 0) + lifetime.get("misses", 0)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / session_total if session_total else 0.0,
+            "lifetime_hits": lifetime.get("hits", 0),
+            "lifetime_misses": lifetime.get("misses", 0),
+            "lifetime_hit_rate": lifetime.get("hits", 0) / lifetime_total if lifetime_total else 0.0,
+            "entries": entries,
+            "size_mb": total / 1024 / 1024,
+        }
+
+    def clear(self):
+        """
+        清空缓存数据与统计。
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute("DELETE FROM stats")
+            self._total_bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache:
+    """
+    获取进程内共享的缓存实例（懒加载）。
+
+    返回:
+        EmbeddingCache: 缓存实例。
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+# ========== 远程向量化 ==========
+class EmbeddingError(RuntimeError):
+    """
+    Embedding 服务返回错误，status_code 为 HTTP 状态码，便于调用方区分限流（429）、服务端错误（5xx）与请求错误。
+    """
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def dashscope_embed(texts: list, model: str = "multimodal-embedding-v1") -> list:
+    """
+    调用 DashScope 多模态嵌入模型，一次请求获取多条文本的向量。
+
+    参数:
+        texts (list[str]): 待向量化的文本列表。
+        model (str): Embedding 模型名称。
+
+    返回:
+        list[bytes]: 与 texts 顺序一致的 FLOAT32 向量字节列表。
+
+    异常:
+        EmbeddingError: 当调用嵌入服务失败时抛出异常。
+    """
+    import dashscope
+
+    resp = dashscope.MultiModalEmbedding.call(
+        model=model,
+        input=[{"text": text} for text in texts]
+    )
+    if resp.status_code != HTTPStatus.OK:
+        raise EmbeddingError(f"❌ Embedding 调用失败: {resp.code}, {resp.message}", resp.status_code)
+
+    # 按返回的 index 还原输入顺序
+    items = sorted(resp.output["embeddings"], key=lambda item: item.get("index", 0))
+    vectors = [np.array(item["embedding"], dtype=np.float32).tobytes() for item in items]
+    if len(vectors) != len(texts):
+        raise EmbeddingError(f"❌ Embedding 返回数量不匹配: 期望 {len(texts)}，实际 {len(vectors)}")
+    return vectors
+
+
+def cached_embed(texts: list, model: str = "multimodal-embedding-v1", embed_fn=None) -> list:
+    """
+    带缓存的批量向量化：先查本地缓存，只把未命中的文本交给 embed_fn。
+
+    参数:
+        texts (list[str]): 待向量化的文本列表。
+        model (str): Embedding 模型名称，作为缓存键的一部分。
+        embed_fn (callable): 远程向量化函数，签名为 embed_fn(texts) -> list[bytes]，
+            默认使用 DashScope 多模态嵌入模型。
+
+    返回:
+        list[bytes]: 与 texts 顺序一致的 FLOAT32 向量字节列表。
+    """
+    if embed_fn is None:
+        embed_fn = lambda batch: dashscope_embed(batch, model=model)
+
+    cache = get_cache()
+    vectors = cache.get_many(model, texts)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        # 同一批次中重复的文本只请求一次
+        unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+        fetched = dict(zip(unique_texts, embed_fn(unique_texts)))
+        cache.put_many(model, unique_texts, [fetched[text] for text in unique_texts])
+        for i in missing:
+            vectors[i] = fetched[texts[i]]
+    return vectors
+
+
+def print_stats():
+    """
+    打印缓存命中率统计。
+    """
+    s = get_cache().stats()
+    print(f"📦 Embedding 缓存: {s['entries']} 条, {s['size_mb']:.1f} MB ({get_cache().path})")
+    print(f"   本次命中率 {s['hit_rate']:.1%} (命中 {s['hits']} / 未命中 {s['misses']})")
+    print(f"   累计命中率 {s['lifetime_hit_rate']:.1%} "
+          f"(命中 {s['lifetime_hits']} / 未命中 {s['lifetime_misses']})")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "clear":
+        get_cache().clear()
+        print("✅ 已清空 Embedding 缓存")
+    else:
+        print_stats()